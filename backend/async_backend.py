@@ -0,0 +1,396 @@
+"""
+QuestDB 查询接口的异步（ASGI）版本：图表数据、表列表、表详情
+
+    pip install starlette httpx a2wsgi uvicorn
+    cd backend && uvicorn async_backend:app --host 0.0.0.0 --port 5000
+
+这三个接口在事件循环中执行，QuestDB 子查询用 asyncio.gather 并发、Semaphore 限流，
+一个进程可以同时挂起数百个查询而不占用线程；其余接口原样交给 ldap_backend 的 Flask 应用
+（在线程池中运行）。请求参数、返回结构与同步版本完全一致，前端无需改动。
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from functools import wraps
+
+import jwt
+
+try:
+    import httpx
+    from a2wsgi import WSGIMiddleware
+    from starlette.applications import Starlette
+    from starlette.middleware import Middleware
+    from starlette.middleware.cors import CORSMiddleware
+    from starlette.requests import Request
+    from starlette.responses import JSONResponse
+    from starlette.routing import Mount, Route
+except ImportError as exc:
+    raise ImportError(
+        f"async_backend 缺少依赖 {exc.name}，请先安装: pip install starlette httpx a2wsgi uvicorn"
+        "（同步版本 ldap_backend 不需要这些依赖）"
+    ) from exc
+
+from ldap_backend import (
+    CHART_CONVERTERS,
+    QUERY_SCHEDULER,
+    SAMPLED_CONVERTERS,
+    TABLE_DETAIL_CACHE,
+    TABLE_LIST_CACHE,
+    TABLE_NAMES_CACHE,
+    TAG_CATALOG,
+    TAG_STATS_CONVERTERS,
+    _aggregate_source,
+    _build_time_filter,
+    _catalog_table_ranges,
+    _chart_batch_query,
+    _chart_max_points,
+    _chart_sample_seconds,
+    _chart_series,
+    _clip_time_range,
+    _pending_range_batches,
+    _project_table_names,
+    _sampled_batch_query,
+    _sampled_series,
+    _table_detail_from_tags,
+    _table_listing,
+    _table_minmax_query,
+    _table_ranges_query,
+    _tag_stats_query,
+    _to_epoch_us,
+    app as flask_app,
+)
+from script.query_scheduler import INTERACTIVE, QueryRejected
+from script.questdb_async_client import AsyncQuestDBClient
+
+
+config = flask_app.config
+logger = flask_app.logger
+
+QUESTDB_ASYNC = AsyncQuestDBClient(
+    exec_url=config["QUESTDB_EXEC_URL"],
+    export_url=config["QUESTDB_EXPORT_URL"],
+    max_connections=config["QUESTDB_ASYNC_MAX_CONNECTIONS"],
+    max_in_flight=config["QUESTDB_ASYNC_MAX_IN_FLIGHT"],
+    max_retries=config["QUESTDB_MAX_RETRIES"],
+    backoff_factor=config["QUESTDB_RETRY_BACKOFF"],
+    logger=logger,
+)
+
+# 同一张表的 tag 目录同步只执行一次，并发请求等待同一个任务
+_CATALOG_SYNCS: dict[str, asyncio.Task] = {}
+
+
+def _json(status: int = 200, **body) -> JSONResponse:
+    return JSONResponse(body, status_code=status)
+
+
+def _auth_required(fn):
+    @wraps(fn)
+    async def wrapper(request: Request):
+        header = request.headers.get("Authorization", "")
+        if not header.startswith("Bearer "):
+            return _json(401, success=False, message="缺少凭证")
+        token = header.removeprefix("Bearer ").strip()
+        try:
+            data = jwt.decode(token, config["SECRET_KEY"], algorithms=["HS256"])
+            request.state.user = data["sub"]
+        except jwt.ExpiredSignatureError:
+            return _json(401, success=False, message="Token 已过期")
+        except jwt.InvalidTokenError:
+            return _json(401, success=False, message="Token 无效")
+        return await fn(request)
+
+    return wrapper
+
+
+def _interactive(fn):
+    """交互查询准入（与同步接口共用名额）；交互查询不排队，放在 _auth_required 之后"""
+    @wraps(fn)
+    async def wrapper(request: Request):
+        try:
+            ticket = QUERY_SCHEDULER.admit(INTERACTIVE, request.state.user)
+        except QueryRejected as exc:
+            logger.warning("Query rejected for %s (%s): %s", request.state.user, INTERACTIVE, exc)
+            return JSONResponse(
+                {"success": False, "message": str(exc), "retry_after": exc.retry_after},
+                status_code=429,
+                headers={"Retry-After": str(exc.retry_after)},
+            )
+        try:
+            return await fn(request)
+        finally:
+            ticket.release()
+
+    return wrapper
+
+
+async def _gather_limited(limit: int, coroutines) -> list:
+    """并发执行，同时运行的不超过 limit 个；任一失败时抛出异常"""
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(coroutine):
+        async with semaphore:
+            return await coroutine
+
+    return await asyncio.gather(*(run(coroutine) for coroutine in coroutines))
+
+
+async def _fetch_table_ranges(table_names: list[str]) -> dict[str, tuple]:
+    """一次查询取回一批表的时间范围；失败时退回逐表 min/max（并发）"""
+    timeout = config["TABLES_QUERY_TIMEOUT"]
+    try:
+        data = await QUESTDB_ASYNC.exec(_table_ranges_query(table_names), timeout=timeout)
+        return {row[0]: (row[1], row[2]) for row in data.get("dataset", [])}
+    except (httpx.HTTPError, ValueError) as exc:
+        logger.warning("Partition metadata fetch failed, falling back to min/max: %s", exc)
+
+    async def fetch_one(name: str) -> tuple | None:
+        try:
+            time_data = await QUESTDB_ASYNC.exec(_table_minmax_query(name), timeout=timeout)
+        except Exception as e:
+            logger.warning(f"Failed to get time range for {name}: {e}")
+            return None
+        if time_data.get("dataset") and time_data["dataset"][0]:
+            return time_data["dataset"][0][0], time_data["dataset"][0][1]
+        return None
+
+    results = await _gather_limited(config["TABLES_MAX_WORKERS"], [fetch_one(name) for name in table_names])
+    return {name: result for name, result in zip(table_names, results) if result is not None}
+
+
+async def _list_questdb_tables() -> list[dict]:
+    try:
+        payload = await QUESTDB_ASYNC.exec("tables();", timeout=10)
+    except httpx.HTTPError as exc:
+        logger.error("QuestDB tables fetch failed: %s", exc)
+        raise
+
+    table_names = _project_table_names(payload)
+    ranges = await asyncio.to_thread(_catalog_table_ranges, table_names)
+    batches = _pending_range_batches(table_names, ranges)
+    if batches:
+        # 批次并发执行，超出时间预算的批次取消，返回空时间范围
+        semaphore = asyncio.Semaphore(config["TABLES_MAX_WORKERS"])
+
+        async def fetch(batch: list[str]) -> dict[str, tuple]:
+            async with semaphore:
+                return await _fetch_table_ranges(batch)
+
+        tasks = [asyncio.create_task(fetch(batch)) for batch in batches]
+        done, not_done = await asyncio.wait(tasks, timeout=config["TABLES_TIME_BUDGET"])
+        for task in not_done:
+            task.cancel()
+        for task in done:
+            if task.exception() is None:
+                ranges.update(task.result())
+        if not_done:
+            logger.warning(
+                "QuestDB table listing exceeded time budget, %d/%d batches pending",
+                len(not_done), len(tasks),
+            )
+
+    return _table_listing(table_names, ranges)
+
+
+async def _cached_questdb_tables() -> list[dict]:
+    """带缓存的表列表（与同步接口共用缓存）；不完整结果不写入缓存"""
+    tables = TABLE_LIST_CACHE.get("tables")
+    if tables is None:
+        tables = await _list_questdb_tables()
+        if not any(table["partial"] for table in tables):
+            TABLE_LIST_CACHE.set("tables", tables)
+    return tables
+
+
+async def _sync_tag_catalog(table_name: str) -> None:
+    names, first, last, counts = await QUESTDB_ASYNC.exp_columns(
+        _tag_stats_query(table_name), TAG_STATS_CONVERTERS, timeout=60
+    )
+    await asyncio.to_thread(TAG_CATALOG.replace_table, table_name, list(zip(names, first, last, counts)))
+    logger.info("Tag catalog synced for %s: %d tags", table_name, len(names))
+
+
+async def _ensure_catalog(table_name: str) -> None:
+    """表未同步到 tag 目录时同步一次"""
+    if await asyncio.to_thread(TAG_CATALOG.synced, table_name):
+        return
+    task = _CATALOG_SYNCS.get(table_name)
+    if task is None:
+        task = _CATALOG_SYNCS[table_name] = asyncio.create_task(_sync_tag_catalog(table_name))
+        task.add_done_callback(lambda _: _CATALOG_SYNCS.pop(table_name, None))
+    await asyncio.shield(task)
+
+
+async def _cached_table_detail(table_name: str) -> dict:
+    detail = TABLE_DETAIL_CACHE.get(table_name)
+    if detail is None:
+        try:
+            await _ensure_catalog(table_name)
+        except httpx.HTTPError as exc:
+            logger.error("QuestDB table detail failed for %s: %s", table_name, exc)
+            raise
+        tags = await asyncio.to_thread(TAG_CATALOG.tags, table_name)
+        detail = _table_detail_from_tags(table_name, tags)
+        TABLE_DETAIL_CACHE.set(table_name, detail)
+    return detail
+
+
+async def _table_names() -> set[str]:
+    """QuestDB 中已存在的表名（与同步接口共用缓存）"""
+    names = TABLE_NAMES_CACHE.get("names")
+    if names is None:
+        dataset = (await QUESTDB_ASYNC.exec("SELECT table_name FROM tables();", timeout=10)).get("dataset") or []
+        names = {row[0] for row in dataset}
+        TABLE_NAMES_CACHE.set("names", names)
+    return names
+
+
+async def _chart_time_range(
+    table_name: str, tags: list[str], start_time: str | None, end_time: str | None
+) -> tuple[str | None, str | None]:
+    if start_time and end_time:
+        return start_time, end_time
+    await _ensure_catalog(table_name)
+    first_us, last_us = await asyncio.to_thread(TAG_CATALOG.time_range, table_name, tags)
+    return _clip_time_range(start_time, end_time, first_us, last_us)
+
+
+async def _fetch_chart_series(
+    table_name: str,
+    tags: list[str],
+    start_time: str | None,
+    end_time: str | None,
+    max_points: int | None = None,
+) -> tuple[dict[str, list[dict]], int | None]:
+    """按批并发查询多个标签的时序数据，批次之间用 CHART_MAX_WORKERS 限流"""
+    time_filter = _build_time_filter(start_time, end_time)
+    tags = list(dict.fromkeys(tags))
+    batch_size = config["CHART_BATCH_TAGS"]
+    batches = [tags[i:i + batch_size] for i in range(0, len(tags), batch_size)]
+
+    sample_seconds = None
+    if max_points:
+        range_start, range_end = await _chart_time_range(table_name, tags, start_time, end_time)
+        if not range_start or not range_end:
+            return {tag: [] for tag in tags}, None
+        sample_seconds = _chart_sample_seconds(range_start, range_end, max_points)
+        existing = await _table_names() if config["ROLLUPS_ENABLED"] else set()
+        # 水位读取 SQLite，放到线程中执行
+        source, aggregates, sample_seconds = await asyncio.to_thread(
+            _aggregate_source,
+            table_name,
+            sample_seconds,
+            existing=existing,
+            end_us=_to_epoch_us(end_time) if end_time else None,
+            data_end_us=_to_epoch_us(range_end),
+        )
+
+    async def fetch(batch: list[str]) -> dict[str, list[dict]]:
+        if sample_seconds is None:
+            columns = await QUESTDB_ASYNC.exp_columns(
+                _chart_batch_query(table_name, batch, time_filter),
+                CHART_CONVERTERS,
+                timeout=config["CHART_QUERY_TIMEOUT"],
+            )
+            return _chart_series(batch, *columns)
+        columns = await QUESTDB_ASYNC.exp_columns(
+            _sampled_batch_query(source, batch, time_filter, sample_seconds, aggregates),
+            SAMPLED_CONVERTERS,
+            timeout=config["CHART_QUERY_TIMEOUT"],
+        )
+        return _sampled_series(batch, columns)
+
+    result = {}
+    for series in await _gather_limited(config["CHART_MAX_WORKERS"], [fetch(batch) for batch in batches]):
+        result.update(series)
+    return result, sample_seconds
+
+
+@_auth_required
+@_interactive
+async def questdb_tables(request: Request):
+    try:
+        tables = await _cached_questdb_tables()
+        return _json(success=True, tables=tables)
+    except httpx.HTTPError:
+        return _json(502, success=False, message="无法获取 QuestDB 表列表")
+
+
+@_auth_required
+@_interactive
+async def questdb_table_detail(request: Request):
+    table_name = request.path_params["table_name"]
+    try:
+        detail = await _cached_table_detail(table_name)
+        return _json(success=True, detail=detail)
+    except httpx.HTTPError:
+        return _json(502, success=False, message="无法获取表详情")
+
+
+@_auth_required
+@_interactive
+async def questdb_chart_data(request: Request):
+    """获取指定标签的时序数据用于绘图"""
+    table_name = request.path_params["table_name"]
+    try:
+        payload = await request.json()
+    except ValueError:
+        payload = None
+    payload = payload if isinstance(payload, dict) else {}
+    tags = payload.get("tags", [])
+    start_time = payload.get("start_time")
+    end_time = payload.get("end_time")
+
+    if not tags:
+        return _json(400, success=False, message="请至少选择一个标签")
+
+    try:
+        max_points = _chart_max_points(payload.get("max_points"))
+    except ValueError as exc:
+        return _json(400, success=False, message=str(exc))
+
+    try:
+        result, sample_seconds = await _fetch_chart_series(
+            table_name, tags, start_time, end_time, max_points=max_points
+        )
+        return _json(success=True, data=result, sample_seconds=sample_seconds)
+    except ValueError as exc:
+        return _json(400, success=False, message=f"时间格式错误: {exc}")
+    except httpx.HTTPError as exc:
+        logger.error("QuestDB chart data failed for %s: %s", table_name, exc)
+        return _json(502, success=False, message="无法获取图表数据")
+
+
+@_auth_required
+async def questdb_async_stats(request: Request):
+    return _json(success=True, stats=QUESTDB_ASYNC.stats())
+
+
+@asynccontextmanager
+async def lifespan(_app: Starlette):
+    yield
+    await QUESTDB_ASYNC.aclose()
+
+
+# Flask 的 CORS 只作用于转交的接口，异步接口单独加（含预检 OPTIONS）
+_CORS = [Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])]
+
+app = Starlette(
+    routes=[
+        Route("/api/questdb/tables", questdb_tables, methods=["GET", "OPTIONS"], middleware=_CORS),
+        Route(
+            "/api/questdb/table-detail/{table_name}",
+            questdb_table_detail,
+            methods=["GET", "OPTIONS"],
+            middleware=_CORS,
+        ),
+        Route(
+            "/api/questdb/chart-data/{table_name}",
+            questdb_chart_data,
+            methods=["POST", "OPTIONS"],
+            middleware=_CORS,
+        ),
+        Route("/api/questdb/async-client-stats", questdb_async_stats, methods=["GET", "OPTIONS"], middleware=_CORS),
+        Mount("/", app=WSGIMiddleware(flask_app)),
+    ],
+    lifespan=lifespan,
+)
@@ -0,0 +1,80 @@
+"""
+ldap_backend 生产环境启动配置
+
+    cd backend && gunicorn -c gunicorn.conf.py
+
+- gthread worker：每个进程 GUNICORN_THREADS 个线程，慢的导出/LDAP 请求只占一个线程，
+  不阻塞其他用户的图表请求
+- 平滑重载：kill -HUP <master pid>，新 worker 启动后旧 worker 处理完在途请求再退出
+- 请求超时按接口类别在应用内设置（ldap_backend 配置）：
+  登录 LDAP_CONNECT_TIMEOUT/LDAP_RECEIVE_TIMEOUT，图表 CHART_QUERY_TIMEOUT，
+  导出/聚合单次查询 EXPORT_QUERY_TIMEOUT、整个请求 EXPORT_REQUEST_TIMEOUT；
+  这里的 timeout 只用于回收卡死的 worker，需大于导出请求的总时限
+- worker 退出（重载、停止）前等待后台导入任务完成，最多 IMPORT_DRAIN_TIMEOUT 秒，
+  之后取消剩余任务；需小于 graceful_timeout
+- 就绪检查：GET /api/health/ready
+
+导入任务列表、查询准入计数、LDAP 连接池和各类缓存都在进程内，只支持一个 worker：
+多个 worker 时导入进度查询落到别的进程会返回 404，单用户并发上限也会按 worker 数放大。
+workers > 1（包括命令行 -w）时拒绝启动；确认前端代理已按用户做会话保持后，
+可设置 GUNICORN_ALLOW_MULTI_WORKER=1 强制启动（启动时会打印警告）
+"""
+import os
+import sys
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.environ.get(name, default))
+
+
+wsgi_app = "ldap_backend:app"
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+
+worker_class = "gthread"
+workers = _env_int("GUNICORN_WORKERS", 1)
+threads = _env_int("GUNICORN_THREADS", 16)
+
+# worker 心跳超时；单个请求的超时由应用控制
+timeout = _env_int("GUNICORN_TIMEOUT", 960)
+# 重载/退出时等待在途请求（导出、导入）完成的时间
+graceful_timeout = _env_int("GUNICORN_GRACEFUL_TIMEOUT", 120)
+# 在途请求结束后等待后台导入任务的时间，留出取消任务和退出的余量
+import_drain_timeout = _env_int("IMPORT_DRAIN_TIMEOUT", max(0, graceful_timeout - 20))
+keepalive = _env_int("GUNICORN_KEEPALIVE", 5)
+
+# 每个 worker 各自打开 SQLite 目录和连接池，不在 master 中预加载
+preload_app = False
+
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG", "-")
+errorlog = os.environ.get("GUNICORN_ERROR_LOG", "-")
+loglevel = os.environ.get("GUNICORN_LOG_LEVEL", "info")
+
+
+def on_starting(server):
+    """多 worker 时进程内状态不共享，未显式允许时拒绝启动"""
+    if server.cfg.workers <= 1:
+        return
+    if os.environ.get("GUNICORN_ALLOW_MULTI_WORKER") != "1":
+        server.log.error(
+            "workers=%d is not supported: import jobs, query admission limits and caches are "
+            "per-process. Run with 1 worker, or set GUNICORN_ALLOW_MULTI_WORKER=1 behind a "
+            "proxy with per-user sticky sessions.",
+            server.cfg.workers,
+        )
+        sys.exit(1)
+    server.log.warning(
+        "!!! Running %d workers: import job status, per-user query limits (x%d) and cache "
+        "invalidation are per-process; the proxy MUST route each user to one worker !!!",
+        server.cfg.workers, server.cfg.workers,
+    )
+
+
+def worker_exit(server, worker):
+    """worker 退出前排空导入任务队列；导入任务只在 worker 进程内（preload_app=False，master 中没有）"""
+    backend = sys.modules.get("ldap_backend")
+    if backend is None:
+        return
+    if backend.IMPORT_JOBS.drain(import_drain_timeout):
+        server.log.info("Worker %s: import jobs drained", worker.pid)
+    else:
+        server.log.warning("Worker %s: import jobs still running at exit", worker.pid)
@@ -1,17 +1,54 @@
 from __future__ import annotations
 from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
 from functools import wraps
-from flask import Flask, jsonify, request
+from typing import Iterator
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
 from ssl import CERT_NONE
-from ldap3 import ALL, Connection, Server, Tls
-from io import StringIO
+from ldap3 import Tls
+import json
 import jwt
-import csv
-import io
+import itertools
+import math
+import os
 import re
 import requests
-from script.csv_parser import _read_file_content, _parse_csv_format, parse_file, parse_sql_content
+import shutil
+import tempfile
+import threading
+import time
+import numpy as np
+from script.clc_export import (
+    FILL_METHODS,
+    TAGS_PER_GROUP,
+    GridFiller,
+    format_clc_times,
+    format_group_rows,
+    pivot_buckets,
+    pivot_page,
+)
+from script.csv_parser import iter_file_batches
+from script.import_dedup import TagRangeFilter
+from script.import_jobs import ImportJob, ImportJobManager, ImportManagerClosed, ImportQueueFull
+from script.ldap_pool import LdapPool
+from script.questdb_client import QuestDBClient
+from script.questdb_writer import IlpTcpSender, iter_csv_chunks, iter_ilp_batches
+from script.query_scheduler import BULK, INTERACTIVE, QueryRejected, QueryScheduler
+from script.record_batch import RecordBatch
+from script.rollups import (
+    RAW_AGGREGATES,
+    ROLLUP_AGGREGATES,
+    ROLLUP_INTERVALS,
+    choose_rollup,
+    create_rollup_sql,
+    refresh_rollup_sql,
+    rollup_base_table,
+    rollup_table_name,
+)
+from script.tag_catalog import TagCatalog, TagStats, format_epoch_us
+from script.ttl_cache import TTLCache
 
 app = Flask(__name__)
 CORS(app)
@@ -25,53 +62,165 @@ app.config.update(
     LDAP_BASE_DN="OU=Backbonetech,DC=backbonetech,DC=cn",
     LDAP_BIND_DN="CN=gitlab-ldap,OU=Backbonetech,DC=backbonetech,DC=cn",
     LDAP_BIND_PASSWORD="Abcd1234",
+    LDAP_POOL_SIZE=8,
+    LDAP_CONNECT_TIMEOUT=5,
+    LDAP_RECEIVE_TIMEOUT=10,
+    LDAP_ACQUIRE_TIMEOUT=5,
+    LDAP_POOL_MAX_IDLE=300,
+    LDAP_HEALTH_CHECK_INTERVAL=60,
+    USER_CACHE_SIZE=1024,
+    USER_CACHE_TTL=3600,
+    USER_CACHE_NEGATIVE_TTL=60,
     TOKEN_TTL_HOURS=24,
     ADMIN_USERS=["zhitong.jiang", "kaizhen.wu"],
     QUESTDB_IMPORT_URL="http://10.0.0.233:9000/imp",
     QUESTDB_EXEC_URL="http://10.0.0.233:9000/exec",
+    QUESTDB_EXPORT_URL="http://10.0.0.233:9000/exp",
+    QUESTDB_ILP_URL="http://10.0.0.233:9000/write",
+    QUESTDB_ILP_HOST="10.0.0.233",
+    QUESTDB_ILP_PORT=9009,
+    QUESTDB_POOL_SIZE=16,
+    QUESTDB_MAX_RETRIES=2,
+    QUESTDB_RETRY_BACKOFF=0.2,
+    QUESTDB_ASYNC_MAX_CONNECTIONS=100,
+    QUESTDB_ASYNC_MAX_IN_FLIGHT=200,
+    TABLE_LIST_CACHE_TTL=60,
+    TABLE_DETAIL_CACHE_SIZE=256,
+    TABLE_DETAIL_CACHE_TTL=300,
+    TABLES_BATCH_SIZE=50,
+    TABLES_MAX_WORKERS=4,
+    TABLES_QUERY_TIMEOUT=5,
+    TABLES_TIME_BUDGET=0.8,
+    CHART_ROW_LIMIT=10000,
+    CHART_BATCH_TAGS=20,
+    CHART_MAX_WORKERS=4,
+    CHART_MIN_POINTS=10,
+    CHART_MAX_POINTS=5000,
+    CHART_QUERY_TIMEOUT=30,
+    EXPORT_QUERY_TIMEOUT=600,
+    EXPORT_REQUEST_TIMEOUT=900,
+    READINESS_TIMEOUT=2,
+    CLC_PAGE_ROWS=50_000,
+    CLC_INTERVAL=60,
+    CLC_FILL="last",
+    CLC_MAX_ROWS=5_000_000,
+    AGGREGATE_MAX_BUCKETS=100_000,
+    AGGREGATE_BATCH_TAGS=20,
+    IMPORT_CHUNK_ROWS=200_000,
+    IMPORT_BATCH_ROWS=100_000,
+    IMPORT_STREAM_BUFFER=1 << 20,
+    IMPORT_PARSE_WORKERS=4,
+    IMPORT_TRANSPORT="csv",
+    CATALOG_PATH=os.path.join(os.path.dirname(os.path.abspath(__file__)), "tag_catalog.sqlite3"),
+    ROLLUPS_ENABLED=True,
+    ROLLUP_QUERY_TIMEOUT=600,
+    WAL_APPLY_TIMEOUT=30,
+    IMPORT_MODE="append",
+    TABLE_DEDUP=False,
+    IMPORT_JOB_WORKERS=2,
+    IMPORT_JOB_MAX_PENDING=16,
+    IMPORT_JOB_HISTORY=200,
+    QUERY_INTERACTIVE_LIMIT=16,
+    QUERY_INTERACTIVE_PER_USER=4,
+    QUERY_BULK_LIMIT=2,
+    QUERY_BULK_PER_USER=1,
+    QUERY_BULK_QUEUE_SIZE=8,
+    QUERY_BULK_QUEUE_PER_USER=2,
+    QUERY_BULK_QUEUE_TIMEOUT=30,
+    ILP_BATCH_ROWS=50_000,
+    ILP_BATCH_BYTES=4 << 20,
 )
 
 TLS = Tls(validate=CERT_NONE)
 
+# 服务账号连接池：查找用户复用连接，密码校验走独立短连接
+LDAP = LdapPool(
+    app.config["LDAP_SERVER"],
+    base_dn=app.config["LDAP_BASE_DN"],
+    bind_dn=app.config["LDAP_BIND_DN"],
+    bind_password=app.config["LDAP_BIND_PASSWORD"],
+    port=app.config["LDAP_PORT"],
+    use_ssl=True,
+    tls=TLS,
+    pool_size=app.config["LDAP_POOL_SIZE"],
+    connect_timeout=app.config["LDAP_CONNECT_TIMEOUT"],
+    receive_timeout=app.config["LDAP_RECEIVE_TIMEOUT"],
+    acquire_timeout=app.config["LDAP_ACQUIRE_TIMEOUT"],
+    max_idle=app.config["LDAP_POOL_MAX_IDLE"],
+    health_check_interval=app.config["LDAP_HEALTH_CHECK_INTERVAL"],
+    logger=app.logger,
+)
+
+# 导入写入方式：/imp CSV、ILP over HTTP（/write）、ILP over TCP
+IMPORT_TRANSPORTS = ("csv", "ilp-http", "ilp-tcp")
+IMPORT_MODES = ("append", "dedup")
+AGGREGATE_FILLS = {"none": "", "null": "FILL(NULL)", "prev": "FILL(PREV)", "linear": "FILL(LINEAR)"}
+AGGREGATE_COLUMNS = ("avg", "min", "max", "first", "last", "count")
+
+QUESTDB = QuestDBClient(
+    exec_url=app.config["QUESTDB_EXEC_URL"],
+    import_url=app.config["QUESTDB_IMPORT_URL"],
+    export_url=app.config["QUESTDB_EXPORT_URL"],
+    ilp_url=app.config["QUESTDB_ILP_URL"],
+    pool_size=app.config["QUESTDB_POOL_SIZE"],
+    max_retries=app.config["QUESTDB_MAX_RETRIES"],
+    backoff_factor=app.config["QUESTDB_RETRY_BACKOFF"],
+    logger=app.logger,
+)
+
+# 表元数据缓存：导入/建表时主动失效
+TABLE_LIST_CACHE = TTLCache(maxsize=1, ttl=app.config["TABLE_LIST_CACHE_TTL"])
+TABLE_NAMES_CACHE = TTLCache(maxsize=1, ttl=app.config["TABLE_LIST_CACHE_TTL"])
+TAG_CATALOG = TagCatalog(app.config["CATALOG_PATH"])
+TABLE_DETAIL_CACHE = TTLCache(
+    maxsize=app.config["TABLE_DETAIL_CACHE_SIZE"],
+    ttl=app.config["TABLE_DETAIL_CACHE_TTL"],
+)
+# 目录属性缓存：sAMAccountName（小写）-> 用户信息；不存在的用户缓存为 False
+USER_CACHE = TTLCache(maxsize=app.config["USER_CACHE_SIZE"], ttl=app.config["USER_CACHE_TTL"])
+USER_ATTRIBUTES = ["displayName", "mail", "department"]
+
+def _lookup_user(username: str) -> dict | None:
+    """
+    读取用户的目录属性，优先使用缓存；用户不存在返回 None
+
+    不存在的用户缓存 USER_CACHE_NEGATIVE_TTL 秒，避免错误用户名反复查询 LDAP
+    """
+    key = username.lower()
+    cached = USER_CACHE.get(key)
+    if cached is not None:
+        return cached or None
+
+    entry = LDAP.find_user(username, USER_ATTRIBUTES)
+    if entry is None:
+        USER_CACHE.set(key, False, ttl=app.config["USER_CACHE_NEGATIVE_TTL"])
+        return None
+
+    user_info = {
+        "username": username,
+        "name": str(getattr(entry, "displayName", username)),
+        "email": str(getattr(entry, "mail", "")),
+        "department": str(getattr(entry, "department", "")),
+    }
+    USER_CACHE.set(key, user_info)
+    return user_info
+
+def _cached_user_info(username: str) -> dict:
+    """已登录用户的目录属性，只读缓存，不访问 LDAP"""
+    return USER_CACHE.get(username.lower()) or {"username": username}
+
 def _ldap_bind(username: str, password: str) -> tuple[bool, dict | None]:
-    server = Server(
-        app.config["LDAP_SERVER"],
-        port=app.config["LDAP_PORT"],
-        use_ssl=True,
-        tls=TLS,
-        get_info=ALL,
-    )
     try:
-        with Connection(
-            server,
-            user=app.config["LDAP_BIND_DN"],
-            password=app.config["LDAP_BIND_PASSWORD"],
-            authentication="SIMPLE",
-            auto_bind=True,
-        ) as conn:
-            conn.search(
-                search_base=app.config["LDAP_BASE_DN"],
-                search_filter=f"(sAMAccountName={username})",
-                attributes=["displayName", "mail", "department"],
-            )
-            if not conn.entries:
-                return False, None
-
-            entry = conn.entries[0]
-            user_upn = f"{username}@{app.config['LDAP_UPN_SUFFIX']}"
-            if not conn.rebind(
-                user=user_upn,
-                password=password,
-                authentication="SIMPLE",
-            ):
-                return False, None
-
-            return True, {
-                "username": username,
-                "name": str(getattr(entry, "displayName", username)),
-                "email": str(getattr(entry, "mail", "")),
-                "department": str(getattr(entry, "department", "")),
-            }
+        user_info = _lookup_user(username)
+        if user_info is None:
+            return False, None
+
+        # 属性可以来自缓存，密码每次都要向 LDAP 校验
+        user_upn = f"{username}@{app.config['LDAP_UPN_SUFFIX']}"
+        if not LDAP.verify_password(user_upn, password):
+            return False, None
+
+        return True, user_info
     except Exception as exc:
         app.logger.error("LDAP bind failed for %s: %s", username, exc)
         return False, None
@@ -86,235 +235,1197 @@ def _issue_token(username: str) -> str:
     }
     return jwt.encode(payload, app.config["SECRET_KEY"], algorithm="HS256")
 
-def _list_questdb_tables() -> list[dict]:
-    try:
-        response = requests.get(
-            app.config["QUESTDB_EXEC_URL"],
-            params={"query": "tables();"},
-            timeout=10,
-        )
-        response.raise_for_status()
-        payload = response.json()
-    except requests.RequestException as exc:
-        app.logger.error(
-            "QuestDB tables fetch failed for %s: %s",
-            getattr(request, "user", "?"),
-            exc,
-        )
-        raise
+def _table_ranges_query(table_names: list[str]) -> str:
+    """一批表的时间范围（table_partitions 分区元数据），UNION ALL 合并为一次查询"""
+    subqueries = [
+        f"""SELECT {_quote_sql_str(name)} AS table_name,
+            min(minTimestamp) AS oldest,
+            max(maxTimestamp) AS newest
+        FROM table_partitions({_quote_sql_str(name)})"""
+        for name in table_names
+    ]
+    return "\nUNION ALL\n".join(subqueries) + ";"
+
+def _table_minmax_query(table_name: str) -> str:
+    """分区元数据不可用时按数据计算时间范围"""
+    return f"SELECT min(Time) as oldest, max(Time) as newest FROM {table_name};"
+
+def _fetch_table_ranges(table_names: list[str]) -> dict[str, tuple]:
+    """
+    一次查询取回一批表的时间范围
     
-    columns = [col.get("name") for col in payload.get("columns", [])]
-    dataset = payload.get("dataset", [])
-    tables = []
+    只读取分区元数据（table_partitions），不扫描数据；失败时退回逐表 min/max
+    """
+    timeout = app.config["TABLES_QUERY_TIMEOUT"]
     
-    for row in dataset:
-        item = {columns[i]: row[i] for i in range(min(len(columns), len(row)))}
-        table_name = item.get("table_name") or item.get("name") or row[0]
-        
-        # 获取每个表的最老和最新时间戳
-        oldest = None
-        newest = None
+    try:
+        data = QUESTDB.exec(_table_ranges_query(table_names), timeout=timeout)
+        return {row[0]: (row[1], row[2]) for row in data.get("dataset", [])}
+    except (requests.RequestException, ValueError) as exc:
+        app.logger.warning("Partition metadata fetch failed, falling back to min/max: %s", exc)
+    
+    ranges = {}
+    for name in table_names:
         try:
-            time_response = requests.get(
-                app.config["QUESTDB_EXEC_URL"],
-                params={"query": f"SELECT min(Time) as oldest, max(Time) as newest FROM {table_name};"},
-                timeout=5,
-            )
-            if time_response.ok:
-                time_data = time_response.json()
-                if time_data.get("dataset") and time_data["dataset"][0]:
-                    oldest = time_data["dataset"][0][0]
-                    newest = time_data["dataset"][0][1]
+            time_data = QUESTDB.exec(_table_minmax_query(name), timeout=timeout)
+            if time_data.get("dataset") and time_data["dataset"][0]:
+                ranges[name] = (time_data["dataset"][0][0], time_data["dataset"][0][1])
         except Exception as e:
-            app.logger.warning(f"Failed to get time range for {table_name}: {e}")
-        
+            app.logger.warning(f"Failed to get time range for {name}: {e}")
+    return ranges
+
+def _project_table_names(payload: dict) -> list[str]:
+    """tables() 查询结果中的项目表名（汇总表不作为独立项目列出）"""
+    columns = [col.get("name") for col in payload.get("columns", [])]
+    table_names = []
+    for row in payload.get("dataset", []):
+        item = {columns[i]: row[i] for i in range(min(len(columns), len(row)))}
+        table_names.append(item.get("table_name") or item.get("name") or row[0])
+    
+    existing = set(table_names)
+    return [name for name in table_names if rollup_base_table(name, existing) is None]
+
+def _catalog_table_ranges(table_names: list[str]) -> dict[str, tuple]:
+    """已同步到 tag 目录的表的时间范围"""
+    wanted = set(table_names)
+    return {
+        name: (format_epoch_us(first), format_epoch_us(last))
+        for name, (first, last) in TAG_CATALOG.table_ranges().items()
+        if name in wanted
+    }
+
+def _pending_range_batches(table_names: list[str], ranges: dict[str, tuple]) -> list[list[str]]:
+    """还需要查询 QuestDB 的表，按 TABLES_BATCH_SIZE 分批"""
+    pending_names = [name for name in table_names if name not in ranges]
+    batch_size = app.config["TABLES_BATCH_SIZE"]
+    return [pending_names[i:i + batch_size] for i in range(0, len(pending_names), batch_size)]
+
+def _table_listing(table_names: list[str], ranges: dict[str, tuple]) -> list[dict]:
+    """表列表接口的返回结构；没有取到时间范围的表标记为 partial"""
+    tables = []
+    for table_name in table_names:
+        oldest, newest = ranges.get(table_name, (None, None))
         tables.append(
             {
                 "table_name": table_name,
                 "oldest": oldest,
                 "newest": newest,
+                "partial": table_name not in ranges,
             }
         )
     return tables
 
-def _get_table_detail(table_name: str) -> dict:
+def _list_questdb_tables() -> list[dict]:
     try:
-        # 1. 时间范围和总量
-        stats_query = f"""
-        SELECT 
-            min(Time) as oldest, 
-            max(Time) as newest, 
-            count() as total_rows 
-        FROM {table_name};
-        """
-        stats_resp = requests.get(
-            app.config["QUESTDB_EXEC_URL"],
-            params={"query": stats_query},
-            timeout=10,
+        payload = QUESTDB.exec("tables();", timeout=10)
+    except requests.RequestException as exc:
+        app.logger.error(
+            "QuestDB tables fetch failed for %s: %s",
+            getattr(request, "user", "?"),
+            exc,
         )
-        stats_resp.raise_for_status()
-        stats_data = stats_resp.json()
-        
-        oldest = None
-        newest = None
-        total_rows = 0
-        
-        if stats_data.get("dataset") and len(stats_data["dataset"]) > 0:
-            row = stats_data["dataset"][0]
-            oldest = row[0] if row[0] else None
-            newest = row[1] if row[1] else None
-            total_rows = row[2] if row[2] else 0
-
-        # 2. Name标签列表及计数
-        names_query = f"""
-        SELECT Name, count() as cnt 
-        FROM {table_name} 
-        GROUP BY Name 
-        ORDER BY cnt DESC;
-        """
-        names_resp = requests.get(
-            app.config["QUESTDB_EXEC_URL"],
-            params={"query": names_query},
-            timeout=10,
+        raise
+    
+    table_names = _project_table_names(payload)
+    
+    # 已同步到 tag 目录的表直接读目录，其余表按批并发读取分区元数据，
+    # 超出时间预算的批次返回空时间范围
+    ranges = _catalog_table_ranges(table_names)
+    batches = _pending_range_batches(table_names, ranges)
+    if batches:
+        executor = ThreadPoolExecutor(max_workers=min(app.config["TABLES_MAX_WORKERS"], len(batches)))
+        futures = [executor.submit(_fetch_table_ranges, batch) for batch in batches]
+        done, not_done = wait(futures, timeout=app.config["TABLES_TIME_BUDGET"])
+        executor.shutdown(wait=False, cancel_futures=True)
+        for future in done:
+            if future.exception() is None:
+                ranges.update(future.result())
+        if not_done:
+            app.logger.warning(
+                "QuestDB table listing exceeded time budget, %d/%d batches pending",
+                len(not_done), len(futures),
+            )
+    
+    return _table_listing(table_names, ranges)
+
+def _tag_stats_query(table_name: str, tags: list[str] | None = None) -> str:
+    """按 tag 统计 (Name, 最早, 最晚, 行数)，时间为 Unix 微秒；不指定 tags 时统计全表"""
+    where = f"WHERE Name IN ({','.join(_quote_sql_str(tag) for tag in tags)})" if tags else ""
+    return f"""
+    SELECT Name, cast(min(Time) AS LONG), cast(max(Time) AS LONG), count()
+    FROM {table_name}
+    {where};
+    """
+
+def _sync_tag_catalog(table_name: str) -> None:
+    """从 QuestDB 全量统计一张表的各 tag 时间范围和行数，写入 tag 目录"""
+    names, first, last, counts = QUESTDB.exp_columns(
+        _tag_stats_query(table_name), TAG_STATS_CONVERTERS, timeout=60
+    )
+    TAG_CATALOG.replace_table(table_name, zip(names, first, last, counts))
+    app.logger.info("Tag catalog synced for %s: %d tags", table_name, len(names))
+
+def _is_dedup_table(table_name: str) -> bool:
+    """表是否启用了 DEDUP UPSERT KEYS；查询失败时按去重表处理（导入后重新统计，结果总是准确的）"""
+    query = f"SELECT dedup FROM tables() WHERE table_name = {_quote_sql_str(table_name)};"
+    try:
+        dataset = QUESTDB.exec(query, timeout=10).get("dataset") or []
+    except requests.RequestException as exc:
+        app.logger.warning("Dedup flag unavailable for %s: %s", table_name, exc)
+        return True
+    return bool(dataset and dataset[0][0])
+
+def _recount_tags(table_name: str, tags: list[str], batch_size: int = 500) -> list[tuple[str, int, int, int]]:
+    """从 QuestDB 重新统计指定 tag 的 (tag, first_us, last_us, count)"""
+    rows = []
+    for i in range(0, len(tags), batch_size):
+        names, first, last, counts = QUESTDB.exp_columns(
+            _tag_stats_query(table_name, tags[i:i + batch_size]), TAG_STATS_CONVERTERS, timeout=60
         )
-        names_resp.raise_for_status()
-        names_data = names_resp.json()
-        
-        names_list = []
-        if names_data.get("dataset"):
-            for row in names_data["dataset"]:
-                names_list.append({
-                    "name": row[0],
-                    "count": row[1]
-                })
-
-        return {
-            "table_name": table_name,
-            "oldest": oldest,
-            "newest": newest,
-            "total_rows": total_rows,
-            "names_count": len(names_list),
-            "names": names_list
-        }
+        rows.extend(zip(names, first, last, counts))
+    return rows
+
+def _catalog_tags(table_name: str) -> list[tuple[str, int, int, int]]:
+    """tag 目录中一张表的 (tag, first_us, last_us, count)；未同步时先同步"""
+    if not TAG_CATALOG.synced(table_name):
+        _sync_tag_catalog(table_name)
+    return TAG_CATALOG.tags(table_name)
+
+def _get_table_detail(table_name: str) -> dict:
+    """表的时间范围、总行数和 tag 列表，全部来自 tag 目录"""
+    try:
+        tags = _catalog_tags(table_name)
     except requests.RequestException as exc:
         app.logger.error("QuestDB table detail failed for %s: %s", table_name, exc)
         raise
+    return _table_detail_from_tags(table_name, tags)
 
-def _generate_clc_file(table_name: str, tags: list[str], start_time: str, end_time: str) -> str:
-    """生成 CLC 格式文件内容"""
-    TAGS_PER_GROUP = 13
+def _table_detail_from_tags(table_name: str, tags: list[tuple[str, int, int, int]]) -> dict:
+    """表详情接口的返回结构"""
+    names_list = [{"name": tag, "count": count} for tag, _, _, count in tags]
+    return {
+        "table_name": table_name,
+        "oldest": format_epoch_us(min((first for _, first, _, _ in tags), default=None)),
+        "newest": format_epoch_us(max((last for _, _, last, _ in tags), default=None)),
+        "total_rows": sum(count for _, _, _, count in tags),
+        "names_count": len(names_list),
+        "names": names_list,
+    }
+
+def _cached_questdb_tables() -> list[dict]:
+    """带缓存的表列表；超出时间预算的不完整结果不写入缓存"""
+    tables = TABLE_LIST_CACHE.get("tables")
+    if tables is None:
+        tables = _list_questdb_tables()
+        if not any(table["partial"] for table in tables):
+            TABLE_LIST_CACHE.set("tables", tables)
+    return tables
+
+def _cached_table_detail(table_name: str) -> dict:
+    """带缓存的表详情"""
+    return TABLE_DETAIL_CACHE.get_or_load(table_name, lambda: _get_table_detail(table_name))
+
+def _invalidate_table_cache(table_name: str | None = None) -> None:
+    """表数据或表结构变化后清除相关缓存"""
+    TABLE_LIST_CACHE.invalidate("tables")
+    TABLE_NAMES_CACHE.invalidate("names")
+    if table_name:
+        TABLE_DETAIL_CACHE.invalidate(table_name)
+
+def _build_time_filter(start_time: str | None, end_time: str | None, end_inclusive: bool = True) -> str:
+    """构建 Time 列的 AND 筛选条件；end_inclusive=False 时为左闭右开区间"""
+    end_op = "<=" if end_inclusive else "<"
+    if start_time and end_time:
+        return f"AND Time >= '{start_time}' AND Time {end_op} '{end_time}'"
+    if start_time:
+        return f"AND Time >= '{start_time}'"
+    if end_time:
+        return f"AND Time {end_op} '{end_time}'"
+    return ""
+
+def _quote_sql_str(value: str) -> str:
+    """把字符串转成 SQL 字面量（单引号转义）"""
+    return "'" + str(value).replace("'", "''") + "'"
+
+def _csv_float(value: str) -> float | None:
+    """/exp CSV 中的数值单元格，NULL 导出为空串"""
+    return float(value) if value else None
+
+# 各查询结果列的转换函数（同步/异步接口共用）
+TAG_STATS_CONVERTERS = (str, int, int, int)
+CHART_CONVERTERS = (str, str, _csv_float)
+SAMPLED_CONVERTERS = (str, str, _csv_float, _csv_float, _csv_float, _csv_float, int)
+
+def _table_names() -> set[str]:
+    """QuestDB 中已存在的表名（带缓存）"""
+    def load() -> set[str]:
+        dataset = QUESTDB.exec("SELECT table_name FROM tables();", timeout=10).get("dataset") or []
+        return {row[0] for row in dataset}
+    return TABLE_NAMES_CACHE.get_or_load("names", load)
+
+def _available_rollups(table_name: str, existing: set[str] | None = None) -> set[str]:
+    """已建立的汇总表后缀"""
+    if existing is None:
+        existing = _table_names()
+    return {suffix for suffix in ROLLUP_INTERVALS if rollup_table_name(table_name, suffix) in existing}
+
+def _rollup_usable(
+    table_name: str,
+    suffix: str,
+    start_us: int | None,
+    end_us: int | None,
+    data_end_us: int | None,
+    exact: bool,
+) -> bool:
+    """
+    汇总表能否代替原始表回答 [start_us, end_us) 的查询
+
+    - 查询范围（未指定结束时取数据的最晚时间 data_end_us）必须在刷新水位之前，
+      水位之后的数据可能还没有汇总（刷新失败或绕过本服务写入）
+    - exact=True 时起止时间必须落在汇总桶边界上，否则首尾桶只包含部分原始数据
+    """
+    watermark = TAG_CATALOG.rollup_watermark(table_name, suffix)
+    last_us = end_us if end_us is not None else data_end_us
+    if watermark is None or last_us is None or last_us > watermark:
+        return False
+    if exact:
+        interval_us = ROLLUP_INTERVALS[suffix] * 1_000_000
+        return all(bound is None or bound % interval_us == 0 for bound in (start_us, end_us))
+    return True
+
+def _aggregate_source(
+    table_name: str,
+    seconds: int,
+    exact: bool = False,
+    existing: set[str] | None = None,
+    start_us: int | None = None,
+    end_us: int | None = None,
+    data_end_us: int | None = None,
+) -> tuple[str, dict[str, str], int]:
+    """
+    按桶宽选择数据源，返回 (表名, 聚合表达式, 桶宽)
     
-    # 1. 查询数据
-    time_filter = ""
+    选择桶宽不超过 seconds 的最粗汇总表，桶宽向上取整为其整数倍；
+    exact=True 时只选择能整除 seconds、且起止时间对齐到其桶边界的汇总表（结果与原始表一致）；
+    查询范围超出汇总表刷新水位时读原始表
+    """
+    if app.config["ROLLUPS_ENABLED"]:
+        available = {
+            suffix for suffix in _available_rollups(table_name, existing)
+            if _rollup_usable(table_name, suffix, start_us, end_us, data_end_us, exact)
+        }
+        if exact:
+            available = {suffix for suffix in available if seconds % ROLLUP_INTERVALS[suffix] == 0}
+        choice = choose_rollup(seconds, available)
+        if choice is not None:
+            suffix, interval = choice
+            return rollup_table_name(table_name, suffix), ROLLUP_AGGREGATES, -(-seconds // interval) * interval
+    return table_name, RAW_AGGREGATES, seconds
+
+def _wait_for_wal(table_name: str, timeout: float) -> bool:
+    """等待 WAL 表把已提交的事务应用完（非 WAL 表直接返回）；超时返回 False"""
+    query = f"SELECT writerTxn, sequencerTxn FROM wal_tables() WHERE name = {_quote_sql_str(table_name)};"
+    deadline = time.monotonic() + timeout
+    while True:
+        dataset = QUESTDB.exec(query, timeout=10).get("dataset") or []
+        if not dataset or dataset[0][0] >= dataset[0][1]:
+            return True
+        if time.monotonic() > deadline:
+            app.logger.warning("WAL apply for %s still pending after %.0fs", table_name, timeout)
+            return False
+        time.sleep(0.2)
+
+def _table_max_time_us(table_name: str) -> int | None:
+    dataset = QUESTDB.exec(f"SELECT cast(max(Time) AS LONG) FROM {table_name};", timeout=10).get("dataset") or []
+    return dataset[0][0] if dataset else None
+
+def _refresh_rollups(table_name: str, start_us: int | None = None, end_us: int | None = None) -> None:
+    """
+    重算 [start_us, end_us] 所在各桶的汇总数据，并推进刷新水位
+    
+    汇总表不存在（或未指定范围）时创建并回填整张表，之后只重算导入影响的时间段；
+    刷新失败时把水位退回到该时间段之前，查询这段数据时改读原始表
+    """
+    if not app.config["ROLLUPS_ENABLED"]:
+        return
+    
+    timeout = app.config["ROLLUP_QUERY_TIMEOUT"]
+    available = _available_rollups(table_name)
+    incremental = start_us is not None and end_us is not None
+    try:
+        if not _wait_for_wal(table_name, app.config["WAL_APPLY_TIMEOUT"]):
+            raise requests.Timeout(f"WAL apply for {table_name} still pending")
+        # 全量回填前先读最晚时间：回填覆盖的一定不早于它
+        max_us = None if incremental and available >= set(ROLLUP_INTERVALS) else _table_max_time_us(table_name)
+        for suffix, interval in ROLLUP_INTERVALS.items():
+            rollup_table = rollup_table_name(table_name, suffix)
+            interval_us = interval * 1_000_000
+            watermark = TAG_CATALOG.rollup_watermark(table_name, suffix)
+            if suffix in available and incremental:
+                low = start_us // interval_us * interval_us
+                high = (end_us // interval_us + 1) * interval_us
+                QUESTDB.exec(refresh_rollup_sql(table_name, rollup_table, interval, low, high), timeout=timeout)
+                # 与已汇总的范围相接时才能推进水位
+                if watermark is not None and low <= watermark:
+                    TAG_CATALOG.set_rollup_watermark(table_name, suffix, max(watermark, high))
+            else:
+                QUESTDB.exec(create_rollup_sql(rollup_table), timeout=10)
+                QUESTDB.exec(refresh_rollup_sql(table_name, rollup_table, interval), timeout=timeout)
+                if max_us is not None:
+                    TAG_CATALOG.set_rollup_watermark(
+                        table_name, suffix, (max_us // interval_us + 1) * interval_us
+                    )
+            app.logger.info("Rollup %s refreshed", rollup_table)
+    except requests.RequestException:
+        if incremental:
+            for suffix, interval in ROLLUP_INTERVALS.items():
+                interval_us = interval * 1_000_000
+                watermark = TAG_CATALOG.rollup_watermark(table_name, suffix)
+                if watermark is not None:
+                    TAG_CATALOG.set_rollup_watermark(
+                        table_name, suffix, min(watermark, start_us // interval_us * interval_us)
+                    )
+        raise
+    finally:
+        TABLE_NAMES_CACHE.invalidate("names")
+
+def _fetch_chart_batch(table_name: str, tags: list[str], time_filter: str) -> dict[str, list[dict]]:
+    """一次查询取回一批标签的数据（每个标签各自 LIMIT），再按 Name 拆分"""
+    columns = QUESTDB.exp_columns(
+        _chart_batch_query(table_name, tags, time_filter),
+        CHART_CONVERTERS,
+        timeout=app.config["CHART_QUERY_TIMEOUT"],
+    )
+    return _chart_series(tags, *columns)
+
+def _chart_batch_query(table_name: str, tags: list[str], time_filter: str) -> str:
+    """每个标签一个按时间排序、带 LIMIT 的子查询，UNION ALL 合并为一次往返"""
+    limit = app.config["CHART_ROW_LIMIT"]
+    subqueries = [
+        f"""SELECT * FROM (
+            SELECT Time, Name, Value
+            FROM {table_name}
+            WHERE Name = {_quote_sql_str(tag)} {time_filter}
+            ORDER BY Time ASC
+            LIMIT {limit}
+        )"""
+        for tag in tags
+    ]
+    return "\nUNION ALL\n".join(subqueries) + ";"
+
+def _chart_series(tags: list[str], times: list, names: list, values: list) -> dict[str, list[dict]]:
+    """按 Name 拆分原始数据点"""
+    series = {tag: [] for tag in tags}
+    for timestamp, name, value in zip(times, names, values):
+        points = series.get(name)
+        if points is not None:
+            points.append({"time": timestamp, "value": value})
+    return series
+
+def _parse_questdb_time(value: str) -> datetime:
+    """解析 QuestDB / 前端传来的 ISO 时间戳"""
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+def _chart_time_range(
+    table_name: str, tags: list[str], start_time: str | None, end_time: str | None
+) -> tuple[str | None, str | None]:
+    """补全绘图的时间范围：缺失的一端取所选标签的实际最早/最晚时间（来自 tag 目录）"""
     if start_time and end_time:
-        time_filter = f"AND Time >= '{start_time}' AND Time <= '{end_time}'"
-    elif start_time:
-        time_filter = f"AND Time >= '{start_time}'"
-    elif end_time:
-        time_filter = f"AND Time <= '{end_time}'"
-    
-    # 构建查询，获取所有选中标签的数据
-    tag_list_str = "','".join(tags)
-    query = f"""
-    SELECT Time, Name, Value
+        return start_time, end_time
+    
+    if not TAG_CATALOG.synced(table_name):
+        _sync_tag_catalog(table_name)
+    return _clip_time_range(start_time, end_time, *TAG_CATALOG.time_range(table_name, tags))
+
+def _clip_time_range(
+    start_time: str | None, end_time: str | None, first_us: int | None, last_us: int | None
+) -> tuple[str | None, str | None]:
+    """用数据的实际范围补全缺失的一端；与数据没有交集时返回 (None, None)"""
+    if first_us is None:
+        return None, None
+    if start_time and _to_epoch_us(start_time) > last_us:
+        return None, None
+    if end_time and _to_epoch_us(end_time) < first_us:
+        return None, None
+    return start_time or format_epoch_us(first_us), end_time or format_epoch_us(last_us)
+
+def _fetch_sampled_batch(
+    table_name: str,
+    tags: list[str],
+    time_filter: str,
+    sample_seconds: int,
+    aggregates: dict[str, str] = RAW_AGGREGATES,
+) -> dict[str, list[dict]]:
+    """
+    在 QuestDB 中按 SAMPLE BY 分桶聚合（min/max 降采样）
+    
+    每个桶输出最小值和最大值两个点（按 first/last 的走向排序），尖峰不会被平均掉；
+    table_name 可以是汇总表，此时 aggregates 为汇总列上的表达式
+    """
+    columns = QUESTDB.exp_columns(
+        _sampled_batch_query(table_name, tags, time_filter, sample_seconds, aggregates),
+        SAMPLED_CONVERTERS,
+        timeout=app.config["CHART_QUERY_TIMEOUT"],
+    )
+    return _sampled_series(tags, columns)
+
+def _sampled_batch_query(
+    table_name: str,
+    tags: list[str],
+    time_filter: str,
+    sample_seconds: int,
+    aggregates: dict[str, str] = RAW_AGGREGATES,
+) -> str:
+    tag_list_str = ",".join(_quote_sql_str(tag) for tag in tags)
+    metrics = ", ".join(aggregates[column] for column in ("first", "last", "min", "max", "count"))
+    return f"""
+    SELECT Time, Name, {metrics}
     FROM {table_name}
-    WHERE Name IN ('{tag_list_str}')
-    {time_filter}
-    ORDER BY Time ASC;
+    WHERE Name IN ({tag_list_str}) {time_filter}
+    SAMPLE BY {sample_seconds}s ALIGN TO CALENDAR;
     """
+
+def _sampled_series(tags: list[str], columns: list[list]) -> dict[str, list[dict]]:
+    """每个桶按 first/last 的走向输出最小值和最大值两个点"""
+    series = {tag: [] for tag in tags}
+    for ts, name, first, last, low, high, count in zip(*columns):
+        points = series.get(name)
+        if points is None or low is None:
+            continue
+        if count == 1 or low == high:
+            points.append({"time": ts, "value": first})
+        elif first <= last:
+            points.append({"time": ts, "value": low})
+            points.append({"time": ts, "value": high})
+        else:
+            points.append({"time": ts, "value": high})
+            points.append({"time": ts, "value": low})
     
-    response = requests.get(
-        app.config["QUESTDB_EXEC_URL"],
-        params={"query": query},
-        timeout=60,
+    for points in series.values():
+        points.sort(key=lambda point: point["time"])
+    return series
+
+def _chart_max_points(value) -> int | None:
+    """请求中的 max_points，限制在 [CHART_MIN_POINTS, CHART_MAX_POINTS]"""
+    if value is None:
+        return None
+    try:
+        max_points = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("max_points 必须为整数") from None
+    return min(max(max_points, app.config["CHART_MIN_POINTS"]), app.config["CHART_MAX_POINTS"])
+
+def _chart_sample_seconds(range_start: str, range_end: str, max_points: int) -> int:
+    """覆盖整个时间范围、点数不超过 max_points 的桶宽（每个桶最多产生 2 个点）"""
+    # 按 Unix 微秒计算：起止时间一端带时区、一端不带时也能相减（无时区按 UTC）
+    span = (_to_epoch_us(range_end) - _to_epoch_us(range_start)) / 1_000_000
+    buckets = max(1, max_points // 2)
+    return max(1, math.ceil(span / buckets))
+
+def _fetch_chart_series(
+    table_name: str,
+    tags: list[str],
+    start_time: str | None,
+    end_time: str | None,
+    max_points: int | None = None,
+) -> tuple[dict[str, list[dict]], int | None]:
+    """
+    批量获取多个标签的时序数据：按批查询，批次之间有限并发
+    
+    指定 max_points 时覆盖整个时间范围并降采样，返回 (数据, 桶宽秒数)
+    """
+    time_filter = _build_time_filter(start_time, end_time)
+    tags = list(dict.fromkeys(tags))
+    batch_size = app.config["CHART_BATCH_TAGS"]
+    batches = [tags[i:i + batch_size] for i in range(0, len(tags), batch_size)]
+    
+    sample_seconds = None
+    fetch = _fetch_chart_batch
+    extra_args = ()
+    if max_points:
+        range_start, range_end = _chart_time_range(table_name, tags, start_time, end_time)
+        if not range_start or not range_end:
+            return {tag: [] for tag in tags}, None
+        sample_seconds = _chart_sample_seconds(range_start, range_end, max_points)
+        # 长时间范围改从最粗的可用汇总表读取
+        source, aggregates, sample_seconds = _aggregate_source(
+            table_name,
+            sample_seconds,
+            end_us=_to_epoch_us(end_time) if end_time else None,
+            data_end_us=_to_epoch_us(range_end),
+        )
+        table_name = source
+        fetch = _fetch_sampled_batch
+        extra_args = (sample_seconds, aggregates)
+    
+    if len(batches) == 1:
+        return fetch(table_name, batches[0], time_filter, *extra_args), sample_seconds
+    
+    result = {}
+    workers = min(app.config["CHART_MAX_WORKERS"], len(batches))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(fetch, table_name, batch, time_filter, *extra_args)
+            for batch in batches
+        ]
+        for future in futures:
+            result.update(future.result())
+    return result, sample_seconds
+
+_BUCKET_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+def _parse_bucket_seconds(value) -> int:
+    """桶宽：整数秒或 30s / 1m / 1h / 1d 形式"""
+    if isinstance(value, int) and not isinstance(value, bool):
+        seconds = value
+    else:
+        match = re.fullmatch(r"\s*(\d+)\s*([smhd]?)\s*", str(value))
+        if not match:
+            raise ValueError(f"无效的桶宽: {value}")
+        seconds = int(match.group(1)) * _BUCKET_UNITS[match.group(2) or "s"]
+    if seconds <= 0:
+        raise ValueError("桶宽必须大于 0")
+    return seconds
+
+def _csv_int(value: str) -> int | None:
+    return int(value) if value else None
+
+# 导出/聚合请求的整体截止时间（time.monotonic），只在处理该请求的线程中设置
+_REQUEST_DEADLINE = threading.local()
+
+@contextmanager
+def _request_deadline(deadline: float) -> Iterator[None]:
+    _REQUEST_DEADLINE.value = deadline
+    try:
+        yield
+    finally:
+        _REQUEST_DEADLINE.value = None
+
+def _export_timeout() -> float:
+    """导出/聚合中单次 QuestDB 调用的超时：EXPORT_QUERY_TIMEOUT 与请求剩余时间取较小值"""
+    timeout = app.config["EXPORT_QUERY_TIMEOUT"]
+    deadline = getattr(_REQUEST_DEADLINE, "value", None)
+    if deadline is None:
+        return timeout
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise requests.Timeout("超过导出请求的总时限")
+    return min(timeout, remaining)
+
+def _with_deadline(chunks: Iterator[str], deadline: float) -> Iterator[str]:
+    """流式响应的每一块都在截止时间内生成；超时抛出 requests.Timeout，响应在中途断开"""
+    chunks = iter(chunks)
+    try:
+        while True:
+            with _request_deadline(deadline):
+                if time.monotonic() > deadline:
+                    app.logger.error("Export stream exceeded EXPORT_REQUEST_TIMEOUT, aborting")
+                    raise requests.Timeout("超过导出请求的总时限")
+                chunk = next(chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        # 提前结束时让内层生成器清理临时文件
+        if hasattr(chunks, "close"):
+            chunks.close()
+
+def _fetch_aggregate_batch(
+    table_name: str,
+    tags: list[str],
+    time_filter: str,
+    bucket_seconds: int,
+    fill: str,
+    aggregates: dict[str, str] = RAW_AGGREGATES,
+) -> dict[str, dict[str, list]]:
+    """
+    一批标签的分桶聚合（SAMPLE BY ... FILL），按标签返回列式结果：
+    {"time": [毫秒时间戳...], "avg": [...], "min": [...], "max": [...], "first": [...], "last": [...], "count": [...]}
+    """
+    tag_list_str = ",".join(_quote_sql_str(tag) for tag in tags)
+    metrics = ", ".join(f"{aggregates[column]} agg_{column}" for column in AGGREGATE_COLUMNS)
+    query = f"""
+    SELECT Name, cast(Time AS LONG), {", ".join(f"agg_{column}" for column in AGGREGATE_COLUMNS)}
+    FROM (
+        SELECT Time, Name, {metrics}
+        FROM {table_name}
+        WHERE Name IN ({tag_list_str}) {time_filter}
+        SAMPLE BY {bucket_seconds}s {AGGREGATE_FILLS[fill]} ALIGN TO CALENDAR
     )
-    response.raise_for_status()
-    data = response.json()
+    ORDER BY Name, Time;
+    """
+    names, times, *values = QUESTDB.exp_columns(
+        query,
+        (str, int, _csv_float, _csv_float, _csv_float, _csv_float, _csv_float, _csv_int),
+        timeout=_export_timeout(),
+    )
+    
+    series = {tag: {"time": [], **{column: [] for column in AGGREGATE_COLUMNS}} for tag in tags}
+    # 结果按 Name 排序，逐段切分
+    start = 0
+    while start < len(names):
+        name = names[start]
+        end = start
+        while end < len(names) and names[end] == name:
+            end += 1
+        columns = series.get(name)
+        if columns is not None:
+            columns["time"] = [ts // 1000 for ts in times[start:end]]
+            for column, column_values in zip(AGGREGATE_COLUMNS, values):
+                columns[column] = column_values[start:end]
+        start = end
+    return series
+
+def _iter_aggregate_json(
+    first_series: dict[str, dict[str, list]],
+    fetch_rest: Iterator[dict[str, dict[str, list]]],
+    bucket_seconds: int,
+    fill: str,
+) -> Iterator[str]:
+    """逐批输出 JSON：第一批已在请求线程中取回（出错时返回 502），其余批次边查边写"""
+    yield '{"success":true,"bucket_seconds":%d,"fill":%s,"series":{' % (bucket_seconds, json.dumps(fill))
+    separator = ""
+    try:
+        for series in itertools.chain([first_series], fetch_rest):
+            for tag, columns in series.items():
+                yield separator + json.dumps(tag) + ":" + json.dumps(columns, separators=(",", ":"))
+                separator = ","
+    except requests.RequestException as exc:
+        app.logger.error("QuestDB aggregate stream aborted: %s", exc)
+        raise
+    yield "}}"
+
+def _format_clc_time(timestamp: str) -> str:
+    """格式化时间戳为 M-D-YYYY HH:MM:SS"""
+    try:
+        dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+        return dt.strftime("%m-%d-%Y %H:%M:%S")
+    except ValueError:
+        return timestamp
+
+def _to_epoch_us(value: str) -> int:
+    """ISO 时间戳转为 Unix 微秒（无时区按 UTC）"""
+    dt = _parse_questdb_time(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return (dt - datetime(1970, 1, 1, tzinfo=timezone.utc)) // timedelta(microseconds=1)
+
+def _generate_clc_file(
+    table_name: str,
+    tags: list[str],
+    start_time: str,
+    end_time: str,
+    interval_seconds: int | None = None,
+    fill: str = "last",
+) -> Iterator[str]:
+    """
+    生成 CLC 格式文件内容（流式），内存占用只与 CLC_PAGE_ROWS 有关
     
-    # 2. 组织数据：按时间戳分组
-    from collections import defaultdict
-    time_data = defaultdict(dict)  # {timestamp: {tag: value}}
+    指定 interval_seconds 时重采样到固定网格（头部的采样间隔与数据一致）；
+    否则按原始时间戳并集逐行输出
+    """
+    if interval_seconds:
+        return _generate_resampled_clc(table_name, tags, start_time, end_time, interval_seconds, fill)
     
-    for row in data.get("dataset", []):
-        timestamp = row[0]
-        tag_name = row[1]
-        value = row[2]
-        time_data[timestamp][tag_name] = value
+    time_filter = _build_time_filter(start_time, end_time)
+    tag_list_str = ",".join(_quote_sql_str(tag) for tag in tags)
     
-    if not time_data:
+    # 1. 统计所有选中标签的时间戳数量和起始时间（头部需要）
+    summary_query = f"""
+    SELECT count() AS rows_count, min(Time) AS first_ts
+    FROM (
+        SELECT DISTINCT Time
+        FROM {table_name}
+        WHERE Name IN ({tag_list_str})
+        {time_filter}
+    );
+    """
+    dataset = QUESTDB.exec(summary_query, timeout=_export_timeout()).get("dataset") or []
+    rows_count = dataset[0][0] if dataset else 0
+    if not rows_count:
         raise ValueError("时间范围内没有数据")
     
-    timestamps = sorted(time_data.keys())
-    first_timestamp = timestamps[0]
-    rows_count = len(timestamps)
+    header = _clc_header(table_name, tags, _format_clc_time(dataset[0][1]), 60, rows_count)
+    pages = _iter_raw_clc_pages(table_name, tags, tag_list_str, time_filter)
+    return _iter_clc_lines(table_name, tags, header, pages)
+
+def _generate_resampled_clc(
+    table_name: str,
+    tags: list[str],
+    start_time: str | None,
+    end_time: str | None,
+    interval_seconds: int,
+    fill: str,
+) -> Iterator[str]:
+    """
+    重采样到 [start, end) 上间隔 interval_seconds 的固定网格，共 (end - start) / interval 行
     
-    # 3. 生成 CLC 文件内容
-    buffer = StringIO()
+    每页在 QuestDB 中按网格分桶聚合（last 取桶内最后一个值，avg/linear 取桶平均），
+    空桶由 GridFiller 填充；缺失的范围端点取所选标签的实际最早/最晚时间
+    """
+    if fill not in FILL_METHODS:
+        raise ValueError(f"不支持的填充方式: {fill}")
     
-    # 第1-7行：头部信息
-    buffer.write(f"{table_name}\n")
-    buffer.write("PHD Data Export\n")
-    buffer.write(f"{len(tags)}\n")
-    buffer.write(f"{TAGS_PER_GROUP}\n")
+    range_start, range_end = _chart_time_range(table_name, tags, start_time, end_time)
+    if not range_start or not range_end:
+        raise ValueError("时间范围内没有数据")
     
-    # 格式化开始时间为 M-D-YYYY HH:MM:SS
-    try:
-        from datetime import datetime
-        dt = datetime.fromisoformat(first_timestamp.replace('Z', '+00:00'))
-        formatted_time = dt.strftime("%m-%d-%Y %H:%M:%S")
-    except:
-        formatted_time = first_timestamp
+    interval_us = interval_seconds * 1_000_000
+    grid_start = _to_epoch_us(range_start) // interval_us * interval_us
+    end_us = _to_epoch_us(range_end)
+    if end_time:
+        rows_count = -(-(end_us - grid_start) // interval_us)
+    else:
+        # 范围取自数据时包含最后一个数据点所在的桶
+        rows_count = (end_us - grid_start) // interval_us + 1
+    if rows_count <= 0:
+        raise ValueError("时间范围为空")
+    if rows_count > app.config["CLC_MAX_ROWS"]:
+        raise ValueError("网格行数过多，请增大间隔或缩小时间范围")
     
-    buffer.write(f"{formatted_time}\n")
-    buffer.write("60\n")
-    buffer.write(f"{rows_count}\n")
+    first_time = format_clc_times(np.array([grid_start], dtype=np.int64))[0]
+    header = _clc_header(table_name, tags, first_time, interval_seconds, rows_count)
+    pages = _iter_resampled_clc_pages(table_name, tags, grid_start, interval_us, rows_count, fill)
+    return _iter_clc_lines(table_name, tags, header, pages)
+
+def _clc_header(
+    table_name: str, tags: list[str], first_time: str, interval_seconds: int, rows_count: int
+) -> str:
+    """头部信息（第1-7行）、分隔线、标签列表（固定40字符长度）"""
+    separator = "=" * 80 + "\n"
+    header = [
+        f"{table_name}\n",
+        "PHD Data Export\n",
+        f"{len(tags)}\n",
+        f"{TAGS_PER_GROUP}\n",
+        f"{first_time}\n",
+        f"{interval_seconds}\n",
+        f"{rows_count}\n",
+        separator,
+    ]
+    header.extend(f"{f'{tag}~~~{tag}~~~~~~'[:40]}\n" for tag in tags)
+    header.append(separator)
+    return "".join(header)
+
+def _tag_codes(names: list[str], tag_index: dict[str, int]) -> np.ndarray:
+    """查询结果中的 Name 列映射为 tag 编号，不在所选标签中的为 -1"""
+    if not names:
+        return np.empty(0, dtype=np.int64)
+    uniq_names, inverse = np.unique(np.array(names), return_inverse=True)
+    lookup = np.array([tag_index.get(name, -1) for name in uniq_names], dtype=np.int64)
+    return lookup[inverse]
+
+def _iter_raw_clc_pages(
+    table_name: str, tags: list[str], tag_list_str: str, time_filter: str
+) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+    """
+    按原始时间戳并集分页，产出 (时间轴微秒, unique tags × time 数组)
+
+    一次按时间顺序流式读取 /exp（指定时间戳列本身有序，不需要额外排序），
+    每凑满 CLC_PAGE_ROWS 个不同时间戳切一页；同一时间戳的数据不会被拆到两页
+    """
+    page_rows = app.config["CLC_PAGE_ROWS"]
+    tag_index = {tag: i for i, tag in enumerate(dict.fromkeys(tags))}
+    query = f"""
+    SELECT cast(Time AS LONG), Name, Value
+    FROM {table_name}
+    WHERE Name IN ({tag_list_str})
+    {time_filter}
+    ORDER BY Time ASC;
+    """
+    
+    def build_page(times: list[int], names: list[str], values: list) -> tuple[np.ndarray, np.ndarray]:
+        times_us = np.array(times, dtype=np.int64)
+        timeline_us = np.unique(times_us)
+        matrix = pivot_page(
+            timeline_us,
+            times_us,
+            _tag_codes(names, tag_index),
+            np.array(values, dtype=np.float64),
+            len(tag_index),
+        )
+        return timeline_us, matrix
     
-    # 第8行：分隔线
-    buffer.write("=" * 80 + "\n")
+    times, names, values = [], [], []
+    distinct = 0
+    previous = None
+    for ts, name, value in QUESTDB.exp_rows(query, timeout=_export_timeout()):
+        ts = int(ts)
+        if ts != previous:
+            if distinct == page_rows:
+                yield build_page(times, names, values)
+                times, names, values = [], [], []
+                distinct = 0
+            distinct += 1
+            previous = ts
+        times.append(ts)
+        names.append(name)
+        values.append(_csv_float(value))
+    if times:
+        yield build_page(times, names, values)
+
+def _iter_resampled_clc_pages(
+    table_name: str,
+    tags: list[str],
+    grid_start: int,
+    interval_us: int,
+    rows_count: int,
+    fill: str,
+) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+    """按固定网格分页，产出 (网格时间微秒, unique tags × rows 填充后的数组)"""
+    page_rows = app.config["CLC_PAGE_ROWS"]
+    tag_index = {tag: i for i, tag in enumerate(dict.fromkeys(tags))}
+    tag_list_str = ",".join(_quote_sql_str(tag) for tag in tag_index)
+    aggregate = "last" if fill == "last" else "avg"
     
-    # 第9行开始：标签列表（格式化为固定长度）
-    for tag in tags:
-        formatted_tag = f"{tag}~~~{tag}~~~~~~"[:40]  # 固定40字符长度
-        buffer.write(f"{formatted_tag}\n")
+    def fetch(first_row: int, end_row: int) -> np.ndarray:
+        """网格 [first_row, end_row) 行的桶聚合值，空桶为 NaN"""
+        page_start = grid_start + first_row * interval_us
+        query = f"""
+        SELECT Name, (cast(Time AS LONG) - {page_start}) / {interval_us} AS bucket, {aggregate}(Value)
+        FROM {table_name}
+        WHERE Name IN ({tag_list_str})
+        AND Time >= cast({page_start} AS TIMESTAMP)
+        AND Time < cast({grid_start + end_row * interval_us} AS TIMESTAMP)
+        GROUP BY Name, bucket;
+        """
+        names, buckets, values = QUESTDB.exp_columns(query, (str, int, _csv_float), timeout=_export_timeout())
+        return pivot_buckets(
+            np.array(buckets, dtype=np.int64),
+            _tag_codes(names, tag_index),
+            np.array(values, dtype=np.float64),
+            len(tag_index),
+            end_row - first_row,
+        )
     
-    # 再次分隔
-    buffer.write("=" * 80 + "\n")
+    unique_tags = list(tag_index)
+    grid_end = grid_start + rows_count * interval_us
+    
+    def next_known(codes: np.ndarray, first_row: int) -> tuple[np.ndarray, np.ndarray]:
+        """指定 tag 在网格第 first_row 行及之后的第一个非空桶 (行号, 聚合值)，没有时行号为 -1"""
+        pos = np.full(len(codes), -1, dtype=np.int64)
+        values = np.full(len(codes), np.nan)
+        names = [unique_tags[code] for code in codes]
+        first_query = f"""
+        SELECT Name, min(cast(Time AS LONG))
+        FROM {table_name}
+        WHERE Name IN ({",".join(_quote_sql_str(name) for name in names)})
+        AND Time >= cast({grid_start + first_row * interval_us} AS TIMESTAMP)
+        AND Time < cast({grid_end} AS TIMESTAMP)
+        AND Value IS NOT NULL
+        GROUP BY Name;
+        """
+        found_names, found_times = QUESTDB.exp_columns(first_query, (str, int), timeout=_export_timeout())
+        if not found_names:
+            return pos, values
+        
+        # 再对每个 tag 的这一个桶做与 fetch 相同的聚合
+        buckets = {name: (ts - grid_start) // interval_us for name, ts in zip(found_names, found_times)}
+        conditions = " OR ".join(
+            f"(Name = {_quote_sql_str(name)}"
+            f" AND Time >= cast({grid_start + bucket * interval_us} AS TIMESTAMP)"
+            f" AND Time < cast({grid_start + (bucket + 1) * interval_us} AS TIMESTAMP))"
+            for name, bucket in buckets.items()
+        )
+        bucket_query = f"""
+        SELECT Name, {aggregate}(Value)
+        FROM {table_name}
+        WHERE {conditions}
+        GROUP BY Name;
+        """
+        agg_names, agg_values = QUESTDB.exp_columns(bucket_query, (str, _csv_float), timeout=_export_timeout())
+        index = {name: i for i, name in enumerate(names)}
+        for name, value in zip(agg_names, agg_values):
+            if name in index and not np.isnan(value):
+                pos[index[name]] = buckets[name]
+                values[index[name]] = value
+        return pos, values
+    
+    # 网格开始前每个 tag 的最后一个值，作为前向填充/插值的起点
+    prior_query = f"""
+    SELECT Name, Value
+    FROM {table_name}
+    WHERE Name IN ({tag_list_str}) AND Time < cast({grid_start} AS TIMESTAMP)
+    LATEST ON Time PARTITION BY Name;
+    """
+    names, values = QUESTDB.exp_columns(prior_query, (str, _csv_float), timeout=_export_timeout())
+    initial = np.full(len(tag_index), np.nan)
+    codes = _tag_codes(names, tag_index)
+    valid = codes >= 0
+    initial[codes[valid]] = np.array(values, dtype=np.float64)[valid]
+    filler = GridFiller(fill, initial, next_known if fill == "linear" else None)
+    
+    # 下一页先取回，线性插值可以跨页；跨过多页的空缺由 next_known 查到后面的已知值
+    current = fetch(0, min(page_rows, rows_count))
+    for first_row in range(0, rows_count, page_rows):
+        end_row = min(first_row + page_rows, rows_count)
+        following = fetch(end_row, min(end_row + page_rows, rows_count)) if end_row < rows_count else None
+        grid_times = grid_start + np.arange(first_row, end_row, dtype=np.int64) * interval_us
+        yield grid_times, filler.fill(first_row, current, following)
+        current = following
+
+def _iter_clc_lines(
+    table_name: str,
+    tags: list[str],
+    header: str,
+    pages: Iterator[tuple[np.ndarray, np.ndarray]],
+) -> Iterator[str]:
+    """
+    先输出头部，再逐页输出数据：第一组直接输出，其余各组写入临时文件，最后按组顺序输出
+    """
+    separator = "=" * 80 + "\n"
+    yield header
     
-    # 4. 按组写入数据
-    # 计算需要分成多少组
+    tag_index = {tag: i for i, tag in enumerate(dict.fromkeys(tags))}
+    tag_rows = np.array([tag_index[tag] for tag in tags], dtype=np.int64)
     num_groups = (len(tags) + TAGS_PER_GROUP - 1) // TAGS_PER_GROUP
+    group_rows = [
+        tag_rows[group_idx * TAGS_PER_GROUP:(group_idx + 1) * TAGS_PER_GROUP]
+        for group_idx in range(num_groups)
+    ]
+    spools = [tempfile.TemporaryFile("w+", encoding="utf-8") for _ in group_rows[1:]]
     
-    for group_idx in range(num_groups):
-        # 如果不是第一组，添加分隔线
-        if group_idx > 0:
-            buffer.write("=" * 80 + "\n")
+    try:
+        for timeline_us, matrix in pages:
+            time_strs = format_clc_times(timeline_us)
+            yield format_group_rows(time_strs, matrix[group_rows[0]])
+            for spool, rows in zip(spools, group_rows[1:]):
+                spool.write(format_group_rows(time_strs, matrix[rows]))
+        
+        for spool in spools:
+            yield separator
+            spool.seek(0)
+            yield from iter(lambda: spool.read(1 << 20), "")
+    except requests.RequestException as exc:
+        app.logger.error("CLC export aborted mid-stream for %s: %s", table_name, exc)
+        raise
+    finally:
+        for spool in spools:
+            spool.close()
+
+@contextmanager
+def _import_sink(transport: str, table_name: str) -> Iterator[tuple]:
+    """
+    按传输方式返回 (encode, send)：encode 把 RecordBatch 流编码为 (payload, rows) 批次，
+    send(index, payload) 把一个批次写入 QuestDB 并返回被拒绝的行数
+    """
+    if transport == "csv":
+        def send_csv(index: int, payload: str) -> int:
+            response = QUESTDB.imp(table_name, payload, filename=f"import_{index}.csv", timeout=60)
+            return _imp_rejected_rows(response)
         
-        # 当前组的标签
-        start_idx = group_idx * TAGS_PER_GROUP
-        end_idx = min(start_idx + TAGS_PER_GROUP, len(tags))
-        group_tags = tags[start_idx:end_idx]
+        yield lambda batches: iter_csv_chunks(batches, app.config["IMPORT_CHUNK_ROWS"]), send_csv
+        return
+    
+    # ILP 没有逐行的拒绝统计，服务端拒绝时整批报错；编码时丢弃的非有限值按被拒绝的行计
+    def encode(batches: Iterator[RecordBatch]) -> Iterator[tuple]:
+        for payload, rows, dropped in iter_ilp_batches(
+            table_name, batches, app.config["ILP_BATCH_ROWS"], app.config["ILP_BATCH_BYTES"]
+        ):
+            yield (payload, dropped), rows + dropped
+    
+    if transport == "ilp-http":
+        def send_http(index: int, item: tuple[bytes, int]) -> int:
+            payload, dropped = item
+            if payload:
+                QUESTDB.ilp_write(payload, timeout=60)
+            return dropped
         
-        # 数据行：每行包含时间戳和当前组的标签值
-        for timestamp in timestamps:
-            row_values = time_data[timestamp]
+        yield encode, send_http
+    else:
+        with IlpTcpSender(app.config["QUESTDB_ILP_HOST"], app.config["QUESTDB_ILP_PORT"]) as sender:
+            def send_tcp(index: int, item: tuple[bytes, int]) -> int:
+                payload, dropped = item
+                if payload:
+                    sender.send(payload)
+                return dropped
             
-            # 格式化时间戳
+            yield encode, send_tcp
+
+def _ensure_ilp_table(table_name: str) -> None:
+    """
+    ILP 写入不存在的表时会自动建表，指定时间戳列名为 timestamp；
+    写入前按项目表结构建表，并检查已有表的指定时间戳列是 Time
+    """
+    if not re.match(r'^[a-zA-Z0-9_]+$', table_name):
+        raise ValueError("表名只能包含字母、数字和下划线")
+    result = QUESTDB.exec(_create_table_sql(table_name, app.config["TABLE_DEDUP"]), timeout=10)
+    if result.get("error"):
+        raise ValueError(f"创建表失败: {result['error']}")
+    query = f"SELECT designatedTimestamp FROM tables() WHERE table_name = {_quote_sql_str(table_name)};"
+    dataset = QUESTDB.exec(query, timeout=10).get("dataset") or []
+    if not dataset or dataset[0][0] != "Time":
+        raise ValueError(f"表 {table_name} 的指定时间戳列不是 Time，不能通过 ILP 导入")
+
+def _imp_rejected_rows(response: requests.Response) -> int:
+    """从 /imp 的 JSON 响应中读取被拒绝的行数"""
+    try:
+        return int(response.json().get("rowsRejected", 0))
+    except (ValueError, AttributeError):
+        return 0
+
+def _fetch_tag_ranges(table_name: str) -> dict[str, tuple[int, int]]:
+    """
+    表中每个 tag 已有数据的时间范围（Unix 微秒，来自 tag 目录）；表不存在时返回空，
+    连接失败/超时照常抛出（取不到范围时不能去重）
+    """
+    try:
+        tags = _catalog_tags(table_name)
+    except requests.HTTPError as exc:
+        app.logger.warning("Tag ranges unavailable for %s: %s", table_name, exc)
+        return {}
+    return {tag: (first, last) for tag, first, last, _ in tags}
+
+def _previous_tag_counts(table_name: str) -> dict[str, int] | None:
+    """导入前各 tag 的行数（来自 tag 目录，未同步时先同步）；取不到时返回 None"""
+    try:
+        return {tag: count for tag, _, _, count in _catalog_tags(table_name)}
+    except requests.RequestException as exc:
+        app.logger.warning("Tag counts unavailable for %s: %s", table_name, exc)
+        return None
+
+def _update_dedup_catalog(job: ImportJob, tags: list[str], previous_counts: dict[str, int] | None) -> None:
+    """去重表导入完成后：等待 WAL 应用，重新统计导入涉及的 tag，并按实际新增行数修正任务统计"""
+    try:
+        applied = _wait_for_wal(job.table_name, app.config["WAL_APPLY_TIMEOUT"])
+        rows = _recount_tags(job.table_name, tags) if applied else None
+    except requests.RequestException as exc:
+        app.logger.warning("Tag recount failed for %s: %s", job.table_name, exc)
+        rows = None
+    if rows is None:
+        # 统计不准确时整张表下次访问时重新同步
+        TAG_CATALOG.forget(job.table_name)
+        return
+    TAG_CATALOG.update_tags(job.table_name, rows)
+    if previous_counts is None:
+        return
+    added = sum(count for _, _, _, count in rows) - sum(previous_counts.get(tag, 0) for tag in tags)
+    added = max(0, min(added, job.rows_ingested))
+    job.rows_replaced = job.rows_ingested - added
+    job.rows_ingested = added
+
+def _run_import_job(job: ImportJob) -> None:
+    """后台执行导入任务：流式解析 -> 按块编码（CSV 或 ILP）-> 逐块写入 QuestDB"""
+    def on_progress(bytes_read: int) -> None:
+        job.bytes_read = bytes_read
+
+    # 去重模式：跳过各 tag 已有时间范围内的记录（导入任务按表串行，范围在此刻是准确的）
+    range_filter = None
+    if job.mode == "dedup":
+        try:
+            range_filter = TagRangeFilter(_fetch_tag_ranges(job.table_name))
+        except requests.RequestException as exc:
+            job.error = f"QuestDB 导入失败: 无法读取已有数据范围 ({exc})"
+            raise
+
+    # 写入数据的时间跨度（Unix 微秒），导入后只重算这一段的汇总表
+    span = [None, None]
+    # 各 tag 的统计，导入完整成功后合并进 tag 目录
+    tag_stats = TagStats()
+    completed = False
+    # ILP 导入先建表，之后才能判断是否为去重表
+    if job.transport != "csv":
+        try:
+            _ensure_ilp_table(job.table_name)
+        except (requests.RequestException, ValueError) as exc:
+            job.error = f"QuestDB 导入失败: {exc}"
+            raise
+    # 去重表中重复的 (Time, Name) 会覆盖旧行，行数不能累加：导入后重新统计导入涉及的 tag
+    dedup_table = _is_dedup_table(job.table_name)
+    previous_counts = _previous_tag_counts(job.table_name) if dedup_table else None
+
+    def counted(batches: Iterator[RecordBatch]) -> Iterator[RecordBatch]:
+        for batch in batches:
+            job.check_cancelled()
+            job.rows_parsed += len(batch)
+            if range_filter is not None:
+                batch = range_filter(batch)
+                job.skipped = range_filter.skipped
+            if len(batch):
+                low, high = int(batch.times.min()), int(batch.times.max())
+                span[0] = low if span[0] is None else min(span[0], low)
+                span[1] = high if span[1] is None else max(span[1], high)
+                tag_stats.add(batch)
+                yield batch
+
+    batches = iter_file_batches(
+        job.path,
+        batch_rows=app.config["IMPORT_BATCH_ROWS"],
+        workers=app.config["IMPORT_PARSE_WORKERS"],
+        progress=on_progress,
+    )
+    try:
+        with _import_sink(job.transport, job.table_name) as (encode, send):
+            for index, (payload, rows) in enumerate(encode(counted(batches))):
+                job.check_cancelled()
+                rejected = send(index, payload)
+                
+                job.rows_ingested += rows - rejected
+                job.rejects += rejected
+                job.chunks += 1
+                app.logger.info(
+                    "QuestDB import job %s %s (%s) chunk %d: %d rows, %d rejected (total %d)",
+                    job.id, job.table_name, job.transport, index, rows, rejected, job.rows_ingested,
+                )
+        completed = True
+    except ValueError as exc:
+        job.error = f"文件格式错误: {exc}"
+        raise
+    except (requests.RequestException, OSError) as exc:
+        job.error = f"QuestDB 导入失败: {exc}"
+        raise
+    finally:
+        # 已写入数据则清除该表的元数据缓存并更新汇总表
+        if job.rows_ingested:
+            _invalidate_table_cache(job.table_name)
+            # 只写入了一部分或有被拒绝的行时目录不再准确，下次访问时重新同步
+            if completed and not job.rejects:
+                if dedup_table:
+                    _update_dedup_catalog(job, tag_stats.tags(), previous_counts)
+                else:
+                    TAG_CATALOG.merge(job.table_name, tag_stats)
+            else:
+                TAG_CATALOG.forget(job.table_name)
             try:
-                dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-                time_str = dt.strftime("%m-%d-%Y %H:%M:%S")
-            except:
-                time_str = timestamp
-            
-            buffer.write(time_str)
-            
-            # 写入当前组的标签值
-            for tag in group_tags:
-                value = row_values.get(tag, 0.0)
-                buffer.write(f",{value},G")
-            
-            buffer.write("\n")
+                _refresh_rollups(job.table_name, span[0], span[1])
+            except requests.RequestException as exc:
+                app.logger.warning("Rollup refresh failed for %s: %s", job.table_name, exc)
     
-    return buffer.getvalue()
+    job.bytes_read = job.bytes_total
+    if not job.rows_ingested and not job.rows_replaced and not job.skipped:
+        raise ValueError("文件中没有有效数据")
+
+def _cleanup_import_job(job: ImportJob) -> None:
+    if os.path.exists(job.path):
+        os.unlink(job.path)
+
+IMPORT_JOBS = ImportJobManager(
+    run=_run_import_job,
+    cleanup=_cleanup_import_job,
+    max_workers=app.config["IMPORT_JOB_WORKERS"],
+    max_pending=app.config["IMPORT_JOB_MAX_PENDING"],
+    history=app.config["IMPORT_JOB_HISTORY"],
+    logger=app.logger,
+)
+
+# 查询准入控制：交互查询（图表、表信息）与批量查询（导出、聚合）分别限流；
+# 排队中的批量请求占用工作线程，QUERY_BULK_QUEUE_SIZE + QUERY_BULK_LIMIT 应明显小于 gunicorn 线程数
+QUERY_SCHEDULER = QueryScheduler(
+    interactive_limit=app.config["QUERY_INTERACTIVE_LIMIT"],
+    interactive_per_user=app.config["QUERY_INTERACTIVE_PER_USER"],
+    bulk_limit=app.config["QUERY_BULK_LIMIT"],
+    bulk_per_user=app.config["QUERY_BULK_PER_USER"],
+    bulk_queue_size=app.config["QUERY_BULK_QUEUE_SIZE"],
+    bulk_queue_per_user=app.config["QUERY_BULK_QUEUE_PER_USER"],
+    bulk_queue_timeout=app.config["QUERY_BULK_QUEUE_TIMEOUT"],
+)
+
+def _visible_import_job(job_id: str) -> ImportJob | None:
+    """当前用户可见的任务：管理员可见全部，其他用户只能看到自己的任务"""
+    job = IMPORT_JOBS.get(job_id)
+    if job is None or (job.user != request.user and not _is_admin(request.user)):
+        return None
+    return job
 
 def _auth_required(fn):
     @wraps(fn)
@@ -334,6 +1445,38 @@ def _auth_required(fn):
 
     return wrapper
 
+def _rejected_response(exc: QueryRejected):
+    response = jsonify(success=False, message=str(exc), retry_after=exc.retry_after)
+    response.status_code = 429
+    response.headers["Retry-After"] = str(exc.retry_after)
+    return response
+
+def _admission(kind: str):
+    """
+    查询准入：超出并发上限时返回 429 和 Retry-After
+
+    名额在响应关闭时释放，流式响应（导出、聚合）会一直占用到输出结束；需放在 _auth_required 之后
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            try:
+                ticket = QUERY_SCHEDULER.admit(kind, request.user)
+            except QueryRejected as exc:
+                app.logger.warning("Query rejected for %s (%s): %s", request.user, kind, exc)
+                return _rejected_response(exc)
+            try:
+                response = app.make_response(fn(*args, **kwargs))
+            except BaseException:
+                ticket.release()
+                raise
+            response.call_on_close(ticket.release)
+            return response
+
+        return wrapper
+
+    return decorator
+
 @app.post("/api/login")
 def login():
     payload = request.get_json(silent=True) or {}
@@ -352,17 +1495,29 @@ def login():
 @app.get("/api/profile")
 @_auth_required
 def profile():
-    return jsonify(success=True, username=request.user), 200
+    return jsonify(success=True, username=request.user, user=_cached_user_info(request.user)), 200
 
 @app.get("/api/questdb/tables")
 @_auth_required
+@_admission(INTERACTIVE)
 def questdb_tables():
     try:
-        tables = _list_questdb_tables()
+        tables = _cached_questdb_tables()
         return jsonify(success=True, tables=tables), 200
     except requests.RequestException:
         return jsonify(success=False, message="无法获取 QuestDB 表列表"), 502
 
+def _create_table_sql(table_name: str, dedup: bool) -> str:
+    """项目表的建表语句；去重表需要 WAL，(Time, Name) 相同的行以后写入的为准"""
+    dedup_clause = "WAL DEDUP UPSERT KEYS(Time, Name)" if dedup else ""
+    return f"""
+    CREATE TABLE IF NOT EXISTS {table_name} (
+        Name SYMBOL,
+        Value DOUBLE,
+        Time TIMESTAMP
+    ) timestamp(Time) PARTITION BY DAY {dedup_clause};
+    """
+
 @app.post("/api/questdb/create-table")
 @_auth_required
 def questdb_create_table():
@@ -379,29 +1534,21 @@ def questdb_create_table():
     if not re.match(r'^[a-zA-Z0-9_]+$', table_name):
         return jsonify(success=False, message="表名只能包含字母、数字和下划线"), 400
 
-    # 创建表的 SQL
-    create_table_sql = f"""
-    CREATE TABLE IF NOT EXISTS {table_name} (
-        Name SYMBOL,
-        Value DOUBLE,
-        Time TIMESTAMP
-    ) timestamp(Time) PARTITION BY DAY;
-    """
+    # 去重表（WAL DEDUP UPSERT KEYS(Time, Name)）需要显式传入布尔值，默认沿用 TABLE_DEDUP
+    dedup = payload.get("dedup", app.config["TABLE_DEDUP"])
+    if not isinstance(dedup, bool):
+        return jsonify(success=False, message="dedup 必须是 true 或 false"), 400
+    create_table_sql = _create_table_sql(table_name, dedup)
 
     try:
-        response = requests.get(
-            app.config["QUESTDB_EXEC_URL"],
-            params={"query": create_table_sql},
-            timeout=10,
-        )
-        response.raise_for_status()
-        result = response.json()
+        result = QUESTDB.exec(create_table_sql, timeout=10)
         
         # 检查是否有错误
         if result.get("error"):
             return jsonify(success=False, message=f"创建表失败: {result['error']}"), 500
-            
-        return jsonify(success=True, message=f"表 {table_name} 创建成功"), 200
+        
+        _invalidate_table_cache(table_name)
+        return jsonify(success=True, message=f"表 {table_name} 创建成功", dedup=dedup), 200
     except requests.RequestException as exc:
         app.logger.error("QuestDB create table failed for %s: %s", request.user, exc)
         return jsonify(success=False, message="无法连接到 QuestDB"), 502
@@ -413,13 +1560,98 @@ def user_permissions():
         success=True,
         username=request.user,
         is_admin=_is_admin(request.user),
+        user=_cached_user_info(request.user),
+    ), 200
+
+@app.get("/api/questdb/cache-stats")
+@_auth_required
+def questdb_cache_stats():
+    return jsonify(
+        success=True,
+        tables=TABLE_LIST_CACHE.stats(),
+        table_detail=TABLE_DETAIL_CACHE.stats(),
+    ), 200
+
+@app.get("/api/questdb/scheduler-stats")
+@_auth_required
+def questdb_scheduler_stats():
+    return jsonify(success=True, stats=QUERY_SCHEDULER.stats()), 200
+
+@app.get("/api/questdb/client-stats")
+@_auth_required
+def questdb_client_stats():
+    return jsonify(success=True, stats=QUESTDB.stats()), 200
+
+@app.get("/api/health/live")
+def health_live():
+    return jsonify(success=True), 200
+
+@app.get("/api/health/ready")
+def health_ready():
+    """就绪检查：QuestDB 可查询、tag 目录可读时返回 200，否则 503（供负载均衡摘除实例）"""
+    checks = {}
+    try:
+        result = QUESTDB.exec("SELECT 1;", timeout=app.config["READINESS_TIMEOUT"])
+        checks["questdb"] = not result.get("error")
+    except requests.RequestException as exc:
+        app.logger.warning("Readiness check: QuestDB unavailable: %s", exc)
+        checks["questdb"] = False
+    try:
+        TAG_CATALOG.synced_tables()
+        checks["catalog"] = True
+    except Exception as exc:
+        app.logger.warning("Readiness check: tag catalog unavailable: %s", exc)
+        checks["catalog"] = False
+    ready = all(checks.values())
+    return jsonify(success=ready, checks=checks), 200 if ready else 503
+
+@app.get("/api/ldap/stats")
+@_auth_required
+def ldap_stats():
+    return jsonify(success=True, stats=LDAP.stats(), user_cache=USER_CACHE.stats()), 200
+
+@app.post("/api/questdb/rollups/<table_name>/rebuild")
+@_auth_required
+def questdb_rebuild_rollups(table_name: str):
+    """重建指定表的全部汇总表（用于启用汇总表之前已有的数据）"""
+    if not _is_admin(request.user):
+        return jsonify(success=False, message="权限不足：只有管理员可以重建汇总表"), 403
+    if not re.match(r'^[a-zA-Z0-9_]+$', table_name):
+        return jsonify(success=False, message="表名只能包含字母、数字和下划线"), 400
+    
+    try:
+        _refresh_rollups(table_name)
+    except requests.RequestException as exc:
+        app.logger.error("Rollup rebuild failed for %s: %s", table_name, exc)
+        return jsonify(success=False, message="重建汇总表失败"), 502
+    return jsonify(
+        success=True,
+        rollups=[rollup_table_name(table_name, suffix) for suffix in ROLLUP_INTERVALS],
     ), 200
 
+@app.post("/api/questdb/catalog/<table_name>/resync")
+@_auth_required
+def questdb_resync_catalog(table_name: str):
+    """从 QuestDB 重新统计指定表的 tag 目录（数据不是经本服务导入时使用）"""
+    if not _is_admin(request.user):
+        return jsonify(success=False, message="权限不足：只有管理员可以重建目录"), 403
+    if not re.match(r'^[a-zA-Z0-9_]+$', table_name):
+        return jsonify(success=False, message="表名只能包含字母、数字和下划线"), 400
+    
+    try:
+        _sync_tag_catalog(table_name)
+    except requests.RequestException as exc:
+        app.logger.error("Tag catalog resync failed for %s: %s", table_name, exc)
+        return jsonify(success=False, message="重建目录失败"), 502
+    _invalidate_table_cache(table_name)
+    return jsonify(success=True, tags=len(TAG_CATALOG.tags(table_name))), 200
+
 @app.get("/api/questdb/table-detail/<table_name>")
 @_auth_required
+@_admission(INTERACTIVE)
 def questdb_table_detail(table_name: str):
     try:
-        detail = _get_table_detail(table_name)
+        detail = _cached_table_detail(table_name)
         return jsonify(success=True, detail=detail), 200
     except requests.RequestException:
         return jsonify(success=False, message="无法获取表详情"), 502
@@ -427,62 +1659,93 @@ def questdb_table_detail(table_name: str):
 @app.post("/api/questdb/import-csv/<table_name>")
 @_auth_required
 def questdb_import_csv(table_name: str):
-    """导入 CSV/Excel/SQL 文件到指定表"""
-    uploaded = request.files.get("file")
-    if not uploaded:
-        return jsonify(success=False, message="缺少上传文件"), 400
-    
-    # 保存临时文件
-    import tempfile
-    import os
-    
-    file_ext = os.path.splitext(uploaded.filename)[1].lower()
-    temp_fd, temp_path = tempfile.mkstemp(suffix=file_ext)
+    """上传 CSV/Excel/SQL 文件并提交后台导入任务，立即返回任务 ID"""
+    # 先预留排队名额：队列已满或正在退出时在读取（落盘）请求体之前拒绝
+    try:
+        IMPORT_JOBS.reserve()
+    except ImportQueueFull:
+        return jsonify(success=False, message="导入队列已满，请稍后重试"), 429
+    except ImportManagerClosed:
+        return jsonify(success=False, message="服务正在重启，请稍后重试"), 503
     
+    reserved = True
+    temp_path = None
     try:
-        with os.fdopen(temp_fd, 'wb') as f:
-            f.write(uploaded.read())
-        
-        # 使用统一的解析函数
-        parsed_data = parse_file(temp_path, debug=False)
-        
-        if not parsed_data:
-            return jsonify(success=False, message="文件中没有有效数据"), 400
+        uploaded = request.files.get("file")
+        if not uploaded:
+            return jsonify(success=False, message="缺少上传文件"), 400
         
-        # 转换为 CSV 格式
-        buffer = io.StringIO()
-        writer = csv.writer(buffer)
-        writer.writerow(["Name", "Value", "Time::timestamp"])
+        transport = (
+            request.args.get("transport") or request.form.get("transport") or app.config["IMPORT_TRANSPORT"]
+        ).lower()
+        if transport not in IMPORT_TRANSPORTS:
+            return jsonify(success=False, message=f"不支持的导入方式: {transport}"), 400
         
-        for item in parsed_data:
-            writer.writerow([item["Name"], item["Value"], item["Time"]])
+        mode = (request.args.get("mode") or request.form.get("mode") or app.config["IMPORT_MODE"]).lower()
+        if mode not in IMPORT_MODES:
+            return jsonify(success=False, message=f"不支持的导入模式: {mode}"), 400
         
-        csv_payload = buffer.getvalue()
-        
-        # 导入到 QuestDB
-        response = requests.post(
-            app.config["QUESTDB_IMPORT_URL"],
-            params={"name": table_name, "fmt": "csv", "overwrite": "false"},
-            files={"data": ("import.csv", csv_payload, "text/csv")},
-            timeout=60,
-        )
-        response.raise_for_status()
-        
-        return jsonify(success=True, imported=len(parsed_data)), 200
+        # 保存临时文件，任务结束后由后台清理
+        file_ext = os.path.splitext(uploaded.filename)[1].lower()
+        temp_fd, temp_path = tempfile.mkstemp(suffix=file_ext)
+        # 分块写入临时文件，不把整个上传内容读入内存
+        with os.fdopen(temp_fd, 'wb') as f:
+            shutil.copyfileobj(uploaded.stream, f, app.config["IMPORT_STREAM_BUFFER"])
         
-    except ValueError as e:
-        app.logger.error("File parse failed for %s: %s", request.user, e)
-        return jsonify(success=False, message=f"文件格式错误: {str(e)}"), 400
-    except requests.RequestException as exc:
-        app.logger.error("QuestDB import failed for %s: %s", request.user, exc)
-        return jsonify(success=False, message="QuestDB 导入失败"), 502
-    finally:
-        # 清理临时文件
-        if os.path.exists(temp_path):
+        # submit 无论成功与否都会消耗预留的名额
+        reserved = False
+        job = IMPORT_JOBS.submit(ImportJob(
+            table_name=table_name,
+            user=request.user,
+            filename=uploaded.filename,
+            transport=transport,
+            path=temp_path,
+            mode=mode,
+            bytes_total=os.path.getsize(temp_path),
+        ), reserved=True)
+    except ImportManagerClosed:
+        os.unlink(temp_path)
+        return jsonify(success=False, message="服务正在重启，请稍后重试"), 503
+    except OSError as exc:
+        app.logger.error("Saving upload failed for %s: %s", request.user, exc)
+        if temp_path and os.path.exists(temp_path):
             os.unlink(temp_path)
+        return jsonify(success=False, message="保存上传文件失败"), 500
+    finally:
+        if reserved:
+            IMPORT_JOBS.release_reservation()
+    
+    app.logger.info("Import job %s queued for %s by %s", job.id, table_name, request.user)
+    return jsonify(success=True, job_id=job.id, job=job.to_dict()), 202
+
+@app.get("/api/questdb/import-jobs")
+@_auth_required
+def questdb_import_jobs():
+    """最近的导入任务（管理员可见全部）"""
+    user = None if _is_admin(request.user) else request.user
+    jobs = IMPORT_JOBS.list(user=user, limit=request.args.get("limit", 50, type=int))
+    return jsonify(success=True, jobs=[job.to_dict() for job in jobs]), 200
+
+@app.get("/api/questdb/import-jobs/<job_id>")
+@_auth_required
+def questdb_import_job(job_id: str):
+    job = _visible_import_job(job_id)
+    if job is None:
+        return jsonify(success=False, message="导入任务不存在"), 404
+    return jsonify(success=True, job=job.to_dict()), 200
+
+@app.post("/api/questdb/import-jobs/<job_id>/cancel")
+@_auth_required
+def questdb_cancel_import_job(job_id: str):
+    job = _visible_import_job(job_id)
+    if job is None:
+        return jsonify(success=False, message="导入任务不存在"), 404
+    IMPORT_JOBS.cancel(job_id)
+    return jsonify(success=True, job=job.to_dict()), 200
 
 @app.post("/api/questdb/chart-data/<table_name>")
 @_auth_required
+@_admission(INTERACTIVE)
 def questdb_chart_data(table_name: str):
     """获取指定标签的时序数据用于绘图"""
     payload = request.get_json(silent=True) or {}
@@ -494,46 +1757,93 @@ def questdb_chart_data(table_name: str):
         return jsonify(success=False, message="请至少选择一个标签"), 400
 
     try:
-        result = {}
-        for tag in tags:
-            # 构建时间筛选条件
-            time_filter = ""
-            if start_time and end_time:
-                time_filter = f"AND Time >= '{start_time}' AND Time <= '{end_time}'"
-            elif start_time:
-                time_filter = f"AND Time >= '{start_time}'"
-            elif end_time:
-                time_filter = f"AND Time <= '{end_time}'"
-            
-            query = f"""
-            SELECT Time, Value 
-            FROM {table_name} 
-            WHERE Name = '{tag}' {time_filter}
-            ORDER BY Time ASC 
-            LIMIT 10000;
-            """
-            response = requests.get(
-                app.config["QUESTDB_EXEC_URL"],
-                params={"query": query},
-                timeout=30,
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            result[tag] = [
-                {"time": row[0], "value": row[1]}
-                for row in data.get("dataset", [])
-            ]
-        
-        return jsonify(success=True, data=result), 200
+        max_points = _chart_max_points(payload.get("max_points"))
+    except ValueError as exc:
+        return jsonify(success=False, message=str(exc)), 400
+
+    try:
+        result, sample_seconds = _fetch_chart_series(
+            table_name, tags, start_time, end_time, max_points=max_points
+        )
+        return jsonify(success=True, data=result, sample_seconds=sample_seconds), 200
+    except ValueError as exc:
+        return jsonify(success=False, message=f"时间格式错误: {exc}"), 400
     except requests.RequestException as exc:
         app.logger.error("QuestDB chart data failed for %s: %s", table_name, exc)
         return jsonify(success=False, message="无法获取图表数据"), 502
 
+@app.post("/api/questdb/aggregate/<table_name>")
+@_auth_required
+@_admission(BULK)
+def questdb_aggregate(table_name: str):
+    """
+    按时间分桶的聚合数据（avg/min/max/first/last/count），在 QuestDB 中 SAMPLE BY 计算
+
+    请求: {"tags": [...], "start_time", "end_time", "bucket": "1m", "fill": "none|null|prev|linear"}
+    时间范围为 [start_time, end_time)
+    """
+    payload = request.get_json(silent=True) or {}
+    tags = list(dict.fromkeys(payload.get("tags", [])))
+    start_time = payload.get("start_time")
+    end_time = payload.get("end_time")
+    fill = str(payload.get("fill", "none")).lower()
+    
+    if not tags:
+        return jsonify(success=False, message="请至少选择一个标签"), 400
+    if fill not in AGGREGATE_FILLS:
+        return jsonify(success=False, message=f"不支持的填充方式: {fill}"), 400
+    
+    # 请求的总时限：分批查询和流式输出都计入，单次 QuestDB 调用的超时不超过剩余时间
+    deadline = time.monotonic() + app.config["EXPORT_REQUEST_TIMEOUT"]
+    try:
+        bucket_seconds = _parse_bucket_seconds(payload.get("bucket", "1m"))
+        range_start, range_end = _chart_time_range(table_name, tags, start_time, end_time)
+        if range_start and range_end:
+            span = (_to_epoch_us(range_end) - _to_epoch_us(range_start)) / 1_000_000
+            if span / bucket_seconds > app.config["AGGREGATE_MAX_BUCKETS"]:
+                return jsonify(success=False, message="桶数量过多，请增大桶宽或缩小时间范围"), 400
+        
+        # 左闭右开区间 [start_time, end_time)，与汇总桶的边界语义一致
+        time_filter = _build_time_filter(start_time, end_time, end_inclusive=False)
+        batch_size = app.config["AGGREGATE_BATCH_TAGS"]
+        batches = [tags[i:i + batch_size] for i in range(0, len(tags), batch_size)]
+        # 桶宽是汇总表桶宽的整数倍、起止时间对齐汇总桶且在刷新水位之前时从汇总表读取，结果与原始表一致
+        source, aggregates, _ = _aggregate_source(
+            table_name,
+            bucket_seconds,
+            exact=True,
+            start_us=_to_epoch_us(start_time) if start_time else None,
+            end_us=_to_epoch_us(end_time) if end_time else None,
+            data_end_us=_to_epoch_us(range_end) if range_end else None,
+        )
+        with _request_deadline(deadline):
+            first_series = _fetch_aggregate_batch(
+                source, batches[0], time_filter, bucket_seconds, fill, aggregates
+            )
+    except ValueError as exc:
+        return jsonify(success=False, message=f"参数错误: {exc}"), 400
+    except requests.RequestException as exc:
+        app.logger.error("QuestDB aggregate failed for %s: %s", table_name, exc)
+        return jsonify(success=False, message="无法获取聚合数据"), 502
+    
+    fetch_rest = (
+        _fetch_aggregate_batch(source, batch, time_filter, bucket_seconds, fill, aggregates)
+        for batch in batches[1:]
+    )
+    return Response(
+        _with_deadline(_iter_aggregate_json(first_series, fetch_rest, bucket_seconds, fill), deadline),
+        mimetype="application/json",
+    )
+
 @app.post("/api/questdb/export-clc/<table_name>")
 @_auth_required
+@_admission(BULK)
 def questdb_export_clc(table_name: str):
-    """导出 CLC 格式文件"""
+    """
+    导出 CLC 格式文件
+
+    请求: {"tags": [...], "start_time", "end_time", "interval": 60 | "1m", "fill": "last|avg|linear", "resample": true}
+    """
     payload = request.get_json(silent=True) or {}
     tags = payload.get("tags", [])
     start_time = payload.get("start_time")
@@ -543,11 +1853,18 @@ def questdb_export_clc(table_name: str):
         return jsonify(success=False, message="请至少选择一个标签"), 400
     
     try:
-        clc_content = _generate_clc_file(table_name, tags, start_time, end_time)
+        # 默认重采样到 CLC_INTERVAL 秒的网格；resample=false 时输出原始时间戳
+        interval_seconds = None
+        if payload.get("resample", True):
+            interval_seconds = _parse_bucket_seconds(payload.get("interval", app.config["CLC_INTERVAL"]))
+        fill = str(payload.get("fill", app.config["CLC_FILL"])).lower()
+        # 请求的总时限：准备查询和逐页输出都计入
+        deadline = time.monotonic() + app.config["EXPORT_REQUEST_TIMEOUT"]
+        with _request_deadline(deadline):
+            clc_lines = _generate_clc_file(table_name, tags, start_time, end_time, interval_seconds, fill)
         
-        from flask import Response
         return Response(
-            clc_content,
+            _with_deadline(clc_lines, deadline),
             mimetype="text/plain",
             headers={
                 "Content-Disposition": f"attachment; filename={table_name}.clc"
@@ -560,4 +1877,5 @@ def questdb_export_clc(table_name: str):
         return jsonify(success=False, message="导出失败"), 502
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True, use_reloader=False)
\ No newline at end of file
+    # 开发服务器；生产环境使用 gunicorn -c gunicorn.conf.py
+    app.run(host="0.0.0.0", port=5000, debug=os.environ.get("FLASK_DEBUG") == "1", use_reloader=False)
\ No newline at end of file
@@ -0,0 +1,185 @@
+from typing import Callable
+
+import numpy as np
+
+
+TAGS_PER_GROUP = 13
+
+# ISO "YYYY-MM-DDTHH:MM:SS" 的字符下标 -> CLC "MM-DD-YYYY HH:MM:SS"
+_CLC_TIME_ORDER = [5, 6, 4, 8, 9, 7, 0, 1, 2, 3, 10, 11, 12, 13, 14, 15, 16, 17, 18]
+
+
+def format_clc_times(epoch_us: np.ndarray) -> list[str]:
+    """把微秒时间戳数组批量格式化为 M-D-YYYY HH:MM:SS"""
+    if not len(epoch_us):
+        return []
+    iso = np.datetime_as_string(epoch_us.astype("datetime64[us]").astype("datetime64[s]"), unit="s")
+    chars = iso.astype("U19").view("U1").reshape(-1, 19).copy()
+    chars[:, 10] = " "
+    return np.ascontiguousarray(chars[:, _CLC_TIME_ORDER]).view("U19").ravel().tolist()
+
+
+def pivot_page(
+    timeline_us: np.ndarray,
+    times_us: np.ndarray,
+    codes: np.ndarray,
+    values: np.ndarray,
+    n_tags: int,
+) -> np.ndarray:
+    """
+    长表 (Time, tag 编号, Value) 转为 tags × time 的二维数组
+
+    缺失值填 0.0；codes 为 -1 或时间不在 timeline 上的记录被忽略
+    """
+    matrix = np.zeros((n_tags, len(timeline_us)), dtype=np.float64)
+    if not len(times_us):
+        return matrix
+
+    positions = np.searchsorted(timeline_us, times_us)
+    positions = np.minimum(positions, len(timeline_us) - 1)
+    valid = (codes >= 0) & (timeline_us[positions] == times_us)
+    matrix[codes[valid], positions[valid]] = np.nan_to_num(values[valid], nan=0.0)
+    return matrix
+
+
+def format_group_rows(time_strs: list[str], group_matrix: np.ndarray) -> str:
+    """把一组标签的数值块格式化为 CLC 数据行（每行: 时间,值,G,值,G...）"""
+    if not time_strs:
+        return ""
+    columns = [row.tolist() for row in group_matrix.astype(str)]
+    row_format = "%s" + ",%s,G" * len(columns) + "\n"
+    return "".join(row_format % row for row in zip(time_strs, *columns))
+
+
+def pivot_buckets(
+    buckets: np.ndarray,
+    codes: np.ndarray,
+    values: np.ndarray,
+    n_tags: int,
+    n_rows: int,
+) -> np.ndarray:
+    """
+    (网格行号, tag 编号, 值) 转为 tags × rows 的二维数组，空桶为 NaN
+
+    codes 为 -1 或行号越界的记录被忽略
+    """
+    matrix = np.full((n_tags, n_rows), np.nan, dtype=np.float64)
+    valid = (codes >= 0) & (buckets >= 0) & (buckets < n_rows)
+    matrix[codes[valid], buckets[valid]] = values[valid]
+    return matrix
+
+
+FILL_METHODS = ("last", "avg", "linear")
+
+
+class GridFiller:
+    """
+    逐页填充固定网格上的空桶（NaN），跨页保留每个 tag 最近的已知值
+
+    - last / avg：沿用上一个已知值（前向填充）
+    - linear：在前后两个已知值之间线性插值；之后没有已知值时保持最后的值
+    - 网格开始前也没有已知值的位置填 0.0
+
+    linear 时下一页（lookahead）中也没有值的 tag 通过 next_known(tag 编号数组, 起始行)
+    查询之后第一个已知值的 (网格行号, 值)，没有时行号为 -1；结果按 tag 缓存，直到越过该行
+    """
+
+    def __init__(
+        self,
+        method: str,
+        initial: np.ndarray,
+        next_known: Callable[[np.ndarray, int], tuple[np.ndarray, np.ndarray]] | None = None,
+    ):
+        if method not in FILL_METHODS:
+            raise ValueError(f"不支持的填充方式: {method}")
+        self.method = method
+        # 每个 tag 最近的已知值及其网格行号（网格开始前的值记为 -1 行）
+        self.carry_values = initial.astype(np.float64)
+        self.carry_pos = np.full(len(initial), -1, dtype=np.int64)
+        # 已查询过的后续已知值：行号为 -1 表示之后没有值，ahead_checked 为 False 表示未查询
+        self.next_known = next_known
+        self.ahead_checked = np.zeros(len(initial), dtype=bool)
+        self.ahead_pos = np.full(len(initial), -1, dtype=np.int64)
+        self.ahead_values = np.full(len(initial), np.nan)
+
+    def fill(self, start: int, block: np.ndarray, lookahead: np.ndarray | None = None) -> np.ndarray:
+        """block 为网格第 start 行起的一页；linear 时 lookahead 为下一页（用于跨页插值），最后一页为 None"""
+        n_tags, n_rows = block.shape
+        known = ~np.isnan(block)
+        if self.method == "linear":
+            filled = self._interpolate(start, block, known, lookahead)
+        else:
+            filled = self._forward_fill(block, known)
+        
+        # 更新每个 tag 最近的已知值
+        has_known = known.any(axis=1)
+        last_idx = n_rows - 1 - np.argmax(known[:, ::-1], axis=1)
+        rows = np.nonzero(has_known)[0]
+        self.carry_values[rows] = block[rows, last_idx[rows]]
+        self.carry_pos[rows] = start + last_idx[rows]
+        
+        return np.nan_to_num(filled, nan=0.0)
+
+    def _forward_fill(self, block: np.ndarray, known: np.ndarray) -> np.ndarray:
+        n_tags, n_rows = block.shape
+        idx = np.where(known, np.arange(n_rows), -1)
+        np.maximum.accumulate(idx, axis=1, out=idx)
+        gathered = block[np.arange(n_tags)[:, None], np.maximum(idx, 0)]
+        return np.where(idx >= 0, gathered, self.carry_values[:, None])
+
+    def _beyond(self, start: int, block: np.ndarray, lookahead: np.ndarray | None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        每个 tag 在当前页之后的第一个已知值 (网格行号, 值)，行号 -1 表示不需要或没有；
+        先看 lookahead，页尾为空桶且 lookahead 中也没有值时再用 next_known 查询
+        """
+        n_tags, n_rows = block.shape
+        pos = np.full(n_tags, -1, dtype=np.int64)
+        values = np.full(n_tags, np.nan)
+        if lookahead is None:
+            return pos, values
+        
+        ahead_known = ~np.isnan(lookahead)
+        has_ahead = ahead_known.any(axis=1)
+        first_ahead = np.argmax(ahead_known, axis=1)
+        tags = np.nonzero(has_ahead)[0]
+        pos[tags] = start + n_rows + first_ahead[tags]
+        values[tags] = lookahead[tags, first_ahead[tags]]
+        
+        if self.next_known is None:
+            return pos, values
+        from_row = start + n_rows + lookahead.shape[1]
+        missing = ~has_ahead & np.isnan(block[:, -1])
+        stale = ~self.ahead_checked | ((self.ahead_pos >= 0) & (self.ahead_pos < from_row))
+        query = np.nonzero(missing & stale)[0]
+        if len(query):
+            found_pos, found_values = self.next_known(query, from_row)
+            self.ahead_pos[query] = found_pos
+            self.ahead_values[query] = found_values
+            self.ahead_checked[query] = True
+        tags = np.nonzero(missing & (self.ahead_pos >= from_row))[0]
+        pos[tags] = self.ahead_pos[tags]
+        values[tags] = self.ahead_values[tags]
+        return pos, values
+
+    def _interpolate(
+        self, start: int, block: np.ndarray, known: np.ndarray, lookahead: np.ndarray | None
+    ) -> np.ndarray:
+        n_tags, n_rows = block.shape
+        positions = np.arange(start, start + n_rows)
+        ahead_pos, ahead_values = self._beyond(start, block, lookahead)
+        filled = np.empty_like(block)
+        for tag in range(n_tags):
+            xp = [start + np.nonzero(known[tag])[0]]
+            fp = [block[tag, known[tag]]]
+            if not np.isnan(self.carry_values[tag]):
+                xp.insert(0, np.array([self.carry_pos[tag]]))
+                fp.insert(0, np.array([self.carry_values[tag]]))
+            if ahead_pos[tag] >= 0:
+                xp.append(np.array([ahead_pos[tag]]))
+                fp.append(np.array([ahead_values[tag]]))
+            xp = np.concatenate(xp)
+            if not len(xp):
+                filled[tag] = np.nan
+                continue
+            filled[tag] = np.interp(positions, xp, np.concatenate(fp), left=np.nan)
+        return filled
@@ -1,37 +1,99 @@
+import codecs
 import csv
 import io
+import itertools
+import multiprocessing
+import os
 import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from typing import Callable, Iterable, Iterator
+import numpy as np
 import openpyxl
+from script.record_batch import RecordBatch, RecordBatchBuilder, TagDictionary, iter_record_batches
 
-def _read_file_content(filepath: str) -> list[list[str]]:
+def _detect_encoding(filepath: str, block_size: int = 1 << 20) -> str:
     """
-    读取 CSV 或 Excel 文件，返回行列表
+    逐块校验整个文件，返回第一个能完整解码的编码（不把文件读入内存）
+    """
+    encodings = ['utf-8', 'gbk', 'gb2312', 'utf-16', 'latin1']
+    
+    for encoding in encodings:
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            with open(filepath, 'rb') as f:
+                while True:
+                    block = f.read(block_size)
+                    if not block:
+                        decoder.decode(b'', final=True)
+                        break
+                    decoder.decode(block)
+            return encoding
+        except (UnicodeDecodeError, UnicodeError):
+            continue
+    
+    raise ValueError(f"无法识别文件编码: {filepath}")
+
+
+class _CountingReader(io.RawIOBase):
+    """包装二进制文件，每次读取后把已读字节数报告给 progress"""
+    
+    def __init__(self, raw, progress: Callable[[int], None]):
+        self._raw = raw
+        self._progress = progress
+        self.bytes_read = 0
+    
+    def readable(self) -> bool:
+        return True
+    
+    def readinto(self, buffer) -> int:
+        n = self._raw.readinto(buffer)
+        if n:
+            self.bytes_read += n
+            self._progress(self.bytes_read)
+        return n
+    
+    def close(self) -> None:
+        self._raw.close()
+        super().close()
+
+
+def _open_text(filepath: str, encoding: str, progress: Callable[[int], None] | None = None, newline=None):
+    """以文本模式打开文件；提供 progress 时按实际读取的字节数回调"""
+    if progress is None:
+        return open(filepath, 'r', encoding=encoding, newline=newline)
+    raw = _CountingReader(open(filepath, 'rb', buffering=0), progress)
+    return io.TextIOWrapper(io.BufferedReader(raw), encoding=encoding, newline=newline)
+
+
+def _iter_file_rows(filepath: str, progress: Callable[[int], None] | None = None) -> Iterator[list[str]]:
+    """
+    逐行读取 CSV 或 Excel 文件（生成器），内存占用与文件大小无关
     """
     file_ext = filepath.lower().split('.')[-1]
     
     if file_ext in ['xlsx', 'xls']:
-        # 读取 Excel 文件
-        wb = openpyxl.load_workbook(filepath, data_only=True)
-        ws = wb.active
-        rows = []
-        for row in ws.iter_rows(values_only=True):
-            # 将所有值转换为字符串
-            rows.append([str(cell) if cell is not None else '' for cell in row])
-        return rows
+        # 只读模式按行流式读取 Excel
+        wb = openpyxl.load_workbook(filepath, read_only=True, data_only=True)
+        try:
+            ws = wb.active
+            for row in ws.iter_rows(values_only=True):
+                # 将所有值转换为字符串
+                yield [str(cell) if cell is not None else '' for cell in row]
+        finally:
+            wb.close()
     else:
-        # 读取 CSV 文件
-        encodings = ['utf-8', 'gbk', 'gb2312', 'utf-16', 'latin1']
-        
-        for encoding in encodings:
-            try:
-                with open(filepath, 'r', encoding=encoding, newline='') as f:
-                    reader = csv.reader(f)
-                    return list(reader)
-            except (UnicodeDecodeError, UnicodeError):
-                continue
-        
-        raise ValueError(f"无法识别文件编码: {filepath}")
+        encoding = _detect_encoding(filepath)
+        with _open_text(filepath, encoding, progress, newline='') as f:
+            yield from csv.reader(f)
+
+
+def _read_file_content(filepath: str) -> list[list[str]]:
+    """
+    读取 CSV 或 Excel 文件，返回行列表
+    """
+    return list(_iter_file_rows(filepath))
 
 
 def _read_sql_file(filepath: str) -> str:
@@ -50,6 +112,214 @@ def _read_sql_file(filepath: str) -> str:
     raise ValueError(f"无法识别文件编码: {filepath}")
 
 
+# 匹配 INSERT 语句的正则表达式
+# 支持多种格式:
+# INSERT INTO `table` VALUES (id, 'Name', Value, 'Time', Status, 'DcsTime');
+# INSERT INTO table (id, Name, Value, Time, Status, DcsTime) VALUES (...);
+_SQL_INSERT_PATTERN = re.compile(r"INSERT\s+INTO\s+[`'\"]?\w+[`'\"]?\s*(?:\([^)]+\))?\s*VALUES\s*", re.IGNORECASE)
+
+# 匹配单个值元组的模式
+# (id, 'Name', Value, 'Time', Status, 'DcsTime')
+_SQL_VALUE_PATTERN = re.compile(
+    r"\(\s*"
+    r"(?P<id>-?\d+)\s*,\s*"                           # id (bigint)
+    r"'(?P<name>(?:[^'\\]|\\.)*)'\s*,\s*"             # Name (varchar)
+    r"(?P<value>-?(?:\d+(?:\.\d+)?|\.\d+)(?:[eE][+\-]?\d+)?|NULL)\s*,\s*"  # Value (float)
+    r"'(?P<time>[^']+)'\s*,\s*"                       # Time (datetime)
+    r"(?P<status>-?\d+|NULL)\s*,\s*"                  # Status (int)
+    r"'(?P<dcstime>[^']*)'"                           # DcsTime (datetime)
+    r"\s*\)",
+    re.IGNORECASE
+)
+
+# 也支持没有引号的数值格式
+_SQL_VALUE_PATTERN_ALT = re.compile(
+    r"\(\s*"
+    r"(?P<id>-?\d+)\s*,\s*"
+    r"['\"]?(?P<name>[^'\",]+)['\"]?\s*,\s*"
+    r"(?P<value>-?(?:\d+(?:\.\d+)?|\.\d+)(?:[eE][+\-]?\d+)?|NULL)\s*,\s*"
+    r"['\"]?(?P<time>[^'\"]+)['\"]?\s*,\s*"
+    r"(?P<status>-?\d+|NULL)\s*,\s*"
+    r"['\"]?(?P<dcstime>[^'\")]*)['\"]?"
+    r"\s*\)",
+    re.IGNORECASE
+)
+
+# 语句切分：跳过引号字符串和注释中的分号与括号
+_SQL_SPECIAL = re.compile(r"[;'\"`()]|--|/\*")
+_SQL_QUOTED = {
+    "'": re.compile(r"'[^'\\]*(?:\\.[^'\\]*)*'", re.S),
+    '"': re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"', re.S),
+}
+_SQL_CLOSERS = {"`": "`", "--": "\n", "/*": "*/"}
+
+# 流式读取 SQL 文件的块大小（字符）
+SQL_CHUNK_CHARS = 1 << 20
+# 未结束的语句缓存超过该长度时，在值元组边界处切分产出（字符）
+SQL_FRAGMENT_CHARS = 1 << 20
+
+
+def _iter_sql_chunks(
+    filepath: str,
+    chunk_chars: int = SQL_CHUNK_CHARS,
+    progress: Callable[[int], None] | None = None,
+) -> Iterator[str]:
+    """
+    按块读取 SQL 文件（生成器）
+    """
+    encoding = _detect_encoding(filepath)
+    with _open_text(filepath, encoding, progress) as f:
+        while True:
+            chunk = f.read(chunk_chars)
+            if not chunk:
+                break
+            yield chunk
+
+
+def _iter_sql_fragments(
+    chunks: Iterable[str],
+    fragment_chars: int = SQL_FRAGMENT_CHARS,
+) -> Iterator[tuple[str, bool]]:
+    """
+    把文本块切分为 SQL 语句片段（生成器），产出 (片段, 是否为语句开头)
+    
+    语句在分号处结束；语句尚未结束但已缓存超过 fragment_chars 时，在最外层的 ")" 之后切分，
+    因此一条很大的多行 INSERT 会按值元组分段产出，缓存大小与语句长度无关
+    """
+    buffer = ""
+    scan = 0
+    depth = 0
+    statement_start = True
+    # 字符串/注释未闭合时，新到的块先放入 pending，出现闭合字符后才拼接重新扫描
+    pending: list[str] = []
+    waiting_for = None
+    for chunk in chunks:
+        pending.append(chunk)
+        if waiting_for is not None and waiting_for not in chunk:
+            continue
+        buffer = "".join([buffer, *pending])
+        pending.clear()
+        waiting_for = None
+        start = 0
+        while True:
+            match = _SQL_SPECIAL.search(buffer, scan)
+            if not match:
+                # 保留最后一个字符，避免 "--" 或 "/*" 被块边界拆开
+                scan = max(scan, len(buffer) - 1)
+                break
+            
+            token = match.group()
+            if token == ";":
+                yield buffer[start:match.end()], statement_start
+                start = scan = match.end()
+                depth = 0
+                statement_start = True
+            elif token == "(":
+                depth += 1
+                scan = match.end()
+            elif token == ")":
+                depth -= 1
+                scan = match.end()
+                if depth <= 0 and scan - start >= fragment_chars:
+                    yield buffer[start:scan], statement_start
+                    start = scan
+                    statement_start = False
+            elif token in _SQL_QUOTED:
+                quoted = _SQL_QUOTED[token].match(buffer, match.start())
+                if not quoted:
+                    scan = match.start()
+                    waiting_for = token
+                    break
+                scan = quoted.end()
+            else:
+                closer = _SQL_CLOSERS[token]
+                end = buffer.find(closer, match.end())
+                if end < 0:
+                    scan = match.start()
+                    waiting_for = closer[-1]
+                    break
+                scan = end + len(closer)
+        
+        buffer = buffer[start:]
+        scan -= start
+    
+    buffer = "".join([buffer, *pending])
+    if buffer.strip():
+        yield buffer, statement_start
+
+
+def _iter_sql_records(fragments: Iterable[tuple[str, bool]], debug: bool = False) -> Iterator[dict]:
+    """
+    逐个语句片段提取 INSERT 中的数据（生成器）
+    
+    每条语句先用主模式匹配，INSERT 语句中主模式没有匹配时改用备用模式；
+    分段产出的语句由第一个有匹配的片段决定模式，后续片段沿用
+    """
+    normalizer = TimestampNormalizer()
+    total = 0
+    i = 0
+    pattern = None
+    is_insert = False
+    
+    for fragment, statement_start in fragments:
+        if statement_start:
+            pattern = None
+            is_insert = bool(_SQL_INSERT_PATTERN.search(fragment))
+        
+        if pattern is not None:
+            matches = pattern.finditer(fragment)
+        else:
+            matches = _SQL_VALUE_PATTERN.finditer(fragment)
+            first = next(matches, None)
+            if first is not None:
+                pattern = _SQL_VALUE_PATTERN
+                matches = itertools.chain([first], matches)
+            elif is_insert:
+                pattern = _SQL_VALUE_PATTERN_ALT
+                matches = pattern.finditer(fragment)
+                if debug:
+                    print(f"[DEBUG] 语句使用备用模式: {fragment[:100]}")
+            else:
+                continue
+        
+        for match in matches:
+            i += 1
+            try:
+                name = match.group("name")
+                value_str = match.group("value")
+                time_str = match.group("time")
+                
+                # 跳过 NULL 值
+                if value_str.upper() == 'NULL':
+                    continue
+                
+                # 处理转义字符
+                name = name.replace("\\'", "'").replace("\\\\", "\\")
+                
+                # 解析数值
+                value = float(value_str)
+                
+                # 标准化时间戳
+                timestamp = normalizer(time_str)
+            except (ValueError, AttributeError) as e:
+                if debug and i <= 10:
+                    print(f"[DEBUG] 记录 {i - 1} 解析失败: {e}")
+                continue
+            
+            if debug and i <= 5:
+                print(f"[DEBUG] 记录 {i - 1}: Name={name}, Value={value}, Time={timestamp}")
+            
+            total += 1
+            yield {
+                "Name": name.strip(),
+                "Value": value,
+                "Time": timestamp
+            }
+    
+    if debug:
+        print(f"[DEBUG] SQL dump 总计解析 {total} 条记录\n")
+
+
 def _parse_sql_dump(sql_content: str, debug: bool = False) -> list[dict]:
     """
     解析 MySQL dump SQL 文件，提取 INSERT 语句中的数据
@@ -58,103 +328,305 @@ def _parse_sql_dump(sql_content: str, debug: bool = False) -> list[dict]:
     返回统一的数据结构:
     [{"Name": "tag1", "Value": 123.45, "Time": "2024-01-01T00:00:00.000000Z"}, ...]
     """
-    result = []
-    
-    # 匹配 INSERT 语句的正则表达式
-    # 支持多种格式:
-    # INSERT INTO `table` VALUES (id, 'Name', Value, 'Time', Status, 'DcsTime');
-    # INSERT INTO table (id, Name, Value, Time, Status, DcsTime) VALUES (...);
-    
-    # 匹配单个值元组的模式
-    # (id, 'Name', Value, 'Time', Status, 'DcsTime')
-    value_pattern = re.compile(
-        r"\(\s*"
-        r"(?P<id>-?\d+)\s*,\s*"                           # id (bigint)
-        r"'(?P<name>(?:[^'\\]|\\.)*)'\s*,\s*"             # Name (varchar)
-        r"(?P<value>-?(?:\d+(?:\.\d+)?|\.\d+)(?:[eE][+\-]?\d+)?|NULL)\s*,\s*"  # Value (float)
-        r"'(?P<time>[^']+)'\s*,\s*"                       # Time (datetime)
-        r"(?P<status>-?\d+|NULL)\s*,\s*"                  # Status (int)
-        r"'(?P<dcstime>[^']*)'"                           # DcsTime (datetime)
-        r"\s*\)",
-        re.IGNORECASE
-    )
-    
-    # 也支持没有引号的数值格式
-    value_pattern_alt = re.compile(
-        r"\(\s*"
-        r"(?P<id>-?\d+)\s*,\s*"
-        r"['\"]?(?P<name>[^'\",]+)['\"]?\s*,\s*"
-        r"(?P<value>-?(?:\d+(?:\.\d+)?|\.\d+)(?:[eE][+\-]?\d+)?|NULL)\s*,\s*"
-        r"['\"]?(?P<time>[^'\"]+)['\"]?\s*,\s*"
-        r"(?P<status>-?\d+|NULL)\s*,\s*"
-        r"['\"]?(?P<dcstime>[^'\")]*)['\"]?"
-        r"\s*\)",
-        re.IGNORECASE
-    )
-    
     if debug:
         print(f"[DEBUG] SQL 内容长度: {len(sql_content)} 字符")
         # 显示前 500 字符
         print(f"[DEBUG] SQL 前 500 字符:\n{sql_content[:500]}")
     
-    # 查找所有 INSERT 语句
-    insert_pattern = re.compile(r"INSERT\s+INTO\s+[`'\"]?\w+[`'\"]?\s*(?:\([^)]+\))?\s*VALUES\s*", re.IGNORECASE)
+    return list(_iter_sql_records(_iter_sql_fragments([sql_content]), debug=debug))
+
+
+def iter_file_records(
+    filepath: str,
+    debug: bool = False,
+    workers: int = 1,
+    progress: Callable[[int], None] | None = None,
+) -> Iterator[dict]:
+    """
+    流式解析入口（生成器），根据文件扩展名自动选择解析方式
     
-    # 分割并处理每个 INSERT 语句
-    matches = list(value_pattern.finditer(sql_content))
+    逐条产出 {"Name", "Value", "Time"} 记录，不会把整个文件读入内存；
+    workers > 1 且文件足够大时按行/语句对齐切分，多进程并行解析，按原顺序合并；
+    progress(bytes_read) 报告已读取的文件字节数（Excel 文件不报告）
+    """
+    if workers > 1:
+        plan = _plan_parallel_parse(filepath, debug=debug)
+        if plan is not None:
+            for batch in _run_parallel_parse(*plan, workers=workers, progress=progress):
+                yield from batch
+            return
     
-    if debug:
-        print(f"[DEBUG] 使用主模式找到 {len(matches)} 个匹配")
+    yield from _iter_serial_records(filepath, debug=debug, progress=progress)
+
+
+# 列式批次的默认行数
+BATCH_ROWS = 100_000
+
+
+def iter_file_batches(
+    filepath: str,
+    batch_rows: int = BATCH_ROWS,
+    debug: bool = False,
+    workers: int = 1,
+    progress: Callable[[int], None] | None = None,
+) -> Iterator[RecordBatch]:
+    """
+    与 iter_file_records 相同的解析，产出最多 batch_rows 行的列式 RecordBatch；
+    同一文件的所有批次共用一个 tag 字典
+    """
+    dictionary = TagDictionary()
+    if workers > 1:
+        plan = _plan_parallel_parse(filepath, debug=debug)
+        if plan is not None:
+            for batch in _run_parallel_parse(*plan, workers=workers, progress=progress):
+                batch = batch.recode(dictionary)
+                for start in range(0, len(batch), batch_rows):
+                    yield batch[start:start + batch_rows]
+            return
     
-    # 如果主模式没有匹配，尝试备用模式
-    if not matches:
-        matches = list(value_pattern_alt.finditer(sql_content))
-        if debug:
-            print(f"[DEBUG] 使用备用模式找到 {len(matches)} 个匹配")
+    records = _iter_serial_records(filepath, debug=debug, progress=progress)
+    yield from iter_record_batches(records, batch_rows, dictionary)
+
+
+def _iter_serial_records(
+    filepath: str,
+    debug: bool = False,
+    progress: Callable[[int], None] | None = None,
+) -> Iterator[dict]:
+    """单进程流式解析"""
+    file_ext = filepath.lower().split('.')[-1]
+    if file_ext == 'sql':
+        chunks = _iter_sql_chunks(filepath, progress=progress)
+        yield from _iter_sql_records(_iter_sql_fragments(chunks), debug=debug)
+    else:
+        yield from _iter_csv_records(_iter_file_rows(filepath, progress), debug=debug)
+
+
+# 并行解析：小于 PARALLEL_MIN_BYTES 的文件仍单进程解析，每个任务处理约 PARALLEL_CHUNK_BYTES
+PARALLEL_MIN_BYTES = 64 << 20
+PARALLEL_CHUNK_BYTES = 32 << 20
+
+# 按字节切分要求 "\n" 不会出现在多字节字符内部
+_BYTE_SPLITTABLE_ENCODINGS = {'utf-8', 'gbk', 'gb2312', 'latin1'}
+
+
+def _aligned_ranges(filepath: str, start: int, chunk_bytes: int, marker: bytes) -> list[tuple[int, int]]:
+    """
+    把 [start, 文件末尾) 切分为字节区间，每个边界位于 marker 首字节之后
+    （marker 以 "\n" 开头，因此边界总是新的一行）
+    """
+    size = os.path.getsize(filepath)
+    ranges = []
+    with open(filepath, 'rb') as f:
+        pos = start
+        while pos < size:
+            target = pos + chunk_bytes
+            boundary = size
+            if target < size:
+                f.seek(target)
+                window = b""
+                while True:
+                    block = f.read(1 << 16)
+                    if not block:
+                        break
+                    window += block
+                    idx = window.find(marker)
+                    if idx >= 0:
+                        boundary = target + idx + 1
+                        break
+                    # 保留可能被块边界拆开的 marker 前缀
+                    target += len(window) - len(marker) + 1
+                    window = window[-(len(marker) - 1):] if len(marker) > 1 else b""
+            ranges.append((pos, boundary))
+            pos = boundary
+    return ranges
+
+
+def _csv_record_ranges(
+    filepath: str, start: int, chunk_bytes: int, block_bytes: int = 1 << 20
+) -> list[tuple[int, int]] | None:
+    """
+    把 CSV 的 [start, 文件末尾) 切分为字节区间，每个边界都在一条记录结束的 "\n" 之后
+
+    从 start 起顺序统计双引号（"" 转义计两次，不影响奇偶），只在引号外的换行处切分，
+    引号字段内的换行不会把一条记录拆到两个区间；引号总数为奇数（引号不配对）时返回 None
+    """
+    size = os.path.getsize(filepath)
+    ranges = []
+    range_start = start
+    target = start + chunk_bytes
+    quoted = 0
+    with open(filepath, 'rb') as f:
+        f.seek(start)
+        pos = start
+        while True:
+            block = f.read(block_bytes)
+            if not block:
+                break
+            n = len(block)
+            # block[:i] 的引号已计入 quoted
+            i = 0
+            while target - pos < n:
+                j = max(target - pos, i)
+                quoted ^= block.count(b'"', i, j) & 1
+                i = j
+                while True:
+                    nl = block.find(b"\n", i)
+                    if nl < 0:
+                        break
+                    quoted ^= block.count(b'"', i, nl) & 1
+                    i = nl + 1
+                    if not quoted:
+                        break
+                if nl < 0:
+                    # 本块剩余部分没有可切分的换行，从下一块开头继续找
+                    target = pos + n
+                    break
+                ranges.append((range_start, pos + i))
+                range_start = pos + i
+                target = range_start + chunk_bytes
+            quoted ^= block.count(b'"', i) & 1
+            pos += n
+    if quoted:
+        return None
+    if range_start < size:
+        ranges.append((range_start, size))
+    return ranges
+
+
+def _plan_parallel_parse(filepath: str, debug: bool = False) -> tuple | None:
+    """
+    在父进程中完成一次性的格式/表头检测并切分文件，返回 (解析函数, 任务参数列表)；
+    不适合并行时返回 None
+    """
+    file_ext = filepath.lower().split('.')[-1]
+    if file_ext in ['xlsx', 'xls'] or os.path.getsize(filepath) < PARALLEL_MIN_BYTES:
+        return None
     
-    for i, match in enumerate(matches):
-        try:
-            name = match.group("name")
-            value_str = match.group("value")
-            time_str = match.group("time")
-            
-            # 跳过 NULL 值
-            if value_str.upper() == 'NULL':
-                continue
-            
-            # 处理转义字符
-            name = name.replace("\\'", "'").replace("\\\\", "\\")
-            
-            # 解析数值
-            value = float(value_str)
-            
-            # 标准化时间戳
-            timestamp = _normalize_timestamp(time_str)
-            
-            result.append({
-                "Name": name.strip(),
-                "Value": value,
-                "Time": timestamp
-            })
-            
-            if debug and i < 5:
-                print(f"[DEBUG] 记录 {i}: Name={name}, Value={value}, Time={timestamp}")
-                
-        except (ValueError, AttributeError) as e:
-            if debug and i < 10:
-                print(f"[DEBUG] 记录 {i} 解析失败: {e}")
-            continue
+    encoding = _detect_encoding(filepath)
+    if encoding not in _BYTE_SPLITTABLE_ENCODINGS:
+        return None
+    
+    if file_ext == 'sql':
+        ranges = _aligned_ranges(filepath, 0, PARALLEL_CHUNK_BYTES, b"\nINSERT")
+        tasks = [(filepath, start, end, encoding) for start, end in ranges]
+        return _parse_sql_range, tasks
+    
+    with open(filepath, 'r', encoding=encoding, newline='') as f:
+        head = list(itertools.islice(csv.reader(f), 5))
+    if len(head) < 2:
+        raise ValueError("文件至少需要 2 行数据")
+    
+    time_col_idx, tag_start_idx, data_start_row = _detect_csv_layout(head[:4], debug=debug)
+    tag_names = [str(tag_name).strip() for tag_name in head[0][tag_start_idx:]]
+    
+    # 用第一行数据探测时间戳格式，传给所有子进程
+    normalizer = TimestampNormalizer()
+    if len(head) > data_start_row and len(head[data_start_row]) > time_col_idx:
+        normalizer.normalize_column([str(head[data_start_row][time_col_idx]).strip()])
+    
+    # 跳过表头记录：引号未闭合的物理行与下一行属于同一条记录
+    with open(filepath, 'rb') as f:
+        records = quotes = 0
+        while records < data_start_row:
+            line = f.readline()
+            if not line:
+                break
+            quotes += line.count(b'"')
+            if quotes % 2 == 0:
+                records += 1
+        data_offset = f.tell()
     
+    ranges = _csv_record_ranges(filepath, data_offset, PARALLEL_CHUNK_BYTES)
+    if ranges is None:
+        if debug:
+            print("[DEBUG] 引号不配对，改为单进程解析")
+        return None
+    layout = (time_col_idx, tag_start_idx)
+    tasks = [
+        (filepath, start, end, encoding, layout, tag_names, normalizer.fmt)
+        for start, end in ranges
+    ]
     if debug:
-        print(f"[DEBUG] SQL dump 总计解析 {len(result)} 条记录\n")
+        print(f"[DEBUG] 并行解析: {len(tasks)} 个区间, 时间格式 {normalizer.fmt}")
+    return _parse_csv_range, tasks
+
+
+def _read_range_text(filepath: str, start: int, end: int, encoding: str) -> str:
+    with open(filepath, 'rb') as f:
+        f.seek(start)
+        return f.read(end - start).decode(encoding)
+
+
+def _build_batch(records: Iterable[dict]) -> RecordBatch:
+    builder = RecordBatchBuilder()
+    append = builder.append
+    for item in records:
+        append(item["Name"], item["Value"], item["Time"])
+    return builder.build()
+
+
+def _parse_csv_range(
+    filepath: str,
+    start: int,
+    end: int,
+    encoding: str,
+    layout: tuple[int, int],
+    tag_names: list[str],
+    ts_format: str | None,
+) -> RecordBatch:
+    """子进程：解析 CSV 的一个字节区间，返回列式批次（进程间只传输数组）"""
+    text = _read_range_text(filepath, start, end, encoding)
+    time_col_idx, tag_start_idx = layout
+    rows = enumerate(csv.reader(io.StringIO(text, newline='')))
+    records = _iter_csv_data(rows, time_col_idx, tag_start_idx, tag_names, TimestampNormalizer(ts_format))
+    return _build_batch(records)
+
+
+def _parse_sql_range(filepath: str, start: int, end: int, encoding: str) -> RecordBatch:
+    """子进程：解析 SQL dump 的一个字节区间（区间以 INSERT 语句开头）"""
+    text = _read_range_text(filepath, start, end, encoding)
+    return _build_batch(_iter_sql_records(_iter_sql_fragments([text])))
+
+
+def _run_parallel_parse(
+    parse_range,
+    tasks: list[tuple],
+    workers: int,
+    progress: Callable[[int], None] | None = None,
+) -> Iterator[RecordBatch]:
+    """
+    进程池执行各区间解析并按区间顺序产出各区间的 RecordBatch
+    
+    最多同时挂起 2 * workers 个区间，避免结果在内存中堆积；
+    每个区间合并完成后以区间结束偏移回调 progress（任务参数为 (filepath, start, end, ...)）
+    """
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    pending = deque()
+    
+    def drain_one() -> Iterator[RecordBatch]:
+        task, future = pending.popleft()
+        yield future.result()
+        if progress is not None:
+            progress(task[2])
     
-    return result
+    try:
+        for task in tasks:
+            pending.append((task, executor.submit(parse_range, *task)))
+            if len(pending) >= 2 * workers:
+                yield from drain_one()
+        while pending:
+            yield from drain_one()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
 
 
 def parse_file(filepath: str, debug: bool = False) -> list[dict]:
     """
     统一的文件解析入口，根据文件扩展名自动选择解析方式
     
+    兼容旧接口，返回字典列表；大文件请使用 iter_file_batches
+    
     支持格式:
     - .csv: CSV 文件
     - .xlsx/.xls: Excel 文件
@@ -163,14 +635,7 @@ def parse_file(filepath: str, debug: bool = False) -> list[dict]:
     返回统一的数据结构:
     [{"Name": "tag1", "Value": 123.45, "Time": "2024-01-01T00:00:00.000000Z"}, ...]
     """
-    file_ext = filepath.lower().split('.')[-1]
-    
-    if file_ext == 'sql':
-        sql_content = _read_sql_file(filepath)
-        return _parse_sql_dump(sql_content, debug=debug)
-    else:
-        rows = _read_file_content(filepath)
-        return _parse_csv_format(rows, debug=debug)
+    return list(iter_file_records(filepath, debug=debug))
 
 
 def parse_sql_content(sql_content: str, debug: bool = False) -> list[dict]:
@@ -186,13 +651,16 @@ def _parse_csv_format(rows: list[list[str]], debug: bool = False) -> list[dict]:
     解析四种 CSV/Excel 格式，返回统一的数据结构
     [{"Name": "tag1", "Value": 123.45, "Time": "2024-01-01T00:00:00.000000Z"}, ...]
     """
-    if len(rows) < 2:
-        raise ValueError("文件至少需要 2 行数据")
-    
+    return list(_iter_csv_records(rows, debug=debug))
+
+
+def _detect_csv_layout(rows: list[list[str]], debug: bool = False) -> tuple[int, int, int]:
+    """
+    根据文件前 4 行判断格式，返回 (time_col_idx, tag_start_idx, data_start_row)
+    """
     if debug:
-        print(f"\n[DEBUG] 总行数: {len(rows)}")
-        print(f"[DEBUG] 前5行内容:")
-        for i, row in enumerate(rows[:5]):
+        print(f"[DEBUG] 前{len(rows)}行内容:")
+        for i, row in enumerate(rows):
             print(f"  行{i}: {row}")
     
     # 检测格式
@@ -278,69 +746,131 @@ def _parse_csv_format(rows: list[list[str]], debug: bool = False) -> list[dict]:
         print(f"[DEBUG] time_col_idx: {time_col_idx}, tag_start_idx: {tag_start_idx}")
         print(f"[DEBUG] data_start_row: {data_start_row}")
     
+    return time_col_idx, tag_start_idx, data_start_row
+
+
+def _iter_csv_records(rows: Iterable[list[str]], debug: bool = False) -> Iterator[dict]:
+    """
+    流式解析四种 CSV/Excel 格式（生成器），只缓存用于格式检测的前 4 行
+    """
+    rows = iter(rows)
+    head = list(itertools.islice(rows, 4))
+    if len(head) < 2:
+        raise ValueError("文件至少需要 2 行数据")
+    
+    time_col_idx, tag_start_idx, data_start_row = _detect_csv_layout(head, debug=debug)
+    
     # 提取 tag 名称
-    tag_names = first_row[tag_start_idx:]
+    tag_names = [str(tag_name).strip() for tag_name in head[0][tag_start_idx:]]
     
     if debug:
         print(f"[DEBUG] 提取的tag名称: {tag_names[:5]}... (共{len(tag_names)}个)")
     
     # 解析数据行
-    result = []
-    for row_idx in range(data_start_row, len(rows)):
-        row = rows[row_idx]
-        if len(row) <= time_col_idx:
-            if debug and row_idx < data_start_row + 3:
-                print(f"[DEBUG] 行{row_idx} 跳过: 列数不足")
+    data_rows = itertools.islice(enumerate(itertools.chain(head, rows)), data_start_row, None)
+    total = yield from _iter_csv_data(
+        data_rows, time_col_idx, tag_start_idx, tag_names, TimestampNormalizer(),
+        debug_until=data_start_row + 3 if debug else -1,
+    )
+    
+    if debug:
+        print(f"[DEBUG] 总计解析 {total} 条记录\n")
+
+
+def _iter_csv_data(
+    data_rows: Iterable[tuple[int, list[str]]],
+    time_col_idx: int,
+    tag_start_idx: int,
+    tag_names: list[str],
+    normalizer: "TimestampNormalizer",
+    debug_until: int = -1,
+) -> Iterator[dict]:
+    """
+    解析 (行号, 行) 形式的数据行：按块收集时间戳列，整列标准化；返回记录数
+    
+    行号小于 debug_until 的行输出调试信息
+    """
+    data_rows = iter(data_rows)
+    total = 0
+    
+    while True:
+        block = []
+        seen = 0
+        for row_idx, row in itertools.islice(data_rows, TIMESTAMP_BLOCK_ROWS):
+            seen += 1
+            if len(row) <= time_col_idx:
+                if row_idx < debug_until:
+                    print(f"[DEBUG] 行{row_idx} 跳过: 列数不足")
+                continue
+            
+            timestamp_str = str(row[time_col_idx]).strip()
+            if not timestamp_str or timestamp_str == 'None':
+                if row_idx < debug_until:
+                    print(f"[DEBUG] 行{row_idx} 跳过: 时间戳为空")
+                continue
+            block.append((row_idx, row, timestamp_str))
+        
+        if not seen:
+            break
+        
+        # 标准化时间戳
+        timestamps = normalizer.normalize_column([item[2] for item in block])
+        
+        for (row_idx, row, timestamp_str), timestamp in zip(block, timestamps):
+            total += yield from _iter_row_records(
+                row_idx, row, timestamp_str, timestamp, tag_names, tag_start_idx,
+                debug=row_idx < debug_until,
+            )
+    
+    return total
+
+
+def _iter_row_records(
+    row_idx: int,
+    row: list[str],
+    timestamp_str: str,
+    timestamp: str | None,
+    tag_names: list[str],
+    tag_start_idx: int,
+    debug: bool = False,
+) -> Iterator[dict]:
+    """产出一行中每个 tag 的记录，返回成功解析的值个数"""
+    if timestamp is None:
+        if debug:
+            print(f"[DEBUG] 行{row_idx} 时间戳解析失败: {timestamp_str}")
+        return 0
+    
+    if debug:
+        print(f"[DEBUG] 行{row_idx} 时间戳: {timestamp_str} -> {timestamp}")
+    
+    # 提取每个 tag 的值
+    row_values = 0
+    for i, tag_name in enumerate(tag_names):
+        value_idx = tag_start_idx + i
+        if value_idx >= len(row):
             continue
             
-        timestamp_str = str(row[time_col_idx]).strip()
-        if not timestamp_str or timestamp_str == 'None':
-            if debug and row_idx < data_start_row + 3:
-                print(f"[DEBUG] 行{row_idx} 跳过: 时间戳为空")
+        value_str = str(row[value_idx]).strip()
+        if not value_str or value_str.lower() in ['', 'nan', 'null', 'none']:
             continue
         
-        # 标准化时间戳
         try:
-            timestamp = _normalize_timestamp(timestamp_str)
-        except ValueError as e:
-            if debug and row_idx < data_start_row + 3:
-                print(f"[DEBUG] 行{row_idx} 时间戳解析失败: {timestamp_str} - {e}")
+            value = float(value_str)
+        except ValueError:
+            if debug and i < 3:
+                print(f"[DEBUG] 行{row_idx} tag{i}({tag_name}) 值解析失败: '{value_str}'")
             continue
         
-        if debug and row_idx < data_start_row + 3:
-            print(f"[DEBUG] 行{row_idx} 时间戳: {timestamp_str} -> {timestamp}")
-        
-        # 提取每个 tag 的值
-        row_values = 0
-        for i, tag_name in enumerate(tag_names):
-            value_idx = tag_start_idx + i
-            if value_idx >= len(row):
-                continue
-                
-            value_str = str(row[value_idx]).strip()
-            if not value_str or value_str.lower() in ['', 'nan', 'null', 'none']:
-                continue
-            
-            try:
-                value = float(value_str)
-                result.append({
-                    "Name": str(tag_name).strip(),
-                    "Value": value,
-                    "Time": timestamp
-                })
-                row_values += 1
-            except ValueError:
-                if debug and row_idx < data_start_row + 3 and i < 3:
-                    print(f"[DEBUG] 行{row_idx} tag{i}({tag_name}) 值解析失败: '{value_str}'")
-                continue
-        
-        if debug and row_idx < data_start_row + 3:
-            print(f"[DEBUG] 行{row_idx} 成功解析 {row_values} 个值")
+        yield {
+            "Name": tag_name,
+            "Value": value,
+            "Time": timestamp
+        }
+        row_values += 1
     
     if debug:
-        print(f"[DEBUG] 总计解析 {len(result)} 条记录\n")
-    
-    return result
+        print(f"[DEBUG] 行{row_idx} 成功解析 {row_values} 个值")
+    return row_values
 
 def _is_timestamp(value: str) -> bool:
     """检查字符串是否为时间戳格式"""
@@ -351,6 +881,180 @@ def _is_timestamp(value: str) -> bool:
     return any(re.search(pattern, value) for pattern in timestamp_patterns)
 
 
+# 时间戳列按块整列标准化的行数
+TIMESTAMP_BLOCK_ROWS = 4096
+
+
+def _ts_pattern(date_part: str, time_part: str = "", frac: bool = False, zulu: bool = False) -> re.Pattern:
+    """按 strptime 语义构造整串匹配的正则（%m/%d/%H 等允许 1-2 位）"""
+    pattern = date_part + time_part
+    if frac:
+        pattern += r"\.(?P<f>\d{1,6})"
+    if zulu:
+        pattern += "Z"
+    return re.compile(pattern)
+
+
+_YMD = r"(?P<Y>\d{4})-(?P<m>\d{1,2})-(?P<d>\d{1,2})"
+_HMS = r"(?P<H>\d{1,2}):(?P<M>\d{1,2}):(?P<S>\d{1,2})"
+
+# 常见格式（按原有优先级排列），每种格式预编译为正则，不再逐个调用 strptime
+_TIMESTAMP_FORMATS = [
+    ("%Y-%m-%d %H:%M:%S.%f", _ts_pattern(_YMD, r"\s+" + _HMS, frac=True)),
+    ("%Y-%m-%d %H:%M:%S", _ts_pattern(_YMD, r"\s+" + _HMS)),
+    ("%Y/%m/%d %H:%M:%S", _ts_pattern(r"(?P<Y>\d{4})/(?P<m>\d{1,2})/(?P<d>\d{1,2})", r"\s+" + _HMS)),
+    ("%m/%d/%Y %H:%M:%S", _ts_pattern(r"(?P<m>\d{1,2})/(?P<d>\d{1,2})/(?P<Y>\d{4})", r"\s+" + _HMS)),
+    ("%d/%m/%Y %H:%M:%S", _ts_pattern(r"(?P<d>\d{1,2})/(?P<m>\d{1,2})/(?P<Y>\d{4})", r"\s+" + _HMS)),
+    ("%Y-%m-%dT%H:%M:%S.%fZ", _ts_pattern(_YMD, "T" + _HMS, frac=True, zulu=True)),
+    ("%Y-%m-%dT%H:%M:%SZ", _ts_pattern(_YMD, "T" + _HMS, zulu=True)),
+    ("%Y-%m-%d", _ts_pattern(_YMD)),
+]
+
+_ISO_FORMAT = "iso"
+
+
+def _format_questdb_timestamp(dt: datetime) -> str:
+    """输出 QuestDB 格式（毫秒精度）: 2024-01-01T00:00:00.123000Z"""
+    return (
+        f"{dt.year:04d}-{dt.month:02d}-{dt.day:02d}T"
+        f"{dt.hour:02d}:{dt.minute:02d}:{dt.second:02d}.{dt.microsecond // 1000:03d}000Z"
+    )
+
+
+def _parse_with_format(ts_str: str, fmt: str) -> datetime | None:
+    """按指定格式解析，不匹配返回 None"""
+    if fmt == _ISO_FORMAT:
+        try:
+            return datetime.fromisoformat(ts_str.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    
+    match = _TIMESTAMP_PATTERNS[fmt].fullmatch(ts_str)
+    if not match:
+        return None
+    fields = match.groupdict()
+    frac = fields.get("f")
+    try:
+        return datetime(
+            int(fields["Y"]),
+            int(fields["m"]),
+            int(fields["d"]),
+            int(fields.get("H") or 0),
+            int(fields.get("M") or 0),
+            int(fields.get("S") or 0),
+            int(frac.ljust(6, "0")) if frac else 0,
+        )
+    except ValueError:
+        return None
+
+
+_TIMESTAMP_PATTERNS = dict(_TIMESTAMP_FORMATS)
+_FORMAT_ORDER = [fmt for fmt, _ in _TIMESTAMP_FORMATS] + [_ISO_FORMAT]
+
+# 可以整列交给 numpy datetime64 解析的定宽格式: YYYY-MM-DD[ T]HH:MM:SS[.ffffff][Z]
+_NUMPY_FORMATS = {
+    "%Y-%m-%d %H:%M:%S.%f",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S.%fZ",
+    "%Y-%m-%dT%H:%M:%SZ",
+}
+
+
+class TimestampNormalizer:
+    """
+    单个文件使用的时间戳标准化器
+    
+    第一次解析成功的格式被缓存，后续值先走该格式的预编译解析器，
+    不匹配时才按原有顺序重新探测；重复出现的时间戳直接命中结果缓存
+    """
+    
+    def __init__(self, fmt: str | None = None, cache_size: int = 65536):
+        self.fmt = fmt
+        self.cache_size = cache_size
+        self._cache: dict[str, str] = {}
+    
+    def __call__(self, ts_str: str) -> str:
+        cached = self._cache.get(ts_str)
+        if cached is not None:
+            return cached
+        
+        value = ts_str.strip()
+        dt = _parse_with_format(value, self.fmt) if self.fmt else None
+        if dt is None:
+            for fmt in _FORMAT_ORDER:
+                dt = _parse_with_format(value, fmt)
+                if dt is not None:
+                    self.fmt = fmt
+                    break
+            else:
+                raise ValueError(f"无法解析时间戳: {value}")
+        
+        result = _format_questdb_timestamp(dt)
+        if len(self._cache) >= self.cache_size:
+            self._cache.clear()
+        self._cache[ts_str] = result
+        return result
+    
+    def normalize_column(self, values: list[str]) -> list[str | None]:
+        """
+        整列转换，无法解析的值返回 None
+        
+        探测到的格式为定宽 ISO 类格式时交给 numpy 向量化解析
+        """
+        if not values:
+            return []
+        if self.fmt is None:
+            for value in values:
+                try:
+                    self(value)
+                    break
+                except ValueError:
+                    continue
+        
+        if self.fmt in _NUMPY_FORMATS:
+            result = _normalize_column_numpy(values)
+            if result is not None:
+                return result
+        
+        normalized = []
+        for value in values:
+            try:
+                normalized.append(self(value))
+            except ValueError:
+                normalized.append(None)
+        return normalized
+
+
+def _normalize_column_numpy(values: list[str]) -> list[str] | None:
+    """定宽 YYYY-MM-DD[ T]HH:MM:SS[.ffffff][Z] 整列解析，结构不一致或越界时返回 None"""
+    arr = np.array([value.strip() for value in values])
+    width = arr.dtype.itemsize // 4
+    if width < 19 or width > 27:
+        return None
+    
+    chars = arr.view("U1").reshape(len(arr), width)
+    has_zulu = chars[0, -1] == "Z"
+    body = width - 1 if has_zulu else width
+    if not (
+        (np.char.str_len(arr) == width).all()
+        and (chars[:, 4] == "-").all()
+        and (chars[:, 7] == "-").all()
+        and ((chars[:, 10] == " ") | (chars[:, 10] == "T")).all()
+        and (chars[:, 13] == ":").all()
+        and (chars[:, 16] == ":").all()
+        and ((chars[:, width - 1] == "Z") == has_zulu).all()
+        and (body == 19 or (body > 20 and (chars[:, 19] == ".").all()))
+    ):
+        return None
+    
+    try:
+        parsed = chars[:, :body].copy().view(f"U{body}").ravel().astype("datetime64[us]")
+    except ValueError:
+        return None
+    iso = np.datetime_as_string(parsed.astype("datetime64[ms]"), unit="ms")
+    return np.char.add(iso, "000Z").tolist()
+
+
 def _normalize_timestamp(ts_str: str) -> str:
     """
     将各种时间戳格式标准化为 QuestDB 接受的格式
@@ -358,31 +1062,12 @@ def _normalize_timestamp(ts_str: str) -> str:
     """
     ts_str = ts_str.strip()
     
-    # 常见格式
-    formats = [
-        "%Y-%m-%d %H:%M:%S.%f",
-        "%Y-%m-%d %H:%M:%S",
-        "%Y/%m/%d %H:%M:%S",
-        "%m/%d/%Y %H:%M:%S",
-        "%d/%m/%Y %H:%M:%S",
-        "%Y-%m-%dT%H:%M:%S.%fZ",
-        "%Y-%m-%dT%H:%M:%SZ",
-        "%Y-%m-%d",
-    ]
+    for fmt in _FORMAT_ORDER:
+        dt = _parse_with_format(ts_str, fmt)
+        if dt is not None:
+            return _format_questdb_timestamp(dt)
     
-    for fmt in formats:
-        try:
-            dt = datetime.strptime(ts_str, fmt)
-            return dt.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "000Z"
-        except ValueError:
-            continue
-    
-    # 如果都不匹配，尝试 ISO 格式
-    try:
-        dt = datetime.fromisoformat(ts_str.replace('Z', '+00:00'))
-        return dt.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "000Z"
-    except:
-        raise ValueError(f"无法解析时间戳: {ts_str}")
+    raise ValueError(f"无法解析时间戳: {ts_str}")
 
 
 def test_from_file(filepath: str, debug: bool = True):
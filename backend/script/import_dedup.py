@@ -0,0 +1,46 @@
+import numpy as np
+
+from script.record_batch import RecordBatch, TagDictionary
+
+
+class TagRangeFilter:
+    """
+    去重导入的预过滤：跳过时间落在该 tag 已有数据范围 [first, last] 内的记录
+
+    假定每个 tag 已导入的数据在其时间范围内是连续的（重复上传重叠的 DCS 导出），
+    因此重叠窗口只写入新数据；精确去重仍由表上的 DEDUP UPSERT KEYS(Time, Name) 保证
+    """
+
+    def __init__(self, ranges: dict[str, tuple[int, int]]):
+        # ranges: tag 名称 -> (最早, 最晚) Unix 微秒
+        self.ranges = ranges
+        self.skipped = 0
+        self._dictionary: TagDictionary | None = None
+        self._first = np.empty(0, dtype=np.int64)
+        self._last = np.empty(0, dtype=np.int64)
+
+    def _sync(self, dictionary: TagDictionary) -> None:
+        """按字典编号展开范围数组；字典增长后补齐新 tag（无范围的 tag 用 first > last 表示）"""
+        if dictionary is not self._dictionary:
+            self._dictionary = dictionary
+            self._first = np.empty(0, dtype=np.int64)
+            self._last = np.empty(0, dtype=np.int64)
+        known = len(self._first)
+        if known == len(dictionary):
+            return
+        new_names = dictionary.names[known:]
+        first = [self.ranges.get(name, (1, 0))[0] for name in new_names]
+        last = [self.ranges.get(name, (1, 0))[1] for name in new_names]
+        self._first = np.concatenate([self._first, np.array(first, dtype=np.int64)])
+        self._last = np.concatenate([self._last, np.array(last, dtype=np.int64)])
+
+    def __call__(self, batch: RecordBatch) -> RecordBatch:
+        if not self.ranges or not len(batch):
+            return batch
+        self._sync(batch.dictionary)
+        covered = (batch.times >= self._first[batch.codes]) & (batch.times <= self._last[batch.codes])
+        skipped = int(covered.sum())
+        if not skipped:
+            return batch
+        self.skipped += skipped
+        return batch.filter(~covered)
@@ -0,0 +1,246 @@
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable
+
+
+class ImportCancelled(Exception):
+    """导入任务被用户取消"""
+
+
+class ImportQueueFull(Exception):
+    """等待中的导入任务已达上限"""
+
+
+class ImportManagerClosed(Exception):
+    """进程正在退出，不再接收导入任务"""
+
+
+@dataclass
+class ImportJob:
+    """一次后台导入任务及其进度"""
+
+    table_name: str
+    user: str
+    filename: str
+    transport: str
+    path: str
+    mode: str = "append"  # append / dedup
+    bytes_total: int = 0
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = "queued"  # queued / running / succeeded / failed / cancelled
+    bytes_read: int = 0
+    rows_parsed: int = 0
+    rows_ingested: int = 0
+    rows_replaced: int = 0  # 去重表中覆盖已有数据的行（不计入 rows_ingested）
+    rejects: int = 0
+    skipped: int = 0
+    chunks: int = 0
+    error: str | None = None
+    created_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+    _cancel: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel.is_set()
+
+    def check_cancelled(self) -> None:
+        """在批次之间调用，收到取消请求时中止任务"""
+        if self._cancel.is_set():
+            raise ImportCancelled()
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "table_name": self.table_name,
+            "user": self.user,
+            "filename": self.filename,
+            "transport": self.transport,
+            "mode": self.mode,
+            "status": self.status,
+            "bytes_total": self.bytes_total,
+            "bytes_read": self.bytes_read,
+            "rows_parsed": self.rows_parsed,
+            "rows_ingested": self.rows_ingested,
+            "rows_replaced": self.rows_replaced,
+            "rejects": self.rejects,
+            "skipped": self.skipped,
+            "chunks": self.chunks,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class ImportJobManager:
+    """
+    后台导入任务队列
+
+    - 线程池执行 run(job)，等待中的任务数（含已预留的名额）不超过 max_pending
+    - 上传文件前先 reserve 预留名额，队列已满或正在退出时在读取请求体之前拒绝
+    - 同一张表的任务串行执行，按提交顺序排队
+    - 保留最近 history 个任务供查询
+    - 进程退出前调用 drain：不再接收新任务，等待已提交的任务完成，超时后取消剩余任务
+    """
+
+    def __init__(
+        self,
+        run: Callable[[ImportJob], None],
+        cleanup: Callable[[ImportJob], None] | None = None,
+        max_workers: int = 2,
+        max_pending: int = 16,
+        history: int = 200,
+        logger: logging.Logger | None = None,
+    ):
+        self._run = run
+        self._cleanup = cleanup
+        self.max_pending = max_pending
+        self.history = history
+        self.logger = logger or logging.getLogger(__name__)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="import-job")
+        self._lock = threading.Lock()
+        # 任务结束时通知 drain
+        self._finished = threading.Condition(self._lock)
+        self._closed = False
+        # 已预留、尚未 submit 的名额（上传中的文件）
+        self._reserved = 0
+        self._jobs: OrderedDict[str, ImportJob] = OrderedDict()
+        self._active_tables: set[str] = set()
+        self._table_queues: dict[str, deque[ImportJob]] = {}
+
+    def _check_admission(self) -> None:
+        """调用方持有锁"""
+        if self._closed:
+            raise ImportManagerClosed()
+        pending = sum(1 for item in self._jobs.values() if item.status == "queued")
+        if pending + self._reserved >= self.max_pending:
+            raise ImportQueueFull()
+
+    def reserve(self) -> None:
+        """预留一个排队名额；之后必须调用 submit(job, reserved=True) 或 release_reservation"""
+        with self._lock:
+            self._check_admission()
+            self._reserved += 1
+
+    def release_reservation(self) -> None:
+        with self._lock:
+            self._reserved -= 1
+
+    def submit(self, job: ImportJob, reserved: bool = False) -> ImportJob:
+        """提交任务；reserved 为 True 时使用 reserve 预留的名额（正在退出时仍会拒绝并释放名额）"""
+        with self._lock:
+            if reserved:
+                self._reserved -= 1
+                if self._closed:
+                    raise ImportManagerClosed()
+            else:
+                self._check_admission()
+
+            self._jobs[job.id] = job
+            self._trim_history()
+            if job.table_name in self._active_tables:
+                self._table_queues.setdefault(job.table_name, deque()).append(job)
+            else:
+                self._active_tables.add(job.table_name)
+                self._executor.submit(self._execute, job)
+        return job
+
+    def get(self, job_id: str) -> ImportJob | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self, user: str | None = None, limit: int = 50) -> list[ImportJob]:
+        """最近的任务（新的在前），指定 user 时只返回该用户的任务"""
+        with self._lock:
+            jobs = [job for job in reversed(self._jobs.values()) if user is None or job.user == user]
+        return jobs[:limit]
+
+    def cancel(self, job_id: str) -> ImportJob | None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job._cancel.set()
+            if job.status == "queued":
+                job.status = "cancelled"
+                job.finished_at = time.time()
+        return job
+
+    def drain(self, timeout: float, cancel_wait: float = 10) -> bool:
+        """
+        停止接收新任务，最多等待 timeout 秒让排队和执行中的任务完成；
+        仍未完成的任务请求取消（在批次之间生效），再最多等待 cancel_wait 秒。
+        全部结束时返回 True
+        """
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            self._closed = True
+            if not self._wait_idle(deadline):
+                unfinished = [job for job in self._jobs.values() if job.status in ("queued", "running")]
+                self.logger.warning("Cancelling %d unfinished import jobs on shutdown", len(unfinished))
+                for job in unfinished:
+                    job._cancel.set()
+                if not self._wait_idle(time.monotonic() + cancel_wait):
+                    return False
+        self._executor.shutdown(wait=True)
+        return True
+
+    def _wait_idle(self, deadline: float) -> bool:
+        """等待所有表的任务结束（调用方持有锁）"""
+        while self._active_tables:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            self._finished.wait(remaining)
+        return True
+
+    def _execute(self, job: ImportJob) -> None:
+        try:
+            if job.cancel_requested:
+                job.status = "cancelled"
+            else:
+                job.status = "running"
+                job.started_at = time.time()
+                self._run(job)
+                job.status = "succeeded"
+        except ImportCancelled:
+            job.status = "cancelled"
+        except Exception as exc:
+            self.logger.error("Import job %s (%s) failed: %s", job.id, job.table_name, exc)
+            job.status = "failed"
+            job.error = job.error or str(exc)
+        finally:
+            job.finished_at = job.finished_at or time.time()
+            if self._cleanup is not None:
+                try:
+                    self._cleanup(job)
+                except Exception as exc:
+                    self.logger.warning("Import job %s cleanup failed: %s", job.id, exc)
+            self._start_next(job.table_name)
+
+    def _start_next(self, table_name: str) -> None:
+        with self._lock:
+            queue = self._table_queues.get(table_name)
+            if queue:
+                self._executor.submit(self._execute, queue.popleft())
+                if not queue:
+                    del self._table_queues[table_name]
+            else:
+                self._active_tables.discard(table_name)
+                self._finished.notify_all()
+
+    def _trim_history(self) -> None:
+        """只淘汰已结束的旧任务"""
+        finished = [
+            job_id for job_id, job in self._jobs.items()
+            if job.status in ("succeeded", "failed", "cancelled")
+        ]
+        for job_id in finished[:max(0, len(self._jobs) - self.history)]:
+            del self._jobs[job_id]
@@ -0,0 +1,176 @@
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from ldap3 import BASE, NONE, SYNC, Connection, Server
+from ldap3.core.exceptions import LDAPBindError, LDAPCommunicationError, LDAPException
+from ldap3.utils.conv import escape_filter_chars
+
+
+class LdapPoolExhausted(LDAPException):
+    """等待空闲 LDAP 连接超时"""
+
+
+class LdapPool:
+    """
+    LDAP 访问层
+
+    - 服务账号连接放在池中复用（LIFO），最多 pool_size 个，用于查找用户
+    - 不获取 schema/DSE 信息（get_info=NONE），Server 对象只创建一次
+    - 密码校验使用独立的短连接 bind，不改变池中连接的身份
+    - 空闲超过 health_check_interval 的连接在取出时做一次轻量检查，超过 max_idle 直接丢弃
+    """
+
+    def __init__(
+        self,
+        host: str,
+        base_dn: str,
+        bind_dn: str,
+        bind_password: str,
+        port: int = 636,
+        use_ssl: bool = True,
+        tls=None,
+        pool_size: int = 8,
+        connect_timeout: float = 5,
+        receive_timeout: float = 10,
+        acquire_timeout: float = 5,
+        max_idle: float = 300,
+        health_check_interval: float = 60,
+        server: Server | None = None,
+        client_strategy=SYNC,
+        logger: logging.Logger | None = None,
+    ):
+        # 测试时可传入 Server("fake") 与 client_strategy=MOCK_SYNC
+        self.server = server or Server(
+            host,
+            port=port,
+            use_ssl=use_ssl,
+            tls=tls,
+            get_info=NONE,
+            connect_timeout=connect_timeout,
+        )
+        self.base_dn = base_dn
+        self.bind_dn = bind_dn
+        self.bind_password = bind_password
+        self.receive_timeout = receive_timeout
+        self.acquire_timeout = acquire_timeout
+        self.max_idle = max_idle
+        self.health_check_interval = health_check_interval
+        self.client_strategy = client_strategy
+        self.logger = logger or logging.getLogger(__name__)
+
+        self._idle: queue.LifoQueue[tuple[Connection, float]] = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._stats_lock = threading.Lock()
+        self._stats = {"created": 0, "reused": 0, "discarded": 0, "health_checks": 0, "password_binds": 0}
+
+    def _count(self, key: str) -> None:
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def _open(self) -> Connection:
+        conn = Connection(
+            self.server,
+            user=self.bind_dn,
+            password=self.bind_password,
+            authentication="SIMPLE",
+            client_strategy=self.client_strategy,
+            receive_timeout=self.receive_timeout,
+            read_only=True,
+        )
+        if not conn.bind():
+            raise LDAPBindError(f"服务账号 bind 失败: {conn.result.get('description')}")
+        self._count("created")
+        return conn
+
+    def _discard(self, conn: Connection) -> None:
+        self._count("discarded")
+        try:
+            conn.unbind()
+        except LDAPException:
+            pass
+
+    def _healthy(self, conn: Connection, idle_seconds: float) -> bool:
+        if conn.closed or not conn.bound:
+            return False
+        if idle_seconds < self.health_check_interval:
+            return True
+        self._count("health_checks")
+        try:
+            return conn.search(self.base_dn, "(objectClass=*)", search_scope=BASE, attributes=[])
+        except LDAPException:
+            return False
+
+    def _checkout(self) -> Connection:
+        while True:
+            try:
+                conn, released_at = self._idle.get_nowait()
+            except queue.Empty:
+                return self._open()
+            idle_seconds = time.monotonic() - released_at
+            if idle_seconds <= self.max_idle and self._healthy(conn, idle_seconds):
+                self._count("reused")
+                return conn
+            self._discard(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[Connection]:
+        """借出一个已用服务账号 bind 的连接；出错的连接不放回池中"""
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise LdapPoolExhausted("LDAP 连接池已满")
+        conn = None
+        try:
+            conn = self._checkout()
+            yield conn
+        except Exception:
+            if conn is not None:
+                self._discard(conn)
+                conn = None
+            raise
+        finally:
+            if conn is not None:
+                self._idle.put((conn, time.monotonic()))
+            self._slots.release()
+
+    def find_user(self, username: str, attributes: list[str]):
+        """按 sAMAccountName 查找用户条目，不存在返回 None；池中连接已断开时换新连接重试一次"""
+        search_filter = f"(sAMAccountName={escape_filter_chars(username)})"
+        for attempt in range(2):
+            try:
+                with self.connection() as conn:
+                    conn.search(self.base_dn, search_filter, attributes=attributes)
+                    return conn.entries[0] if conn.entries else None
+            except LDAPCommunicationError as exc:
+                if attempt:
+                    raise
+                self.logger.warning("LDAP pooled connection failed, retrying: %s", exc)
+
+    def verify_password(self, user: str, password: str) -> bool:
+        """用独立的短连接以用户身份（DN 或 UPN）bind 校验密码"""
+        if not password:
+            # 空密码会变成匿名 bind 并"成功"
+            return False
+        self._count("password_binds")
+        conn = Connection(
+            self.server,
+            user=user,
+            password=password,
+            authentication="SIMPLE",
+            client_strategy=self.client_strategy,
+            receive_timeout=self.receive_timeout,
+            read_only=True,
+        )
+        try:
+            return bool(conn.bind())
+        finally:
+            try:
+                conn.unbind()
+            except LDAPException:
+                pass
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {**self._stats, "idle": self._idle.qsize()}
@@ -0,0 +1,184 @@
+import math
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+
+
+class QueryRejected(Exception):
+    """超出并发上限或排队已满，retry_after 为建议的重试间隔（秒）"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class QueryTicket:
+    """一次已获准执行的查询；结束时调用 release（可重复调用）"""
+
+    def __init__(self, scheduler: "QueryScheduler", kind: str, user: str):
+        self.kind = kind
+        self.user = user
+        self.started_at = time.monotonic()
+        self._scheduler = scheduler
+        self._released = False
+
+    def release(self) -> None:
+        self._scheduler._release(self)
+
+
+class _Waiter:
+    __slots__ = ("user", "ticket")
+
+    def __init__(self, user: str):
+        self.user = user
+        self.ticket: QueryTicket | None = None
+
+
+class QueryScheduler:
+    """
+    QuestDB 查询的准入控制
+
+    - interactive（图表、表详情）：不排队，超过全局或单用户并发上限立即拒绝
+    - bulk（导出、聚合）：全局最多 bulk_limit 个同时执行，每个用户最多 bulk_per_user 个；
+      其余请求按用户轮转排队（每个用户的请求先进先出），等待超过 bulk_queue_timeout 秒或队列已满时拒绝
+    - 两类并发上限分开计算，导出占满时交互查询仍有固定的份额
+    """
+
+    def __init__(
+        self,
+        interactive_limit: int = 16,
+        interactive_per_user: int = 4,
+        bulk_limit: int = 2,
+        bulk_per_user: int = 1,
+        bulk_queue_size: int = 16,
+        bulk_queue_per_user: int = 2,
+        bulk_queue_timeout: float = 30,
+    ):
+        self.interactive_limit = interactive_limit
+        self.interactive_per_user = interactive_per_user
+        self.bulk_limit = bulk_limit
+        self.bulk_per_user = bulk_per_user
+        self.bulk_queue_size = bulk_queue_size
+        self.bulk_queue_per_user = bulk_queue_per_user
+        self.bulk_queue_timeout = bulk_queue_timeout
+
+        self._cond = threading.Condition()
+        self._running = {INTERACTIVE: Counter(), BULK: Counter()}
+        # 用户 -> 等待中的请求；按 OrderedDict 顺序轮转调度
+        self._queues: OrderedDict[str, deque[_Waiter]] = OrderedDict()
+        self._queued = 0
+        # bulk 查询平均耗时（指数滑动平均），用于估算 Retry-After
+        self._bulk_seconds = 30.0
+        self._stats = Counter()
+
+    def admit(self, kind: str, user: str) -> QueryTicket:
+        """申请执行一次查询；interactive 立即返回，bulk 可能排队等待"""
+        if kind == INTERACTIVE:
+            return self._admit_interactive(user)
+        if kind == BULK:
+            return self._admit_bulk(user)
+        raise ValueError(f"未知的查询类别: {kind}")
+
+    def _admit_interactive(self, user: str) -> QueryTicket:
+        with self._cond:
+            running = self._running[INTERACTIVE]
+            if running[user] >= self.interactive_per_user:
+                self._stats["interactive_rejected"] += 1
+                raise QueryRejected("并发查询过多，请稍后重试", retry_after=1)
+            if running.total() >= self.interactive_limit:
+                self._stats["interactive_rejected"] += 1
+                raise QueryRejected("查询繁忙，请稍后重试", retry_after=1)
+            running[user] += 1
+            self._stats["interactive_admitted"] += 1
+            return QueryTicket(self, INTERACTIVE, user)
+
+    def _admit_bulk(self, user: str) -> QueryTicket:
+        with self._cond:
+            queue = self._queues.get(user)
+            if queue is not None and len(queue) >= self.bulk_queue_per_user:
+                self._stats["bulk_rejected"] += 1
+                raise QueryRejected("排队中的导出任务过多，请等待完成后重试", self._retry_after())
+            if self._queued >= self.bulk_queue_size:
+                self._stats["bulk_rejected"] += 1
+                raise QueryRejected("导出任务排队已满，请稍后重试", self._retry_after())
+
+            waiter = _Waiter(user)
+            self._queues.setdefault(user, deque()).append(waiter)
+            self._queued += 1
+            self._dispatch()
+
+            deadline = time.monotonic() + self.bulk_queue_timeout
+            while waiter.ticket is None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._remove_waiter(waiter)
+                    self._stats["bulk_timed_out"] += 1
+                    raise QueryRejected("导出任务排队超时，请稍后重试", self._retry_after())
+                self._cond.wait(remaining)
+            self._stats["bulk_admitted"] += 1
+            return waiter.ticket
+
+    def _dispatch(self) -> None:
+        """把空出的 bulk 名额按用户轮转分配给等待中的请求（调用方持有锁）"""
+        running = self._running[BULK]
+        granted = False
+        while running.total() < self.bulk_limit:
+            user = next(
+                (user for user in self._queues if running[user] < self.bulk_per_user),
+                None,
+            )
+            if user is None:
+                break
+            queue = self._queues.pop(user)
+            waiter = queue.popleft()
+            if queue:
+                # 该用户排到队尾，下一个名额先给其他用户
+                self._queues[user] = queue
+            self._queued -= 1
+            running[user] += 1
+            waiter.ticket = QueryTicket(self, BULK, user)
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def _remove_waiter(self, waiter: _Waiter) -> None:
+        queue = self._queues.get(waiter.user)
+        if queue is None:
+            return
+        queue.remove(waiter)
+        self._queued -= 1
+        if not queue:
+            del self._queues[waiter.user]
+
+    def _release(self, ticket: QueryTicket) -> None:
+        with self._cond:
+            if ticket._released:
+                return
+            ticket._released = True
+            running = self._running[ticket.kind]
+            running[ticket.user] -= 1
+            if running[ticket.user] <= 0:
+                del running[ticket.user]
+            if ticket.kind == BULK:
+                elapsed = time.monotonic() - ticket.started_at
+                self._bulk_seconds = 0.8 * self._bulk_seconds + 0.2 * elapsed
+                self._dispatch()
+
+    def _retry_after(self) -> int:
+        """按排队长度和 bulk 平均耗时估算重试间隔（秒）"""
+        rounds = (self._queued + 1) / max(1, self.bulk_limit)
+        return min(300, max(1, math.ceil(rounds * self._bulk_seconds)))
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "interactive_running": self._running[INTERACTIVE].total(),
+                "bulk_running": self._running[BULK].total(),
+                "bulk_queued": self._queued,
+                "bulk_avg_seconds": round(self._bulk_seconds, 3),
+                **self._stats,
+            }
@@ -0,0 +1,176 @@
+import asyncio
+import codecs
+import csv
+import io
+import logging
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Iterator, Sequence
+
+import httpx
+
+
+_RETRY_STATUSES = frozenset([502, 503, 504])
+# 只有连接阶段的错误重试；读超时说明查询本身很重，重发只会加重 QuestDB 负载
+_RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout)
+
+
+def _complete_records_end(text: str, quoted: bool) -> tuple[int, bool]:
+    """
+    text 中最后一个引号外的换行之后的位置（没有时为 -1），以及 text 末尾是否处于引号内
+
+    quoted 为 text 开头的引号状态；"" 转义计两次，不影响奇偶
+    """
+    quoted_end = quoted ^ bool(text.count('"') & 1)
+    tail_quotes = 0
+    end = len(text)
+    while True:
+        nl = text.rfind("\n", 0, end)
+        if nl < 0:
+            return -1, quoted_end
+        tail_quotes += text.count('"', nl, end)
+        if quoted_end == bool(tail_quotes & 1):
+            # 换行处的引号状态 = 末尾状态 ^ 换行之后引号数的奇偶，为 False 即在引号外
+            return nl + 1, quoted_end
+        end = nl
+
+
+class AsyncQuestDBClient:
+    """
+    QuestDB 异步 HTTP 客户端（httpx.AsyncClient），供 ASGI 接口使用
+
+    - 所有查询共用一个连接池，同时在途的查询数不超过 max_in_flight
+    - 只提供只读的 GET /exec 与 GET /exp，连接错误和 502/503/504 按指数退避重试，读超时不重试
+    - /exp CSV 按字节流增量解码，只在引号外的换行处切分记录，解析为列存储
+    - 每次调用记录耗时，按操作类型汇总（与 QuestDBClient.stats 相同的结构）
+    """
+
+    def __init__(
+        self,
+        exec_url: str,
+        export_url: str | None = None,
+        max_connections: int = 100,
+        max_in_flight: int = 200,
+        max_retries: int = 3,
+        backoff_factor: float = 0.2,
+        logger: logging.Logger | None = None,
+    ):
+        self.exec_url = exec_url
+        self.export_url = export_url or exec_url.rsplit("/", 1)[0] + "/exp"
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.logger = logger or logging.getLogger(__name__)
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        # 只在事件循环线程中更新，不需要加锁
+        self._stats: dict[str, dict] = {}
+
+    @contextmanager
+    def _timed(self, operation: str) -> Iterator[None]:
+        started = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            stat = self._stats.setdefault(
+                operation, {"calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0}
+            )
+            stat["calls"] += 1
+            stat["errors"] += 0 if ok else 1
+            stat["total_ms"] += elapsed_ms
+            stat["max_ms"] = max(stat["max_ms"], elapsed_ms)
+            self.logger.debug("QuestDB async %s took %.1f ms (ok=%s)", operation, elapsed_ms, ok)
+
+    async def _get(
+        self,
+        operation: str,
+        url: str,
+        query: str,
+        timeout: float,
+        consume: Callable[[httpx.Response], Awaitable[Any]],
+    ) -> Any:
+        """流式 GET，consume 读取响应体；连接失败或 502/503/504 时整体重试（查询是幂等的）"""
+        async with self._in_flight:
+            with self._timed(operation):
+                for attempt in range(self.max_retries + 1):
+                    last_attempt = attempt == self.max_retries
+                    try:
+                        async with self.client.stream(
+                            "GET", url, params={"query": query}, timeout=timeout
+                        ) as response:
+                            if response.status_code not in _RETRY_STATUSES or last_attempt:
+                                response.raise_for_status()
+                                return await consume(response)
+                    except _RETRY_ERRORS:
+                        if last_attempt:
+                            raise
+                    await asyncio.sleep(self.backoff_factor * (2 ** attempt))
+
+    async def exec(self, query: str, timeout: float = 10) -> dict:
+        """执行 /exec 查询并返回解码后的 JSON"""
+
+        async def consume(response: httpx.Response) -> dict:
+            await response.aread()
+            return response.json()
+
+        return await self._get("exec", self.exec_url, query, timeout, consume)
+
+    async def exp_columns(
+        self,
+        query: str,
+        converters: Sequence[Callable[[str], Any]],
+        timeout: float = 60,
+    ) -> list[list]:
+        """通过 /exp 读取查询结果并增量转换为列存储，每列一个 list"""
+
+        async def consume(response: httpx.Response) -> list[list]:
+            columns = [[] for _ in converters]
+            appenders = [(column.append, convert) for column, convert in zip(columns, converters)]
+            decoder = codecs.getincrementaldecoder("utf-8")()
+            header = True
+            quoted = False
+            # 还没有凑成完整记录的文本
+            pending: list[str] = []
+
+            def parse(text: str) -> None:
+                nonlocal header
+                if not text:
+                    return
+                reader = csv.reader(io.StringIO(text, newline=""))
+                if header:
+                    next(reader, None)
+                    header = False
+                for row in reader:
+                    for (append, convert), cell in zip(appenders, row):
+                        append(convert(cell))
+
+            async for data in response.aiter_bytes():
+                chunk = decoder.decode(data)
+                cut, quoted = _complete_records_end(chunk, quoted)
+                if cut < 0:
+                    pending.append(chunk)
+                    continue
+                pending.append(chunk[:cut])
+                parse("".join(pending))
+                pending = [chunk[cut:]]
+            pending.append(decoder.decode(b"", final=True))
+            parse("".join(pending))
+            return columns
+
+        return await self._get("exp", self.export_url, query, timeout, consume)
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+    def stats(self) -> dict:
+        return {
+            operation: {
+                **stat,
+                "avg_ms": stat["total_ms"] / stat["calls"] if stat["calls"] else 0.0,
+            }
+            for operation, stat in self._stats.items()
+        }
@@ -0,0 +1,167 @@
+import csv
+import io
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Sequence
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class QuestDBClient:
+    """
+    QuestDB HTTP 客户端：所有查询/导入共用一个带连接池的 keep-alive Session
+
+    - GET /exec 为幂等读取，连接错误和 502/503/504 按指数退避重试；
+      读超时不重试（重查询超时说明 QuestDB 已过载，重发只会成倍拉长耗时）
+    - 大批量读取走 GET /exp，CSV 流式增量解析，不经过 JSON 解码
+    - POST /imp 与 ILP POST /write 不重试，避免重复导入
+    - 每次调用记录耗时，按操作类型汇总
+    """
+
+    def __init__(
+        self,
+        exec_url: str,
+        import_url: str,
+        export_url: str | None = None,
+        ilp_url: str | None = None,
+        pool_size: int = 16,
+        max_retries: int = 3,
+        backoff_factor: float = 0.2,
+        logger: logging.Logger | None = None,
+    ):
+        self.exec_url = exec_url
+        self.import_url = import_url
+        self.export_url = export_url or exec_url.rsplit("/", 1)[0] + "/exp"
+        self.ilp_url = ilp_url or exec_url.rsplit("/", 1)[0] + "/write"
+        self.logger = logger or logging.getLogger(__name__)
+        self.session = requests.Session()
+
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=False,
+            status=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset(["GET"]),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._stats_lock = threading.Lock()
+        self._stats: dict[str, dict] = {}
+
+    @contextmanager
+    def _timed(self, operation: str) -> Iterator[None]:
+        started = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with self._stats_lock:
+                stat = self._stats.setdefault(
+                    operation, {"calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0}
+                )
+                stat["calls"] += 1
+                stat["errors"] += 0 if ok else 1
+                stat["total_ms"] += elapsed_ms
+                stat["max_ms"] = max(stat["max_ms"], elapsed_ms)
+            self.logger.debug("QuestDB %s took %.1f ms (ok=%s)", operation, elapsed_ms, ok)
+
+    def exec_response(self, query: str, timeout: float = 10, stream: bool = False) -> requests.Response:
+        """执行 /exec 查询，返回已检查状态码的原始响应"""
+        with self._timed("exec"):
+            response = self.session.get(
+                self.exec_url,
+                params={"query": query},
+                timeout=timeout,
+                stream=stream,
+            )
+            response.raise_for_status()
+            return response
+
+    def exec(self, query: str, timeout: float = 10) -> dict:
+        """执行 /exec 查询并返回解码后的 JSON"""
+        return self.exec_response(query, timeout=timeout).json()
+
+    def exp_rows(self, query: str, timeout: float = 60) -> Iterator[list[str]]:
+        """通过 /exp 以 CSV 流式读取查询结果，逐行产出（不含表头）"""
+        with self._timed("exp"):
+            response = self.session.get(
+                self.export_url,
+                params={"query": query},
+                timeout=timeout,
+                stream=True,
+            )
+            response.raise_for_status()
+        with response:
+            response.raw.decode_content = True
+            # 响应读完后不自动关闭，否则 TextIOWrapper 在 Content-Length 响应末尾读取时报错
+            response.raw.auto_close = False
+            reader = csv.reader(io.TextIOWrapper(response.raw, encoding="utf-8", newline=""))
+            next(reader, None)
+            yield from reader
+
+    def exp_columns(
+        self,
+        query: str,
+        converters: Sequence[Callable[[str], Any]],
+        timeout: float = 60,
+    ) -> list[list]:
+        """通过 /exp 读取查询结果并增量转换为列存储，每列一个 list"""
+        columns = [[] for _ in converters]
+        appenders = [(column.append, convert) for column, convert in zip(columns, converters)]
+        for row in self.exp_rows(query, timeout=timeout):
+            for (append, convert), cell in zip(appenders, row):
+                append(convert(cell))
+        return columns
+
+    def imp(
+        self,
+        table_name: str,
+        csv_payload: str,
+        filename: str = "import.csv",
+        overwrite: bool = False,
+        timeout: float = 60,
+    ) -> requests.Response:
+        """通过 /imp 导入一段 CSV 文本"""
+        with self._timed("imp"):
+            response = self.session.post(
+                self.import_url,
+                params={"name": table_name, "fmt": "json", "overwrite": "true" if overwrite else "false"},
+                files={"data": (filename, csv_payload, "text/csv")},
+                timeout=timeout,
+            )
+            response.raise_for_status()
+            return response
+
+    def ilp_write(self, payload: bytes, timeout: float = 60) -> requests.Response:
+        """通过 ILP over HTTP（/write）写入一批 line protocol 数据，时间戳精度为纳秒"""
+        with self._timed("ilp"):
+            response = self.session.post(
+                self.ilp_url,
+                params={"precision": "n"},
+                data=payload,
+                headers={"Content-Type": "text/plain; charset=utf-8"},
+                timeout=timeout,
+            )
+            response.raise_for_status()
+            return response
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                operation: {
+                    **stat,
+                    "avg_ms": stat["total_ms"] / stat["calls"] if stat["calls"] else 0.0,
+                }
+                for operation, stat in self._stats.items()
+            }
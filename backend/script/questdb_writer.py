@@ -0,0 +1,129 @@
+import csv
+import io
+import math
+import socket
+from typing import Iterable, Iterator
+
+from script.record_batch import RecordBatch
+
+
+CSV_HEADER = ["Name", "Value", "Time::timestamp"]
+
+
+def iter_csv_chunks(batches: Iterable[RecordBatch], chunk_rows: int) -> Iterator[tuple[str, int]]:
+    """
+    把列式批次流切分为 QuestDB /imp 可接受的 CSV 文本块（生成器）
+    
+    每次产出 (csv_text, rows)，内存占用只与 chunk_rows 有关
+    """
+    if chunk_rows <= 0:
+        raise ValueError("chunk_rows 必须大于 0")
+    
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    count = 0
+    
+    for batch in batches:
+        start = 0
+        while start < len(batch):
+            part = batch[start:start + chunk_rows - count]
+            writer.writerows(zip(part.name_list(), part.values.tolist(), part.time_strings()))
+            count += len(part)
+            start += len(part)
+            if count >= chunk_rows:
+                yield buffer.getvalue(), count
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerow(CSV_HEADER)
+                count = 0
+    
+    if count:
+        yield buffer.getvalue(), count
+
+
+# ILP 中 measurement（表名）与 tag/symbol 值需要转义的字符（换行不转义会被当作行结束）
+_ILP_TABLE_ESCAPES = str.maketrans({
+    ",": "\\,", " ": "\\ ", "\\": "\\\\", "\n": "\\\n", "\r": "\\\r",
+})
+_ILP_SYMBOL_ESCAPES = str.maketrans({
+    ",": "\\,", " ": "\\ ", "=": "\\=", "\\": "\\\\", "\n": "\\\n", "\r": "\\\r",
+})
+
+
+def iter_ilp_batches(
+    table_name: str,
+    batches: Iterable[RecordBatch],
+    batch_rows: int,
+    batch_bytes: int,
+) -> Iterator[tuple[bytes, int, int]]:
+    """
+    把列式批次流编码为 InfluxDB line protocol 批次（生成器）
+    
+    每行: <table>,Name=<symbol> Value=<double> <纳秒时间戳>
+    达到 batch_rows 行或 batch_bytes 字节即产出 (payload, rows, dropped)；
+    ILP 不接受 NaN/Infinity，这些行不写入，计入 dropped
+    """
+    if batch_rows <= 0 or batch_bytes <= 0:
+        raise ValueError("batch_rows/batch_bytes 必须大于 0")
+    
+    measurement = table_name.translate(_ILP_TABLE_ESCAPES)
+    # 每个 tag 的行前缀只转义一次，随字典增长补齐
+    prefixes: list[str] = []
+    lines = []
+    size = 0
+    dropped = 0
+    isfinite = math.isfinite
+    
+    for batch in batches:
+        names = batch.names
+        for name in names[len(prefixes):]:
+            prefixes.append(f"{measurement},Name={str(name).translate(_ILP_SYMBOL_ESCAPES)} Value=")
+        
+        times_ns = (batch.times * 1000).tolist()
+        for code, value, ns in zip(batch.codes.tolist(), batch.values.tolist(), times_ns):
+            if not isfinite(value):
+                dropped += 1
+                continue
+            line = f"{prefixes[code]}{value!r} {ns}\n".encode("utf-8")
+            lines.append(line)
+            size += len(line)
+            if len(lines) >= batch_rows or size >= batch_bytes:
+                yield b"".join(lines), len(lines), dropped
+                lines = []
+                size = 0
+                dropped = 0
+    
+    if lines or dropped:
+        yield b"".join(lines), len(lines), dropped
+
+
+class IlpTcpSender:
+    """
+    ILP over TCP 发送端（QuestDB 默认端口 9009）
+
+    TCP 协议没有逐批确认，服务端拒绝数据时表现为连接被关闭
+    """
+
+    def __init__(self, host: str, port: int, timeout: float = 30):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._sock: socket.socket | None = None
+
+    def __enter__(self) -> "IlpTcpSender":
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def send(self, payload: bytes) -> None:
+        if self._sock is None:
+            raise OSError("ILP 连接未建立")
+        self._sock.sendall(payload)
+
+    def close(self) -> None:
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
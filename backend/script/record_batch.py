@@ -0,0 +1,147 @@
+from typing import Iterable, Iterator
+
+import numpy as np
+
+
+class TagDictionary:
+    """tag 名称字典：名称 <-> 整数编号，同一个文件的所有批次共用"""
+
+    def __init__(self, names: Iterable[str] = ()):
+        self.names: list[str] = []
+        self._index: dict[str, int] = {}
+        for name in names:
+            self.code(name)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def code(self, name: str) -> int:
+        code = self._index.get(name)
+        if code is None:
+            code = self._index[name] = len(self.names)
+            self.names.append(name)
+        return code
+
+
+class RecordBatch:
+    """
+    列式记录批次：tag 编号 (int32)、数值 (float64)、时间戳 (int64，Unix 微秒)
+
+    每个数据点约 20 字节；可切片（共享字典，不复制数据），
+    迭代时产出兼容旧接口的 {"Name", "Value", "Time"} 字典
+    """
+
+    __slots__ = ("dictionary", "codes", "values", "times")
+
+    def __init__(self, dictionary: TagDictionary, codes: np.ndarray, values: np.ndarray, times: np.ndarray):
+        self.dictionary = dictionary
+        self.codes = codes
+        self.values = values
+        self.times = times
+
+    @property
+    def names(self) -> list[str]:
+        return self.dictionary.names
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, index: slice) -> "RecordBatch":
+        if not isinstance(index, slice):
+            raise TypeError("RecordBatch 只支持切片访问")
+        return RecordBatch(self.dictionary, self.codes[index], self.values[index], self.times[index])
+
+    def filter(self, mask: np.ndarray) -> "RecordBatch":
+        """按布尔掩码筛选行"""
+        return RecordBatch(self.dictionary, self.codes[mask], self.values[mask], self.times[mask])
+
+    def __iter__(self) -> Iterator[dict]:
+        names = self.dictionary.names
+        for code, value, timestamp in zip(self.codes.tolist(), self.values.tolist(), self.time_strings()):
+            yield {"Name": names[code], "Value": value, "Time": timestamp}
+
+    def name_list(self) -> list[str]:
+        """按行展开的 tag 名称"""
+        names = self.dictionary.names
+        return [names[code] for code in self.codes.tolist()]
+
+    def time_strings(self) -> list[str]:
+        """批量格式化为 QuestDB 时间戳字符串（2024-01-01T00:00:00.000000Z），每个不同时间只格式化一次"""
+        if not len(self.times):
+            return []
+        unique_times, inverse = np.unique(self.times, return_inverse=True)
+        iso = np.datetime_as_string(unique_times.astype("datetime64[us]"), unit="us")
+        formatted = [ts + "Z" for ts in iso.tolist()]
+        return [formatted[i] for i in inverse.tolist()]
+
+    def recode(self, dictionary: TagDictionary) -> "RecordBatch":
+        """把编号映射到另一个字典（合并子进程各自建立的字典时使用）"""
+        if dictionary is self.dictionary:
+            return self
+        mapping = np.array([dictionary.code(name) for name in self.dictionary.names], dtype=np.int32)
+        codes = mapping[self.codes] if len(mapping) else self.codes
+        return RecordBatch(dictionary, codes, self.values, self.times)
+
+
+class RecordBatchBuilder:
+    """逐条追加 (Name, Value, Time) 并生成 RecordBatch；时间戳字符串按批去重后整列转换"""
+
+    def __init__(self, dictionary: TagDictionary | None = None):
+        self.dictionary = dictionary or TagDictionary()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._codes: list[int] = []
+        self._values: list[float] = []
+        self._time_codes: list[int] = []
+        self._time_index: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def append(self, name: str, value: float, timestamp: str) -> None:
+        time_code = self._time_index.get(timestamp)
+        if time_code is None:
+            time_code = self._time_index[timestamp] = len(self._time_index)
+        self._codes.append(self.dictionary.code(name))
+        self._values.append(value)
+        self._time_codes.append(time_code)
+
+    def build(self) -> RecordBatch:
+        """生成当前批次并清空缓冲区"""
+        unique_times = _parse_questdb_times(list(self._time_index))
+        batch = RecordBatch(
+            self.dictionary,
+            np.array(self._codes, dtype=np.int32),
+            np.array(self._values, dtype=np.float64),
+            unique_times[np.array(self._time_codes, dtype=np.intp)] if self._time_codes else unique_times,
+        )
+        self._reset()
+        return batch
+
+
+def _parse_questdb_times(timestamps: list[str]) -> np.ndarray:
+    """QuestDB 时间戳字符串（以 Z 结尾的 UTC 时间）整列转为 Unix 微秒"""
+    if not timestamps:
+        return np.empty(0, dtype=np.int64)
+    naive = [ts[:-1] if ts.endswith("Z") else ts for ts in timestamps]
+    return np.array(naive, dtype="datetime64[us]").astype(np.int64)
+
+
+def iter_record_batches(
+    records: Iterable[dict],
+    batch_rows: int,
+    dictionary: TagDictionary | None = None,
+) -> Iterator[RecordBatch]:
+    """把 {"Name", "Value", "Time"} 记录流打包为最多 batch_rows 行的列式批次（生成器）"""
+    if batch_rows <= 0:
+        raise ValueError("batch_rows 必须大于 0")
+
+    builder = RecordBatchBuilder(dictionary)
+    append = builder.append
+    for item in records:
+        append(item["Name"], item["Value"], item["Time"])
+        if len(builder) >= batch_rows:
+            yield builder.build()
+    if len(builder):
+        yield builder.build()
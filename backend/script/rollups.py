@@ -0,0 +1,90 @@
+import re
+
+
+# 汇总表后缀 -> 桶宽（秒），从细到粗
+ROLLUP_INTERVALS = {"1m": 60, "1h": 3600}
+
+# 原始表与汇总表上同一聚合指标的表达式；汇总表保存 sum/count，可以再合并为更粗的桶
+RAW_AGGREGATES = {
+    "avg": "avg(Value)",
+    "min": "min(Value)",
+    "max": "max(Value)",
+    "first": "first(Value)",
+    "last": "last(Value)",
+    "count": "count()",
+}
+ROLLUP_AGGREGATES = {
+    "avg": "sum(sum_value) / sum(value_count)",
+    "min": "min(min_value)",
+    "max": "max(max_value)",
+    "first": "first(first_value)",
+    "last": "last(last_value)",
+    "count": "sum(value_count)",
+}
+
+_ROLLUP_NAME = re.compile(r"^(?P<base>.+)_(?P<suffix>" + "|".join(ROLLUP_INTERVALS) + r")$")
+
+
+def rollup_table_name(table_name: str, suffix: str) -> str:
+    return f"{table_name}_{suffix}"
+
+
+def rollup_base_table(table_name: str, existing: set[str]) -> str | None:
+    """若 table_name 是某张已存在表的汇总表，返回原始表名"""
+    match = _ROLLUP_NAME.match(table_name)
+    if match and match.group("base") in existing:
+        return match.group("base")
+    return None
+
+
+def create_rollup_sql(rollup_table: str) -> str:
+    """汇总表：按 (Time, Name) 去重，重算某个时间段时直接覆盖旧桶"""
+    return f"""
+    CREATE TABLE IF NOT EXISTS {rollup_table} (
+        Time TIMESTAMP,
+        Name SYMBOL,
+        avg_value DOUBLE,
+        min_value DOUBLE,
+        max_value DOUBLE,
+        first_value DOUBLE,
+        last_value DOUBLE,
+        sum_value DOUBLE,
+        value_count LONG
+    ) timestamp(Time) PARTITION BY MONTH WAL DEDUP UPSERT KEYS(Time, Name);
+    """
+
+
+def refresh_rollup_sql(
+    table_name: str,
+    rollup_table: str,
+    interval_seconds: int,
+    start_us: int | None = None,
+    end_us: int | None = None,
+) -> str:
+    """
+    从原始表重算 [start_us, end_us) 内的汇总桶（不指定时重算整张表）
+
+    调用方应把范围对齐到桶边界，避免写入只包含部分数据的桶
+    """
+    conditions = []
+    if start_us is not None:
+        conditions.append(f"Time >= cast({start_us} AS TIMESTAMP)")
+    if end_us is not None:
+        conditions.append(f"Time < cast({end_us} AS TIMESTAMP)")
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return f"""
+    INSERT INTO {rollup_table}
+    SELECT Time, Name, avg(Value), min(Value), max(Value), first(Value), last(Value), sum(Value), count()
+    FROM {table_name}
+    {where}
+    SAMPLE BY {interval_seconds}s ALIGN TO CALENDAR;
+    """
+
+
+def choose_rollup(seconds: int, available: set[str]) -> tuple[str, int] | None:
+    """桶宽不超过 seconds 的最粗汇总表 (后缀, 桶宽)，没有合适的返回 None"""
+    best = None
+    for suffix, interval in ROLLUP_INTERVALS.items():
+        if suffix in available and interval <= seconds and (best is None or interval > best[1]):
+            best = (suffix, interval)
+    return best
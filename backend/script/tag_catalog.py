@@ -0,0 +1,207 @@
+import sqlite3
+import threading
+import time
+from typing import Iterable
+
+import numpy as np
+
+from script.record_batch import RecordBatch
+
+
+def format_epoch_us(value: int | None) -> str | None:
+    """Unix 微秒转为 QuestDB 时间戳字符串"""
+    if value is None:
+        return None
+    return str(np.datetime64(int(value), "us")) + "Z"
+
+
+class TagStats:
+    """一次导入中按 tag 汇总的 (最早, 最晚, 行数)，导入成功后一次性写入目录"""
+
+    def __init__(self):
+        self._stats: dict[str, list[int]] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self._stats)
+
+    def add(self, batch: RecordBatch) -> None:
+        if not len(batch):
+            return
+        n_tags = len(batch.dictionary)
+        counts = np.bincount(batch.codes, minlength=n_tags)
+        first = np.full(n_tags, np.iinfo(np.int64).max, dtype=np.int64)
+        last = np.full(n_tags, np.iinfo(np.int64).min, dtype=np.int64)
+        np.minimum.at(first, batch.codes, batch.times)
+        np.maximum.at(last, batch.codes, batch.times)
+        names = batch.names
+        for code in np.nonzero(counts)[0].tolist():
+            entry = self._stats.get(names[code])
+            if entry is None:
+                self._stats[names[code]] = [int(first[code]), int(last[code]), int(counts[code])]
+            else:
+                entry[0] = min(entry[0], int(first[code]))
+                entry[1] = max(entry[1], int(last[code]))
+                entry[2] += int(counts[code])
+
+    def tags(self) -> list[str]:
+        return list(self._stats)
+
+    def rows(self) -> list[tuple[str, int, int, int]]:
+        return [(tag, first, last, count) for tag, (first, last, count) in self._stats.items()]
+
+
+class TagCatalog:
+    """
+    持久化的 tag 目录（SQLite）：每张表每个 tag 的最早/最晚时间（Unix 微秒）与行数
+
+    表第一次被访问时从 QuestDB 全量同步一次，之后由导入任务增量更新；
+    未同步的表（synced 返回 False）由调用方回退到直接查询 QuestDB
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS catalog_tables (
+                    table_name TEXT PRIMARY KEY,
+                    synced_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS rollup_watermarks (
+                    table_name TEXT NOT NULL,
+                    rollup TEXT NOT NULL,
+                    watermark_us INTEGER NOT NULL,
+                    PRIMARY KEY (table_name, rollup)
+                )
+                """
+            )
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS tag_stats (
+                    table_name TEXT NOT NULL,
+                    tag TEXT NOT NULL,
+                    first_us INTEGER NOT NULL,
+                    last_us INTEGER NOT NULL,
+                    row_count INTEGER NOT NULL,
+                    PRIMARY KEY (table_name, tag)
+                )
+                """
+            )
+
+    def synced(self, table_name: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM catalog_tables WHERE table_name = ?", (table_name,)
+            ).fetchone()
+        return row is not None
+
+    def synced_tables(self) -> set[str]:
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT table_name FROM catalog_tables")}
+
+    def replace_table(self, table_name: str, rows: Iterable[tuple[str, int, int, int]]) -> None:
+        """用全量统计结果 (tag, first_us, last_us, count) 替换一张表的目录"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM tag_stats WHERE table_name = ?", (table_name,))
+            self._conn.executemany(
+                "INSERT INTO tag_stats VALUES (?, ?, ?, ?, ?)",
+                ((table_name, tag, first, last, count) for tag, first, last, count in rows),
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO catalog_tables VALUES (?, ?)", (table_name, time.time())
+            )
+
+    def merge(self, table_name: str, stats: TagStats) -> None:
+        """合并一次导入的统计；未同步的表忽略（下次访问时全量同步）"""
+        with self._lock, self._conn:
+            synced = self._conn.execute(
+                "SELECT 1 FROM catalog_tables WHERE table_name = ?", (table_name,)
+            ).fetchone()
+            if synced is None:
+                return
+            self._conn.executemany(
+                """
+                INSERT INTO tag_stats VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (table_name, tag) DO UPDATE SET
+                    first_us = min(first_us, excluded.first_us),
+                    last_us = max(last_us, excluded.last_us),
+                    row_count = row_count + excluded.row_count
+                """,
+                ((table_name, tag, first, last, count) for tag, first, last, count in stats.rows()),
+            )
+
+    def update_tags(self, table_name: str, rows: Iterable[tuple[str, int, int, int]]) -> None:
+        """用重新统计的结果覆盖部分 tag（去重表导入后使用）；未同步的表忽略"""
+        with self._lock, self._conn:
+            synced = self._conn.execute(
+                "SELECT 1 FROM catalog_tables WHERE table_name = ?", (table_name,)
+            ).fetchone()
+            if synced is None:
+                return
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO tag_stats VALUES (?, ?, ?, ?, ?)",
+                ((table_name, tag, first, last, count) for tag, first, last, count in rows),
+            )
+
+    def forget(self, table_name: str) -> None:
+        """标记为未同步（导入中途失败等目录可能不准确的情况）"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM tag_stats WHERE table_name = ?", (table_name,))
+            self._conn.execute("DELETE FROM catalog_tables WHERE table_name = ?", (table_name,))
+
+    def rollup_watermark(self, table_name: str, rollup: str) -> int | None:
+        """汇总表已覆盖的范围：Time < watermark 的原始数据都已汇总（Unix 微秒）；未知时返回 None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT watermark_us FROM rollup_watermarks WHERE table_name = ? AND rollup = ?",
+                (table_name, rollup),
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_rollup_watermark(self, table_name: str, rollup: str, watermark_us: int) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO rollup_watermarks VALUES (?, ?, ?)",
+                (table_name, rollup, watermark_us),
+            )
+
+    def tags(self, table_name: str) -> list[tuple[str, int, int, int]]:
+        """(tag, first_us, last_us, count)，按行数降序"""
+        with self._lock:
+            return self._conn.execute(
+                """
+                SELECT tag, first_us, last_us, row_count FROM tag_stats
+                WHERE table_name = ? ORDER BY row_count DESC, tag
+                """,
+                (table_name,),
+            ).fetchall()
+
+    def time_range(self, table_name: str, tags: Iterable[str] | None = None) -> tuple[int | None, int | None]:
+        """整张表（或指定 tag）的最早/最晚时间"""
+        query = "SELECT min(first_us), max(last_us) FROM tag_stats WHERE table_name = ?"
+        params: list = [table_name]
+        if tags is not None:
+            tags = list(tags)
+            query += f" AND tag IN ({','.join('?' * len(tags))})"
+            params.extend(tags)
+        with self._lock:
+            return self._conn.execute(query, params).fetchone()
+
+    def table_ranges(self) -> dict[str, tuple[int | None, int | None]]:
+        """所有已同步表的时间范围"""
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT c.table_name, min(s.first_us), max(s.last_us)
+                FROM catalog_tables c LEFT JOIN tag_stats s ON s.table_name = c.table_name
+                GROUP BY c.table_name
+                """
+            ).fetchall()
+        return {name: (first, last) for name, first, last in rows}
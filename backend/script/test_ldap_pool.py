@@ -0,0 +1,108 @@
+import pytest
+from ldap3 import MOCK_SYNC, OFFLINE_AD_2012_R2, Connection, Server
+from ldap3.core.exceptions import LDAPBindError, LDAPCommunicationError
+
+from script.ldap_pool import LdapPool, LdapPoolExhausted
+
+
+BASE_DN = "OU=Users,DC=example,DC=cn"
+SERVICE_DN = f"CN=svc,{BASE_DN}"
+JOHN_DN = f"CN=john,{BASE_DN}"
+
+
+@pytest.fixture
+def server():
+    """MOCK_SYNC 的目录数据挂在 Server 对象上，池中各连接共享"""
+    server = Server("fake", get_info=OFFLINE_AD_2012_R2)
+    setup = Connection(server, client_strategy=MOCK_SYNC)
+    setup.strategy.add_entry(BASE_DN, {"objectClass": "organizationalUnit"})
+    setup.strategy.add_entry(SERVICE_DN, {"userPassword": "svc-pw", "sAMAccountName": "svc"})
+    setup.strategy.add_entry(JOHN_DN, {
+        "userPassword": "secret",
+        "sAMAccountName": "john",
+        "displayName": "John",
+        "objectClass": "person",
+    })
+    return server
+
+
+def _pool(server, password="svc-pw", **kwargs):
+    return LdapPool(
+        "fake", BASE_DN, SERVICE_DN, password,
+        server=server, client_strategy=MOCK_SYNC, **kwargs,
+    )
+
+
+def test_find_user_reuses_bound_connection(server):
+    pool = _pool(server)
+    entry = pool.find_user("john", ["displayName"])
+    assert entry.entry_dn == JOHN_DN
+    assert entry.displayName.value == "John"
+    assert pool.find_user("nobody", ["displayName"]) is None
+    stats = pool.stats()
+    assert (stats["created"], stats["reused"], stats["idle"]) == (1, 1, 1)
+
+
+def test_service_account_bind_failure(server):
+    pool = _pool(server, password="wrong")
+    with pytest.raises(LDAPBindError):
+        pool.find_user("john", ["displayName"])
+    assert pool.stats()["idle"] == 0
+
+
+def test_verify_password(server):
+    pool = _pool(server)
+    assert pool.verify_password(JOHN_DN, "secret")
+    assert not pool.verify_password(JOHN_DN, "bad")
+    # 空密码会变成匿名 bind，必须直接拒绝
+    assert not pool.verify_password(JOHN_DN, "")
+    assert pool.stats()["password_binds"] == 2
+
+
+@pytest.mark.parametrize("username", ["jo*", "*", "john)(sAMAccountName=*", "*)(|(objectClass=*"])
+def test_filter_is_escaped(server, username):
+    assert _pool(server).find_user(username, ["displayName"]) is None
+
+
+def test_connection_discarded_after_error(server):
+    pool = _pool(server, pool_size=1, acquire_timeout=0.1)
+    with pytest.raises(RuntimeError):
+        with pool.connection():
+            raise RuntimeError("boom")
+    assert pool.stats()["discarded"] == 1
+    assert pool.stats()["idle"] == 0
+    # 名额已归还，下一次借出新建连接
+    with pool.connection() as conn:
+        assert conn.bound
+    assert pool.stats()["created"] == 2
+    assert pool.stats()["idle"] == 1
+
+
+def test_pool_exhausted(server):
+    pool = _pool(server, pool_size=1, acquire_timeout=0.05)
+    with pool.connection():
+        with pytest.raises(LdapPoolExhausted):
+            with pool.connection():
+                pass
+    with pool.connection():
+        pass
+
+
+def test_find_user_retries_on_broken_connection(server):
+    pool = _pool(server)
+    with pool.connection() as conn:
+        def broken(*args, **kwargs):
+            raise LDAPCommunicationError("socket closed")
+        conn.search = broken
+    entry = pool.find_user("john", ["displayName"])
+    assert entry.entry_dn == JOHN_DN
+    stats = pool.stats()
+    assert (stats["created"], stats["discarded"], stats["idle"]) == (2, 1, 1)
+
+
+def test_idle_connection_health_check(server):
+    pool = _pool(server, health_check_interval=0)
+    pool.find_user("john", ["displayName"])
+    pool.find_user("john", ["displayName"])
+    assert pool.stats()["health_checks"] == 1
+    assert pool.stats()["reused"] == 1
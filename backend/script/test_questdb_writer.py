@@ -0,0 +1,101 @@
+import socket
+import threading
+
+import pytest
+
+from script.questdb_writer import IlpTcpSender, iter_ilp_batches
+from script.record_batch import RecordBatchBuilder
+
+
+def _batch(rows):
+    builder = RecordBatchBuilder()
+    for name, value, timestamp in rows:
+        builder.append(name, value, timestamp)
+    return builder.build()
+
+
+class _IlpServer:
+    """本地 TCP 服务，收下连接上的全部字节，代替 QuestDB 的 ILP 端口"""
+
+    def __init__(self):
+        self._listener = socket.create_server(("127.0.0.1", 0))
+        self.port = self._listener.getsockname()[1]
+        self.received = b""
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        conn, _ = self._listener.accept()
+        with conn:
+            while chunk := conn.recv(65536):
+                self.received += chunk
+
+    def close(self):
+        self._thread.join(timeout=5)
+        self._listener.close()
+
+
+@pytest.fixture
+def ilp_server():
+    server = _IlpServer()
+    yield server
+    server.close()
+
+
+def test_line_format():
+    batch = _batch([
+        ("TI-101", 1.5, "2024-01-01T00:00:00.000000Z"),
+        ("TI-102", -2.0, "2024-01-01T00:00:01.250000Z"),
+    ])
+    (payload, rows, dropped), = iter_ilp_batches("plant", [batch], 100, 1 << 20)
+    assert (rows, dropped) == (2, 0)
+    assert payload.decode() == (
+        "plant,Name=TI-101 Value=1.5 1704067200000000000\n"
+        "plant,Name=TI-102 Value=-2.0 1704067201250000000\n"
+    )
+
+
+def test_escaping():
+    batch = _batch([("a b,c=d\\e\nf\rg", 1.0, "2024-01-01T00:00:00.000000Z")])
+    (payload, _, _), = iter_ilp_batches("my table", [batch], 100, 1 << 20)
+    assert payload.decode() == "my\\ table,Name=a\\ b\\,c\\=d\\\\e\\\nf\\\rg Value=1.0 1704067200000000000\n"
+
+
+def test_non_finite_values_are_dropped():
+    batch = _batch([
+        ("t", float("nan"), "2024-01-01T00:00:00.000000Z"),
+        ("t", float("inf"), "2024-01-01T00:00:01.000000Z"),
+        ("t", 3.0, "2024-01-01T00:00:02.000000Z"),
+        ("t", float("-inf"), "2024-01-01T00:00:03.000000Z"),
+    ])
+    batches = list(iter_ilp_batches("plant", [batch], 100, 1 << 20))
+    assert batches == [(b"plant,Name=t Value=3.0 1704067202000000000\n", 1, 3)]
+    assert b"nan" not in batches[0][0] and b"inf" not in batches[0][0]
+
+
+def test_batch_limits():
+    batch = _batch([("t", float(i), "2024-01-01T00:00:00.000000Z") for i in range(5)])
+    assert [rows for _, rows, _ in iter_ilp_batches("plant", [batch], 2, 1 << 20)] == [2, 2, 1]
+    # 每行都超过字节上限时逐行产出
+    assert [rows for _, rows, _ in iter_ilp_batches("plant", [batch], 100, 1)] == [1] * 5
+
+
+def test_tcp_sender(ilp_server):
+    batch = _batch([
+        ("x y", 1.0, "2024-01-01T00:00:00.000000Z"),
+        ("x y", float("nan"), "2024-01-01T00:00:01.000000Z"),
+        ("z", 2.5, "2024-01-01T00:00:02.000000Z"),
+    ])
+    with IlpTcpSender("127.0.0.1", ilp_server.port, timeout=5) as sender:
+        for payload, _, _ in iter_ilp_batches("plant", [batch], 1, 1 << 20):
+            sender.send(payload)
+    ilp_server.close()
+    assert ilp_server.received.decode().splitlines() == [
+        "plant,Name=x\\ y Value=1.0 1704067200000000000",
+        "plant,Name=z Value=2.5 1704067202000000000",
+    ]
+
+
+def test_send_without_connection():
+    with pytest.raises(OSError):
+        IlpTcpSender("127.0.0.1", 9).send(b"x")